@@ -0,0 +1,94 @@
+"""Insertion throughput of the task results saved one row at a time or at once
+
+The benchmark saves pages of results (one row per field, as the /save route does) and reports the throughput of the
+insertions for two methods:
+  - per_row: one ORM object per row (Model.create without commit) and a commit per page
+  - bulk: one executemany INSERT per page (Model.bulk_create) and a commit per page
+
+Usage:
+    python benchmarks/bulk_insert.py [--pages 2000] [--fields 12]
+"""
+
+import argparse
+import time
+
+from common import load_task, make_recipe, percentile, remove_recipe, run_isolated
+
+METHODS = ["per_row", "bulk"]
+
+
+def run_method(method: str, nb_pages: int, nb_fields: int) -> dict[str, float]:
+    """Save the pages of results using one method
+
+    Parameters
+    ----------
+    method : str
+        The insertion method (see METHODS)
+    nb_pages : int
+        The number of pages saved
+    nb_fields : int
+        The number of fields (rows) of a page
+
+    Returns
+    -------
+    dict[str, float]
+        The throughput (rows/s, pages/s) and the latency percentiles (ms) of the saves
+    """
+    from replikant.database import commit_all
+
+    recipe_path = make_recipe()
+    try:
+        app, task = load_task(recipe_path)
+        latencies: list[float] = []
+        with app.app_context():
+            for page in range(nb_pages):
+                rows = [
+                    dict(
+                        user_id=f"p{page % 100}",
+                        step_idx=page // 100,
+                        sample_id=1,
+                        info_type=f"field_{field}",
+                        info_value=str(field),
+                        operation_type="record",
+                    )
+                    for field in range(nb_fields)
+                ]
+
+                start = time.perf_counter()
+                if method == "bulk":
+                    task.model.bulk_create(rows, commit=False)
+                else:
+                    for row in rows:
+                        task.model.create(**row, commit=False)
+                commit_all()
+                latencies.append(time.perf_counter() - start)
+
+        duration = sum(latencies)
+        return {
+            "rows/s": nb_pages * nb_fields / duration,
+            "pages/s": nb_pages / duration,
+            "p50 (ms)": percentile(latencies, 0.50) * 1000,
+            "p99 (ms)": percentile(latencies, 0.99) * 1000,
+        }
+    finally:
+        remove_recipe(recipe_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000, help="Number of pages saved")
+    parser.add_argument("--fields", type=int, default=12, help="Number of fields of a page")
+    args = parser.parse_args()
+
+    print(f"{args.pages} pages of {args.fields} rows")
+    print(f"{'method':<10}{'rows/s':>10}{'pages/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    for method in METHODS:
+        result = run_isolated(run_method, method, args.pages, args.fields)
+        print(
+            f"{method:<10}{result['rows/s']:>10.0f}{result['pages/s']:>10.0f}"
+            + f"{result['p50 (ms)']:>10.2f}{result['p99 (ms)']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Helpers shared by the benchmarks
+
+The benchmarks run on a throwaway recipe generated in a temporary directory. As the models of replikant are global
+to a process, each configuration of a benchmark is run in its own process (see run_isolated).
+"""
+
+from typing import Any, Callable
+import logging
+import multiprocessing
+import pathlib
+import shutil
+import statistics
+import tempfile
+
+import yaml
+
+
+def make_recipe(
+    nb_systems: int = 2,
+    nb_samples: int = 100,
+    database: dict[str, Any] | None = None,
+    selection_strategy: str | dict[str, Any] | None = None,
+) -> pathlib.Path:
+    """Generate a minimal recipe (a login and a task) in a temporary directory
+
+    Parameters
+    ----------
+    nb_systems : int
+        The number of systems of the task
+    nb_samples : int
+        The number of samples of each system (with a "speaker" column taking 4 values)
+    database : dict[str, Any] | None
+        The database profile of the recipe
+    selection_strategy : str | dict[str, Any] | None
+        The selection strategy of the task
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the recipe configuration
+    """
+    directory = pathlib.Path(tempfile.mkdtemp(prefix="replikant_bench_"))
+    for subdirectory in ["systems", "templates", "assets"]:
+        (directory / subdirectory).mkdir()
+
+    systems = []
+    for index in range(nb_systems):
+        name = f"S{index}"
+        lines = ["audio,speaker"] + [f"{name}/{line_id}.wav,spk{line_id % 4}" for line_id in range(nb_samples)]
+        (directory / "systems" / f"{name}.csv").write_text("\n".join(lines) + "\n")
+        systems.append({"name": name, "data": f"{name}.csv"})
+
+    task: dict[str, Any] = {"type": "task", "template": "task.tpl", "nb_steps": 10, "systems": systems}
+    if selection_strategy is not None:
+        task["selection_strategy"] = selection_strategy
+
+    recipe: dict[str, Any] = {
+        "variables": {},
+        "entrypoint": "login",
+        "admin": {"entrypoint": "panel", "units": {"panel": {"password": "benchmark"}}},
+        "activities": {
+            "login": {"type": "prolific_auth", "template": "login.tpl", "next": "task"},
+            "task": task,
+        },
+    }
+    if database is not None:
+        recipe["database"] = database
+
+    recipe_path = directory / "recipe.yaml"
+    recipe_path.write_text(yaml.safe_dump(recipe))
+    return recipe_path
+
+
+def remove_recipe(recipe_path: pathlib.Path) -> None:
+    """Remove a recipe generated by make_recipe (and its database)
+
+    Parameters
+    ----------
+    recipe_path : pathlib.Path
+        The path of the recipe configuration
+    """
+    shutil.rmtree(recipe_path.parent, ignore_errors=True)
+
+
+def load_task(recipe_path: pathlib.Path):
+    """Create the application of a recipe generated by make_recipe and register its task
+
+    Parameters
+    ----------
+    recipe_path : pathlib.Path
+        The path of the recipe configuration
+
+    Returns
+    -------
+    tuple[Flask, Task]
+        The application and the task
+    """
+    from replikant.main import create_app
+    from replikant.core import campaign_instance
+
+    app = create_app(recipe_path, "http://localhost", False, logging.getLogger("benchmark"))
+    with app.app_context():
+        # NOTE: the task module can only be imported once the participant model is defined by the recipe
+        from replikant.activities.task.src import task_manager
+
+        activity = campaign_instance.get_activity_graph().list_activities()["task"]
+        task = task_manager.register("task", activity)
+
+    return app, task
+
+
+def run_isolated(function: Callable[..., Any], *args: Any) -> Any:
+    """Run a function in a new process and get its result
+
+    Parameters
+    ----------
+    function : Callable[..., Any]
+        The function (defined at the top level of a module)
+    args : Any
+        The arguments of the function
+
+    Returns
+    -------
+    Any
+        The result of the function
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    """Get a percentile of a list of values
+
+    Parameters
+    ----------
+    values : list[float]
+        The values
+    ratio : float
+        The percentile as a ratio (e.g. 0.99)
+
+    Returns
+    -------
+    float
+        The percentile
+    """
+    if len(values) < 2:
+        return values[0] if len(values) > 0 else float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[min(98, max(0, round(ratio * 100) - 1))]
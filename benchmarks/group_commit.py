@@ -0,0 +1,116 @@
+"""Commit throughput of the task results under concurrent writers
+
+Each writer thread repeatedly saves a page of results (one row per field) as the /save route does, using
+write_rows, and the benchmark reports the throughput and the latency of the saves for several database profiles:
+  - rollback: the rollback journal (the SQLite default used before the database profile)
+  - wal: the default profile (WAL, synchronous NORMAL, busy timeout of 5s), one commit per request
+  - group_commit: the default profile with the group commit writer (GroupCommitWriter)
+
+Usage:
+    python benchmarks/group_commit.py [--writers 16] [--saves 50] [--fields 12]
+"""
+
+from typing import Any
+import argparse
+import threading
+import time
+
+from common import load_task, make_recipe, percentile, remove_recipe, run_isolated
+
+PROFILES: dict[str, dict[str, Any]] = {
+    "rollback": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "wal": {},
+    "group_commit": {"group_commit": {"interval_ms": 20, "max_rows": 500}},
+}
+
+
+def run_profile(database: dict[str, Any], nb_writers: int, nb_saves: int, nb_fields: int) -> dict[str, float]:
+    """Run the concurrent writers on a database profile
+
+    Parameters
+    ----------
+    database : dict[str, Any]
+        The database profile
+    nb_writers : int
+        The number of concurrent writer threads
+    nb_saves : int
+        The number of pages saved by each writer
+    nb_fields : int
+        The number of fields (rows) of a page
+
+    Returns
+    -------
+    dict[str, float]
+        The throughput (rows/s, saves/s), the latency percentiles (ms) and the number of failed saves
+    """
+    from replikant.database import write_rows
+
+    recipe_path = make_recipe(database=database)
+    try:
+        app, task = load_task(recipe_path)
+        latencies: list[float] = []
+        errors: list[Exception] = []
+        start_barrier = threading.Barrier(nb_writers + 1)
+
+        def writer(writer_id: int) -> None:
+            with app.app_context():
+                start_barrier.wait()
+                for step_idx in range(nb_saves):
+                    rows = [
+                        dict(
+                            user_id=f"w{writer_id}",
+                            step_idx=step_idx,
+                            sample_id=1,
+                            info_type=f"field_{field}",
+                            info_value=str(field),
+                            operation_type="record",
+                        )
+                        for field in range(nb_fields)
+                    ]
+                    start = time.perf_counter()
+                    try:
+                        write_rows(task.model, rows)
+                    except Exception as ex:
+                        errors.append(ex)
+                        continue
+                    latencies.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=writer, args=(writer_id,)) for writer_id in range(nb_writers)]
+        for thread in threads:
+            thread.start()
+        start_barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+
+        return {
+            "rows/s": len(latencies) * nb_fields / duration,
+            "saves/s": len(latencies) / duration,
+            "p50 (ms)": percentile(latencies, 0.50) * 1000,
+            "p99 (ms)": percentile(latencies, 0.99) * 1000,
+            "errors": len(errors),
+        }
+    finally:
+        remove_recipe(recipe_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=16, help="Number of concurrent writers")
+    parser.add_argument("--saves", type=int, default=50, help="Number of pages saved by each writer")
+    parser.add_argument("--fields", type=int, default=12, help="Number of fields of a page")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.saves} saves of {args.fields} rows")
+    print(f"{'profile':<14}{'rows/s':>10}{'saves/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'errors':>8}")
+    for name, database in PROFILES.items():
+        result = run_isolated(run_profile, database, args.writers, args.saves, args.fields)
+        print(
+            f"{name:<14}{result['rows/s']:>10.0f}{result['saves/s']:>10.0f}"
+            + f"{result['p50 (ms)']:>10.1f}{result['p99 (ms)']:>10.1f}{result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Selection latency of the least seen strategy depending on the number of samples of a system
+
+The benchmark selects one sample of one system per step and reports the mean and 99th percentile latency of a
+selection for several sizes of the pool of samples:
+  - sorted: the previous implementation, which rebuilds and sorts the counters of the system at each selection
+  - bucket: LeastSeenSelection, backed by the count-bucketed counters (BucketCounter)
+
+The selections are not persisted, so the benchmark only measures the selection itself.
+
+Usage:
+    python benchmarks/least_seen.py [--pools 1000 10000 50000] [--selections 200]
+"""
+
+from types import SimpleNamespace
+import argparse
+import math
+import random
+import time
+
+from common import load_task, make_recipe, percentile, remove_recipe, run_isolated
+
+
+class SortedLeastSeenSelection:
+    """The previous implementation of the least seen selection (kept as the reference of the benchmark)"""
+
+    def __init__(self, systems: dict) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        systems: dict
+            The systems indexed by their names
+        """
+        self.systems = systems
+        self._system_counters = dict([(cur_system, 0) for cur_system in systems.keys()])
+        self._sample_counters = dict(
+            [(sample.id, 0) for cur_system in systems.values() for sample in cur_system.samples]
+        )
+
+    @staticmethod
+    def _least(counters: dict, nb_items: int) -> list:
+        """Sort the counters, keep the least seen items and shuffle them"""
+        pool = sorted(counters.items(), key=lambda item: item[1])
+
+        min_count = math.inf
+        tmp_pool = []
+        for item, count in pool:
+            if count > min_count:
+                break
+
+            tmp_pool.append(item)
+            min_count = count
+
+        random.shuffle(tmp_pool)
+        return tmp_pool[:nb_items]
+
+    def select_samples(self, user, id_step: int, nb_systems: int, nb_samples: int) -> dict:
+        """Select the least seen samples of the least seen systems"""
+        dict_samples = dict()
+        for system_name in self._least(self._system_counters, nb_systems):
+            self._system_counters[system_name] += 1
+
+            samples = dict([(sample.id, sample) for sample in self.systems[system_name].samples])
+            subset = {sample_id: self._sample_counters[sample_id] for sample_id in samples.keys()}
+            pool_samples = self._least(subset, nb_samples)
+            for sample_id in pool_samples:
+                self._sample_counters[sample_id] += 1
+
+            dict_samples[system_name] = [samples[sample_id] for sample_id in pool_samples]
+
+        return dict_samples
+
+
+def make_systems(nb_samples: int) -> dict:
+    """Generate a system with a given number of samples (only providing what the strategies need)
+
+    Parameters
+    ----------
+    nb_samples : int
+        The number of samples
+
+    Returns
+    -------
+    dict
+        The system indexed by its name
+    """
+    return {"S0": SimpleNamespace(name="S0", samples=[SimpleNamespace(id=index) for index in range(nb_samples)])}
+
+
+def run_pool(pool_sizes: list[int], nb_selections: int) -> dict[str, dict[int, list[float]]]:
+    """Measure the latency of the selections of both implementations for each pool size
+
+    Parameters
+    ----------
+    pool_sizes : list[int]
+        The numbers of samples of the system
+    nb_selections : int
+        The number of selections measured
+
+    Returns
+    -------
+    dict[str, dict[int, list[float]]]
+        The latencies (s) of the selections indexed by implementation and pool size
+    """
+    recipe_path = make_recipe(nb_samples=10)
+    try:
+        app, _ = load_task(recipe_path)
+        with app.app_context():
+            # NOTE: the strategies can only be imported once the application is created
+            from replikant.activities.task.src.selection_strategy.least_seen import LeastSeenSelection
+
+            random.seed(0)
+            user = SimpleNamespace(id="p0", user_id="p0")
+            latencies: dict[str, dict[int, list[float]]] = {"sorted": dict(), "bucket": dict()}
+            for pool_size in pool_sizes:
+                systems = make_systems(pool_size)
+                strategies = {
+                    "sorted": SortedLeastSeenSelection(systems),
+                    "bucket": LeastSeenSelection(systems, persistent=False),
+                }
+                for name, strategy in strategies.items():
+                    latencies[name][pool_size] = []
+                    for id_step in range(nb_selections):
+                        start = time.perf_counter()
+                        strategy.select_samples(user, id_step, 1, 1)
+                        latencies[name][pool_size].append(time.perf_counter() - start)
+
+            return latencies
+    finally:
+        remove_recipe(recipe_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pools", type=int, nargs="+", default=[1000, 10000, 50000], help="Numbers of samples")
+    parser.add_argument("--selections", type=int, default=200, help="Number of selections measured per pool")
+    args = parser.parse_args()
+
+    latencies = run_isolated(run_pool, args.pools, args.selections)
+    print(f"{args.selections} selections of 1 sample")
+    print(f"{'method':<10}{'samples':>10}{'mean (us)':>12}{'p99 (us)':>12}")
+    for name, pools in latencies.items():
+        for pool_size, values in pools.items():
+            print(
+                f"{name:<10}{pool_size:>10}{sum(values) / len(values) * 1e6:>12.1f}"
+                + f"{percentile(values, 0.99) * 1e6:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Check that the hot queries use the indexes and measure what the indexes bring
+
+The script fills the tables of a throwaway recipe and then:
+  1. asserts, using EXPLAIN QUERY PLAN, that the hot queries search the tables using an index
+  2. measures the latency of the queries with the indexes and after dropping them (as in a database created by an
+     older version of replikant)
+  3. restarts the application on this database and asserts that the missing indexes are created again
+
+The script fails (non-zero exit code) if a query doesn't use an index.
+
+Usage:
+    python benchmarks/query_plans.py [--participants 2000] [--steps 10] [--fields 10] [--samples 2000]
+"""
+
+import argparse
+import pathlib
+import time
+
+from sqlalchemy import insert, select, text
+
+from common import load_task, make_recipe, remove_recipe, run_isolated
+
+
+def hot_queries(task) -> dict:
+    """Generate the hot queries of a task
+
+    Parameters
+    ----------
+    task : Task
+        The task
+
+    Returns
+    -------
+    dict[str, Select]
+        The queries indexed by their name
+    """
+    from replikant.activities.task.model import Sample, SelectionEvent
+
+    model = task.model
+    system = task.systems["S0"]
+    return {
+        "progress of a participant": select(model.step_idx).where(
+            model.user_id == "p1", model.operation_type == "record"
+        ),
+        "results of a sample": select(model.id).where(model.sample_id == 1),
+        "samples of a system": Sample.wide_select(system.col_names)
+        .where(Sample.system == system.name)
+        .order_by(Sample.line_id),
+        "selections of a participant": select(SelectionEvent.id).where(
+            SelectionEvent.task == task.name, SelectionEvent.user_id == "p1"
+        ),
+    }
+
+
+def check_plans(task) -> list[str]:
+    """Assert that the hot queries of a task use an index
+
+    Parameters
+    ----------
+    task : Task
+        The task
+
+    Returns
+    -------
+    list[str]
+        The plans of the queries
+
+    Raises
+    ------
+    AssertionError
+        if a query scans a table instead of searching it using an index
+    """
+    from replikant.database import explain_query_plan
+
+    plans = []
+    for name, query in hot_queries(task).items():
+        plan = explain_query_plan(query)
+        assert (len(plan) > 0) and all(
+            [not step.startswith("SCAN") for step in plan]
+        ), f'The query "{name}" doesn\'t use an index: {plan}'
+        assert any(["INDEX" in step for step in plan]), f'The query "{name}" doesn\'t use an index: {plan}'
+        plans.append(f"{name}: {' | '.join(plan)}")
+
+    return plans
+
+
+def list_indexes() -> list[str]:
+    """List the indexes created by replikant (named "ix_<table>_<columns>") in the database
+
+    Returns
+    -------
+    list[str]
+        The names of the indexes
+    """
+    from replikant.database import db
+
+    query = text("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'")
+    return [row[0] for row in db.session.execute(query)]
+
+
+def time_queries(task, nb_repeats: int) -> dict[str, float]:
+    """Measure the mean latency of the hot queries of a task
+
+    Parameters
+    ----------
+    task : Task
+        The task
+    nb_repeats : int
+        The number of executions of each query
+
+    Returns
+    -------
+    dict[str, float]
+        The latency (ms) of each query
+    """
+    from replikant.database import db
+
+    latencies = dict()
+    for name, query in hot_queries(task).items():
+        start = time.perf_counter()
+        for _ in range(nb_repeats):
+            db.session.execute(query).all()
+        latencies[name] = (time.perf_counter() - start) / nb_repeats * 1000
+
+    return latencies
+
+
+def fill_and_measure(recipe_path: pathlib.Path, nb_participants: int, nb_steps: int, nb_fields: int) -> dict:
+    """Fill the tables of the task, check the plans and measure the queries with and without the indexes
+
+    Parameters
+    ----------
+    recipe_path : pathlib.Path
+        The path of the recipe
+    nb_participants : int
+        The number of participants
+    nb_steps : int
+        The number of steps of each participant
+    nb_fields : int
+        The number of fields saved at each step
+
+    Returns
+    -------
+    dict
+        The plans and the latencies with and without the indexes
+    """
+    app, task = load_task(recipe_path)
+    with app.app_context():
+        # NOTE: the task models can only be imported once the application is created
+        from replikant.activities.task.model import SelectionEvent
+        from replikant.database import db
+
+        sample_ids = [sample.id for cur_system in task.systems.values() for sample in cur_system.samples]
+        for participant in range(nb_participants):
+            rows = [
+                dict(
+                    user_id=f"p{participant}",
+                    step_idx=step_idx,
+                    sample_id=sample_ids[(participant * nb_steps + step_idx) % len(sample_ids)],
+                    info_type=f"field_{field}",
+                    info_value=str(field),
+                    operation_type="record",
+                )
+                for step_idx in range(nb_steps)
+                for field in range(nb_fields)
+            ]
+            task.model.bulk_create(rows, commit=False)
+            events = [
+                dict(task=task.name, user_id=f"p{participant}", system="S0", sample_id=row["sample_id"], delta=1)
+                for row in rows[::nb_fields]
+            ]
+            db.session.execute(insert(SelectionEvent.__table__), events)
+        db.session.commit()
+        db.session.execute(text("ANALYZE"))
+
+        plans = check_plans(task)
+        indexed = time_queries(task, 20)
+
+        # Drop the indexes, as in a database created by an older version
+        index_names = list_indexes()
+        for index_name in index_names:
+            db.session.execute(text(f'DROP INDEX "{index_name}"'))
+        db.session.commit()
+        not_indexed = time_queries(task, 20)
+
+    return {"plans": plans, "indexed": indexed, "not_indexed": not_indexed, "nb_indexes": len(index_names)}
+
+
+def restart_and_check(recipe_path: pathlib.Path) -> int:
+    """Restart the application on an existing database without indexes and check the indexes are created again
+
+    Parameters
+    ----------
+    recipe_path : pathlib.Path
+        The path of the recipe
+
+    Returns
+    -------
+    int
+        The number of indexes of the database after the restart
+    """
+    app, task = load_task(recipe_path)
+    with app.app_context():
+        check_plans(task)
+        return len(list_indexes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=2000, help="Number of participants")
+    parser.add_argument("--steps", type=int, default=10, help="Number of steps of each participant")
+    parser.add_argument("--fields", type=int, default=10, help="Number of fields saved at each step")
+    parser.add_argument("--samples", type=int, default=2000, help="Number of samples of each system")
+    args = parser.parse_args()
+
+    recipe_path = make_recipe(nb_samples=args.samples)
+    try:
+        result = run_isolated(fill_and_measure, recipe_path, args.participants, args.steps, args.fields)
+        print(f"{args.participants * args.steps * args.fields} results, {2 * args.samples} samples")
+        print("Query plans:")
+        for plan in result["plans"]:
+            print(f"  {plan}")
+
+        print(f"{'query':<30}{'indexed (ms)':>14}{'no index (ms)':>15}")
+        for name, latency in result["indexed"].items():
+            print(f"{name:<30}{latency:>14.3f}{result['not_indexed'][name]:>15.3f}")
+
+        nb_indexes = run_isolated(restart_and_check, recipe_path)
+        assert (
+            nb_indexes >= result["nb_indexes"]
+        ), f"Only {nb_indexes} of the {result['nb_indexes']} indexes have been created again at startup"
+        print(f"The {nb_indexes} indexes have been created again when restarting on the database without them")
+    finally:
+        remove_recipe(recipe_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -76,6 +76,7 @@ with campaign_instance.register_activity(__name__) as scope:
         if user_form_for_this_activity is None:
             resp = form_activity.create(user_id=user.id)
             try:
+                values = dict()
                 for field_key in request.form.keys():
                     if field_key.endswith("[]"):
                         value = request.form.getlist(field_key)
@@ -84,13 +85,14 @@ with campaign_instance.register_activity(__name__) as scope:
                     else:
                         value = request.form[field_key]
 
-                    form_activity.addColumn(field_key, db.String)
-                    resp.update(**{field_key: value})
+                    values[field_key] = value
+                resp.set_values(values, db.String)
 
+                files = dict()
                 for field_key in request.files.keys():
-                    form_activity.addColumn(field_key, db.BLOB)
                     with request.files[field_key].stream as f:
-                        resp.update(**{field_key: f.read()})
+                        files[field_key] = f.read()
+                resp.set_values(files, db.BLOB)
 
             except Exception as ex:
                 resp.delete()
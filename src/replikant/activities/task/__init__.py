@@ -7,7 +7,10 @@ from flask import request, abort
 # Replikant
 from replikant.core import campaign_instance
 from replikant.utils import redirect
-from replikant.database import commit_all
+from replikant.database import GroupCommitWriter, write_rows
+
+# Task package
+from .model import TaskProgress
 
 # Current package
 from .src import task_manager, TransactionalObject
@@ -194,7 +197,11 @@ with campaign_instance.register_activity(__name__) as scope:
         if not task.has_transaction(user):
             raise Exception("No information about the current user is available stack (likely a connection timeout)")
 
-        # Save
+        # The step is saved after the lease of its samples expired, so they are counted again
+        task.renew_lease(user)
+
+        # Save (the rows are collected to be inserted at once)
+        rows = []
         all_records = task.get_all_records(user)
         for _, all_field_names in all_records.items():
             try:
@@ -242,15 +249,16 @@ with campaign_instance.register_activity(__name__) as scope:
                                     value = f.read()
 
                             scope.logger.info(f"([sample={sample_id}, system={system}] - {name_col}: {value})")
-                            _ = task.model.create(
-                                user_id=user.id,
-                                intro=intro_step,
-                                step_idx=cur_step,
-                                sample_id=sample_id,
-                                info_type=name_col,
-                                info_value=value,
-                                operation_type="record",
-                                commit=False,
+                            rows.append(
+                                dict(
+                                    user_id=user.id,
+                                    intro=intro_step,
+                                    step_idx=cur_step,
+                                    sample_id=sample_id,
+                                    info_type=name_col,
+                                    info_value=value,
+                                    operation_type="record",
+                                )
                             )
                         elif not field_key.startswith(SAVING_FIELD_PREFIX + TransactionalObject.RECORD_SEP):
                             name_col = field_key
@@ -268,15 +276,16 @@ with campaign_instance.register_activity(__name__) as scope:
                             sample_id = int(syssample_id)
 
                             scope.logger.info(f"([sample={sample_id}, system={system}] - {name_col}: True)")
-                            _ = task.model.create(
-                                user_id=user.id,
-                                intro=intro_step,
-                                step_idx=cur_step,
-                                sample_id=sample_id,
-                                info_type=name_col,
-                                info_value=True,
-                                operation_type="record",
-                                commit=False,
+                            rows.append(
+                                dict(
+                                    user_id=user.id,
+                                    intro=intro_step,
+                                    step_idx=cur_step,
+                                    sample_id=sample_id,
+                                    info_type=name_col,
+                                    info_value=True,
+                                    operation_type="record",
+                                )
                             )
                         else:
                             raise Exception(f"The field structure is not support: {field_key}")
@@ -285,8 +294,14 @@ with campaign_instance.register_activity(__name__) as scope:
                 task.delete_transaction(user)
                 raise e
 
-        # Commit the results and clean the transations of the user
-        commit_all()
+        # Commit the results and the progress (waiting for them to be durable) and clean the transations of the user
+        user_id, task_name = user.id, task.name
+        write_rows(
+            task.model,
+            rows,
+            wait=True,
+            extra_operation=lambda conn: TaskProgress.record(conn, user_id, task_name, cur_step + 1),
+        )
         task.delete_transaction(user)
 
         if skip_after_n_step is not None:
@@ -370,21 +385,19 @@ with campaign_instance.register_activity(__name__) as scope:
 
             # Insert info in the model
             scope.logger.info(f"([sample={sample_id}, system={system}] - {info_type}: {info_value})")
-            _ = task.model.create(
+            row = dict(
                 user_id=user.id,
                 intro=intro_step,
                 step_idx=cur_step,
                 sample_id=sample_id,
                 info_type=info_type,
                 info_value=info_value,
-                operation_type="monitor",
-                commit=False,
             )
         except Exception as e:
             scope.logger.error(e, stack_info=True, exc_info=True)
             return Response(status=500)
 
-        # Commit the results and clean the transations of the user
-        commit_all()
+        # Log the event (always batched by the writer as the monitoring doesn't need to wait for it to be durable)
+        GroupCommitWriter().submit_rows(task.monitor_model, [row], wait=False)
 
         return Response(status=204)
@@ -1,11 +1,21 @@
 # coding: utf8
+from typing import Any
 from datetime import datetime
+import json
+import math
 
-from replikant.database import Model, Column, ForeignKey, db, declared_attr
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from replikant.database import Model, Column, ForeignKey, db, declared_attr, exclusive_transaction
 from replikant.core import ParticipantScope
 
 usermodel = ParticipantScope.get_user()
 
+# The insert constructs supporting an upsert (INSERT ... ON CONFLICT DO UPDATE) indexed by dialect name
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
 
 class Sample(Model):
     """Model which represent a sample
@@ -14,6 +24,7 @@ class Sample(Model):
     """
 
     __tablename__ = "Sample"
+    __indexes__ = [("system", "line_id")]
 
     id = Column(db.Integer, primary_key=True)
     system = Column(db.String, nullable=False)
@@ -30,9 +41,13 @@ class TaskModel(Model):
 
     A step is identified by an \"id\", has a \"date\" when it was created, and index (\"step_idx\") and a flag
     indicating if it is an introduction step (\"intro\")
+
+    The value of an information (\"info_value\") is also stored as a number (\"info_number\") when it is numeric and
+    the date as an integer \"timestamp\" (milliseconds since epoch), so the results can be aggregated in SQL
     """
 
     __abstract__ = True
+    __indexes__ = [("user_id", "operation_type", "step_idx"), ("sample_id",)]
 
     id = Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False)
@@ -42,12 +57,339 @@ class TaskModel(Model):
     info_type = db.Column(db.String, nullable=False)
     info_value = db.Column(db.String, nullable=False)
     operation_type = db.Column(db.String, nullable=False)
+    info_number = db.Column(db.Float, nullable=True)
+    timestamp = db.Column(db.BigInteger, nullable=True)
 
     def __init__(self, *args, **kwargs):
         self.intro = False
         super().__init__(*args, **kwargs)
         self.date = datetime.now()
+        self.timestamp = int(self.date.timestamp() * 1000)
+        self.info_number = TaskModel.to_number(self.info_value)
+
+    @staticmethod
+    def to_number(value: Any) -> float | None:
+        """Convert the value of an information to a number
+
+        Parameters
+        ----------
+        value : Any
+            The value (string, number, boolean or file content)
+
+        Returns
+        -------
+        float | None
+            The numeric value, None if the value is not numeric
+        """
+        if isinstance(value, (bool, int, float)):
+            number = float(value)
+        elif isinstance(value, str):
+            try:
+                number = float(value)
+            except ValueError:
+                return None
+        else:
+            return None
+
+        return number if math.isfinite(number) else None
+
+    @classmethod
+    def prepare_row(cls, row: dict[str, Any]) -> dict[str, Any]:
+        row.setdefault("intro", False)
+        row["date"] = datetime.now()
+        row["timestamp"] = int(row["date"].timestamp() * 1000)
+        row["info_number"] = TaskModel.to_number(row.get("info_value"))
+        return row
 
     @declared_attr
     def user_id(cls):
         return Column(db.String, ForeignKey(usermodel.__tablename__ + ".id"))
+
+
+class MonitorModel(Model):
+    """Model which represents the monitoring events of a test (append-only log)
+
+    The events sent by the player (\"play\", \"pause\", ...) are logged in a dedicated table so the table containing
+    the results of the test is not polluted. Each row is an event identified by an \"id\", associated to the step
+    (\"step_idx\") and the sample (\"sample_id\") during which it happened.
+    """
+
+    __abstract__ = True
+
+    id = Column(db.Integer, primary_key=True)
+    date = db.Column(db.DateTime, nullable=False)
+    step_idx = db.Column(db.Integer, nullable=False)
+    intro = db.Column(db.Boolean, nullable=False)
+    sample_id = db.Column(db.Integer, ForeignKey(Sample.__tablename__ + ".id"), nullable=False)
+    info_type = db.Column(db.String, nullable=False)
+    info_value = db.Column(db.String, nullable=False)
+
+    @classmethod
+    def prepare_row(cls, row: dict[str, Any]) -> dict[str, Any]:
+        row.setdefault("intro", False)
+        row["date"] = datetime.now()
+        return row
+
+    @declared_attr
+    def user_id(cls):
+        return Column(db.String, ForeignKey(usermodel.__tablename__ + ".id"))
+
+
+class TaskProgress(Model):
+    """Model which represents the progress of the participants
+
+    Each row stores the number of steps (\"nb_steps\") completed by a participant (\"user_id\") for a given \"task\".
+    This table is a materialization of the task tables updated in the same transaction as the results of a step.
+    """
+
+    __tablename__ = "TaskProgress"
+
+    user_id = Column(db.String, primary_key=True)
+    task = Column(db.String, primary_key=True)
+    nb_steps = Column(db.Integer, nullable=False)
+
+    @classmethod
+    def get_nb_steps(cls, user_id: str, task: str) -> int:
+        """Get the number of steps completed by a participant for a given task
+
+        Parameters
+        ----------
+        user_id : str
+            The ID of the participant
+        task : str
+            The name of the task
+
+        Returns
+        -------
+        int
+            The number of completed steps (0 if the participant hasn't completed any step yet)
+        """
+        nb_steps = db.session.execute(select(cls.nb_steps).where(cls.user_id == user_id, cls.task == task)).scalar()
+        return nb_steps if nb_steps is not None else 0
+
+    @classmethod
+    def record(cls, conn: Connection, user_id: str, task: str, nb_steps: int) -> None:
+        """Record that a participant has completed a given number of steps of a task
+
+        The progress never decreases, so replaying a step doesn't rewind it.
+
+        Parameters
+        ----------
+        conn : Connection
+            The connection of the transaction saving the results of the step
+        user_id : str
+            The ID of the participant
+        task : str
+            The name of the task
+        nb_steps : int
+            The number of completed steps
+        """
+        table = cls.__table__
+        if conn.dialect.name not in UPSERT_INSERTS:
+            result = conn.execute(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.task == task)
+                .values(nb_steps=case((table.c.nb_steps < nb_steps, nb_steps), else_=table.c.nb_steps))
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(table).values(user_id=user_id, task=task, nb_steps=nb_steps))
+            return
+
+        # NOTE: one statement, so the row of a new participant can't be inserted twice by concurrent transactions
+        statement = UPSERT_INSERTS[conn.dialect.name](table).values(user_id=user_id, task=task, nb_steps=nb_steps)
+        conn.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.task],
+                set_=dict(
+                    nb_steps=case(
+                        (table.c.nb_steps < statement.excluded.nb_steps, statement.excluded.nb_steps),
+                        else_=table.c.nb_steps,
+                    )
+                ),
+            )
+        )
+
+    @classmethod
+    def has_task(cls, task: str) -> bool:
+        """Check if the progress of a given task has been materialized
+
+        Parameters
+        ----------
+        task : str
+            The name of the task
+
+        Returns
+        -------
+        bool
+            True if at least one progress row exists for the task, False else
+        """
+        return db.session.execute(select(cls.user_id).where(cls.task == task).limit(1)).first() is not None
+
+    @classmethod
+    def rebuild(cls, task: str, task_model: type[TaskModel]) -> int:
+        """Rebuild the progress of a task from its results
+
+        Parameters
+        ----------
+        task : str
+            The name of the task
+        task_model : type[TaskModel]
+            The model of the table containing the results of the task
+
+        Returns
+        -------
+        int
+            The number of participants whose progress has been rebuilt
+        """
+        query = (
+            select(task_model.user_id, literal(task), func.max(task_model.step_idx) + 1)
+            .where(task_model.operation_type == "record", task_model.user_id.is_not(None))
+            .group_by(task_model.user_id)
+        )
+
+        db.session.execute(delete(cls.__table__).where(cls.task == task))
+        result = db.session.execute(insert(cls.__table__).from_select(["user_id", "task", "nb_steps"], query))
+        db.session.commit()
+        return result.rowcount
+
+
+class SelectionEvent(Model):
+    """Model which represents the journal of the sample selections
+
+    Each row is an event changing the count of a sample (\"sample_id\") of a system (\"system\") for a participant
+    (\"user_id\") in a given \"task\". The selection strategies of all the processes rebuild and synchronize their
+    counters from this journal so they share one consistent balance.
+    """
+
+    __tablename__ = "SelectionEvent"
+    __indexes__ = [("task", "id"), ("task", "user_id")]
+
+    id = Column(db.Integer, primary_key=True)
+    task = Column(db.String, nullable=False)
+    user_id = Column(db.String, nullable=True)
+    system = Column(db.String, nullable=False)
+    sample_id = Column(db.Integer, nullable=False)
+    delta = Column(db.Integer, nullable=False)
+
+
+class Playlist(Model):
+    """Model which represents the playlists of the participants
+
+    When the playlist mode of a task is enabled, the samples of all the steps are selected when the participant
+    enters the task. The IDs of the samples of each step are stored as a JSON list of lists (\"steps\") for the
+    participant (\"user_id\") and the \"task\".
+    """
+
+    __tablename__ = "Playlist"
+
+    user_id = Column(db.String, primary_key=True)
+    task = Column(db.String, primary_key=True)
+    steps = Column(db.Text, nullable=False)
+
+    @classmethod
+    def get_steps(cls, user_id: str, task: str) -> list[list[int]] | None:
+        """Get the playlist of a participant for a given task
+
+        Parameters
+        ----------
+        user_id : str
+            The ID of the participant
+        task : str
+            The name of the task
+
+        Returns
+        -------
+        list[list[int]] | None
+            The IDs of the samples of each step, None if the participant doesn't have a playlist yet
+        """
+        steps = db.session.execute(select(cls.steps).where(cls.user_id == user_id, cls.task == task)).scalar()
+        return json.loads(steps) if steps is not None else None
+
+    @classmethod
+    def store(cls, user_id: str, task: str, steps: list[list[int]]) -> None:
+        """Store (or replace) the playlist of a participant for a given task
+
+        Parameters
+        ----------
+        user_id : str
+            The ID of the participant
+        task : str
+            The name of the task
+        steps : list[list[int]]
+            The IDs of the samples of each step
+        """
+        db.session.merge(cls(user_id=user_id, task=task, steps=json.dumps(steps, separators=(",", ":"))))
+        db.session.commit()
+
+
+class DesignModel(Model):
+    """Model which represents a precomputed design of a task
+
+    Each row assigns a sample (\"sample_id\") of a system (\"system\") to the step \"step_idx\" of a participant slot
+    (\"slot\"). The participants claim the slots in order (see DesignClaim).
+    """
+
+    __abstract__ = True
+    __indexes__ = [("slot", "step_idx")]
+
+    id = Column(db.Integer, primary_key=True)
+    slot = db.Column(db.Integer, nullable=False)
+    step_idx = db.Column(db.Integer, nullable=False)
+    system = db.Column(db.String, nullable=False)
+    sample_id = db.Column(db.Integer, ForeignKey(Sample.__tablename__ + ".id"), nullable=False)
+
+
+class DesignClaim(Model):
+    """Model which represents the slots of the precomputed designs claimed by the participants
+
+    Each row associates a participant (\"user_id\") to the slot (\"slot\") of the design of a \"task\" they use.
+    """
+
+    __tablename__ = "DesignClaim"
+    __indexes__ = [("task", "user_id")]
+
+    task = Column(db.String, primary_key=True)
+    slot = Column(db.Integer, primary_key=True)
+    user_id = Column(db.String, nullable=False)
+
+    @classmethod
+    def claim(cls, task: str, user_id: str) -> int:
+        """Get the slot of a participant, claiming the next free slot if the participant doesn't have one yet
+
+        Parameters
+        ----------
+        task : str
+            The name of the task
+        user_id : str
+            The ID of the participant
+
+        Returns
+        -------
+        int
+            The slot of the participant
+        """
+        table = cls.__table__
+        with exclusive_transaction() as conn:
+            slot = conn.execute(select(table.c.slot).where(table.c.task == task, table.c.user_id == user_id)).scalar()
+            if slot is None:
+                slot = conn.execute(select(func.coalesce(func.max(table.c.slot) + 1, 0)).where(table.c.task == task))
+                slot = slot.scalar()
+                conn.execute(insert(table).values(task=task, slot=slot, user_id=user_id))
+
+        return slot
+
+    @classmethod
+    def nb_claims(cls, task: str) -> int:
+        """Get the number of slots claimed for a given task
+
+        Parameters
+        ----------
+        task : str
+            The name of the task
+
+        Returns
+        -------
+        int
+            The number of claimed slots
+        """
+        return db.session.execute(select(func.count()).select_from(cls).where(cls.task == task)).scalar() or 0
@@ -5,29 +5,64 @@ from .core import SelectionBase
 AVAILABLE_SELECTION_STRATEGIES = [
     "least_seen",
     "latin_square",
+    "precomputed",
+    "quota",
 ]  # NOTE: if possible, it would be good to get rid of this!
 
 
-def get_strategy(strategy_name: str, systems: dict[str, System]) -> SelectionBase:
-    strategy = None
+def get_strategy_class(strategy_name: str) -> type[SelectionBase]:
+    """Get the class implementing a selection strategy given its name
+
+    Parameters
+    ----------
+    strategy_name : str
+        The name of the class implementing the strategy
+
+    Returns
+    -------
+    type[SelectionBase]
+        The class implementing the strategy
+    """
+    strategy_cls = None
 
     for module_path in AVAILABLE_SELECTION_STRATEGIES:
         try:
             strategy_python_module = import_module(f"replikant.activities.task.src.selection_strategy.{module_path}")
             strategy_cls = getattr(strategy_python_module, strategy_name)
-            strategy = strategy_cls(systems)
         except (ImportError, AttributeError):
             # FIXME: really check if it exists here, all other exceptions should be reported
             continue
 
-    if strategy is None:
+        break
+
+    if strategy_cls is None:
         raise Exception(f"{strategy_name} is not a valid strategies: a corresponding class doesn't exist")
-    elif not isinstance(strategy, SelectionBase):
+    elif not (isinstance(strategy_cls, type) and issubclass(strategy_cls, SelectionBase)):
         raise Exception(
             f"{strategy_name} is not a valid strategies: the corresponding class doesn't subclass SelectionBase"
         )
 
-    return strategy
+    return strategy_cls
+
+
+def get_strategy(strategy_name: str, systems: dict[str, System], **kwargs) -> SelectionBase:
+    """Instantiate a selection strategy given its name
+
+    Parameters
+    ----------
+    strategy_name : str
+        The name of the class implementing the strategy
+    systems : dict[str, System]
+        The dictionnary of systems indexed by their names
+    kwargs : dict
+        The parameters of the strategy (e.g., the task and the options of the recipe configuration)
+
+    Returns
+    -------
+    SelectionBase
+        The instance of the strategy
+    """
+    return get_strategy_class(strategy_name)(systems, **kwargs)
 
 
-__all__ = ["SelectionBase", "get_strategy"]
+__all__ = ["SelectionBase", "get_strategy", "get_strategy_class"]
@@ -1,29 +1,230 @@
-import threading
+from collections import OrderedDict
 import logging
+import os
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+from sqlalchemy.engine import Connection
 
 from replikant.core import User
+from replikant.database import exclusive_transaction
+from replikant.utils import FileLock, InstrumentedLock, SharedArray, shared_memory_name
 from ..system import System
-from ...model import Sample
+from ...model import Sample, TaskModel
+from .counters import ArrayCounter, BucketCounter
+from .journal import SelectionJournal
 
-MUTEX_SELECTION = threading.Semaphore()
+# The backends storing the counters of the strategies
+COUNTER_BACKENDS = ["memory", "shared"]
+
+
+class SelectionRequest:
+    """A selection submitted to a strategy (possibly processed in a batch with other ones)"""
+
+    def __init__(self, user: User, first_step: int, nb_steps: int, nb_systems: int, nb_samples: int):
+        """Initialisation
+
+        Parameters
+        ----------
+        user : User
+            the user
+        first_step: int
+            The first step to select for the given participant
+        nb_steps: int
+            The number of steps to select
+        nb_systems : int
+            the number of systems per step
+        nb_samples : int
+            the number of samples per system
+        """
+        self.user = user
+        self.arguments = (user, first_step, nb_steps, nb_systems, nb_samples)
+        self.result: list[dict[str, list[Sample]]] | None = None
+        self.error: Exception | None = None
+        self._done = threading.Event()
+
+    def done(self, error: Exception | None = None) -> None:
+        """Mark the request as processed (or failed)
+
+        Parameters
+        ----------
+        error : Exception | None
+            The error which made the selection fail, None if it succeeded
+        """
+        self.error = error
+        self._done.set()
+
+    def wait(self) -> list[dict[str, list[Sample]]]:
+        """Wait for the request to be processed
+
+        Returns
+        -------
+        list[dict[str, list[Sample]]]
+            The selected samples indexed by system name for each step
+
+        Raises
+        ------
+        Exception
+            the error which made the selection fail
+        """
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+
+        assert self.result is not None
+        return self.result
 
 
 class SelectionBase:
+    """Base class of the selection strategies
+
+    By default, the counters of a strategy only live in the memory of the process. With "persistent", the
+    selections are recorded in a journal (the table SelectionEvent) from which all the processes derive their
+    counters, so the balance survives a restart and is shared by the worker processes. This has a cost: each
+    selection is then an exclusive (write) transaction competing with the saving of the results for the SQLite
+    write lock, and the journal grows by one row per selected sample (and per released lease).
+    """
+
+    # Flag to indicate if the strategy has a state per participant (reloaded from the journal in shared mode)
+    HAS_USER_STATE: bool = False
+
     def __init__(
         self,
         systems: dict[str, System],
         references: list[str] = [],
         include_references: bool = False,
+        task: str | None = None,
+        task_model: type[TaskModel] | None = None,
+        persistent: bool = False,
+        counters: str = "memory",
+        batch_window_ms: float = 0,
+        batch_size: int = 64,
     ):
+        """Constructor
+
+        Parameters
+        ----------
+        systems: dict[str, System]
+            The dictionnary of systems indexed by their names
+        references: list[str]
+            The names of the reference systems
+        include_references: bool
+            Flag to indicate if the references should be included
+        task: str | None
+            The name of the task using the strategy (required to persist the selections)
+        task_model: type[TaskModel] | None
+            The model of the table containing the results of the task (used to seed the journal)
+        persistent: bool
+            Flag to indicate if the selections should be persisted in the journal shared by all the processes (each
+            selection is then a write transaction and adds one row per selected sample to the journal)
+        counters: str
+            The backend of the counters: "memory" (each process has its own counters synchronized from the journal)
+            or "shared" (the counters are stored in shared memory and used by all the processes of the instance).
+            Only the global counters are shared: without "persistent", the history of each participant stays in the
+            memory of the process which served them
+        batch_window_ms: float
+            The duration in milliseconds during which the concurrent selection requests are gathered to be processed
+            in one critical section (0 to process each request on its own)
+        batch_size: int
+            The maximum number of requests processed in one batch
+        """
+        if counters not in COUNTER_BACKENDS:
+            raise Exception(f'"{counters}" is not a valid counter backend (available: {", ".join(COUNTER_BACKENDS)})')
+
         self._systems = systems
+        self._task = task
         self._references = references
         self._include_reference = include_references
         self._logger = logging.getLogger(self.__class__.__name__)
 
+        # NOTE: each strategy (i.e., each task) has its own lock so independent tasks select in parallel
+        self._lock = InstrumentedLock()
+
+        # The requests arriving during the batch window are processed together by the first one
+        self._batch_window = batch_window_ms / 1000
+        self._batch_size = batch_size
+        self._batch_lock = threading.Lock()
+        self._batch_full = threading.Event()
+        self._pending_requests: list[SelectionRequest] = []
+
+        # The state of the strategy is derived from the journal of the selections if persistent
+        self._journal: SelectionJournal | None = None
+        if persistent and (task is not None):
+            self._journal = SelectionJournal(task, task_model)
+
+        # The state of the users is released after a period of inactivity (reloaded from the journal when needed)
+        self._user_timeout: float | None = None
+        self._user_activity: OrderedDict[str, float] = OrderedDict()
+
+        # The shared counters are guarded by a lock shared by all the processes of the instance
+        self._shared_arrays: list[SharedArray] = []
+        self._shared_lock: FileLock | None = None
+        self._shared_state: np.ndarray | None = None
+        if counters == "shared":
+            self._shared_key = (
+                current_app.config["REPLIKANT_INSTANCE_ID"],
+                task if task is not None else "",
+                self.__class__.__name__,
+            )
+            lock_path = os.path.join(
+                current_app.config["REPLIKANT_RECIPE_TMP_DIR"], shared_memory_name(*self._shared_key) + ".lock"
+            )
+            self._shared_lock = FileLock(lock_path)
+
+            # NOTE: the state only contains the flag indicating if the counters have been loaded from the journal
+            self._shared_state = self._allocate_counters("__state__", 1)
+
+    def _allocate_counters(self, name: str, size: int) -> np.ndarray:
+        """Allocate an array of counters (initialised to 0) in the backend of the strategy
+
+        In shared mode, the first process allocates the array, the other ones attach to it.
+
+        Parameters
+        ----------
+        name : str
+            The name of the array (unique for the strategy)
+        size : int
+            The number of counters
+
+        Returns
+        -------
+        np.ndarray
+            The array of counters
+        """
+        if self._shared_lock is None:
+            return np.zeros(size, dtype=np.int64)
+
+        shared_array = SharedArray(shared_memory_name(*self._shared_key, name), size, self._shared_lock)
+        self._shared_arrays.append(shared_array)
+        return shared_array.array
+
+    def _create_counter(self, name: str, items: list) -> BucketCounter | ArrayCounter:
+        """Create the counters of a list of items in the backend of the strategy
+
+        Parameters
+        ----------
+        name : str
+            The name of the counters (unique for the strategy)
+        items : list
+            The items to count
+
+        Returns
+        -------
+        BucketCounter | ArrayCounter
+            The counters
+        """
+        if self._shared_lock is None:
+            return BucketCounter(items)
+
+        return ArrayCounter(items, self._allocate_counters(name, len(items)))
+
     def select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
         """Select sample method
 
-        This method is a wrapper on _select_samples to ensure an exclusive access to the critical section
+        This method is a wrapper on _select_samples to ensure an exclusive access to the critical section (the
+        state of the strategy)
 
         Parameters
         ----------
@@ -42,16 +243,381 @@ class SelectionBase:
             A dictionnary associating the sample to its ID
 
         """
-        MUTEX_SELECTION.acquire()
-        to_return = self._select_samples(user, id_step, nb_systems, nb_samples)
-        MUTEX_SELECTION.release()
+        return self.select_steps(user, id_step, 1, nb_systems, nb_samples)[0]
+
+    def select_steps(
+        self, user: User, first_step: int, nb_steps: int, nb_systems: int, nb_samples: int
+    ) -> list[dict[str, list[Sample]]]:
+        """Select the samples of several consecutive steps in one critical section
+
+        Each step is selected knowing the selections of the previous ones, so the steps are balanced as if they were
+        selected one by one. If a batch window is defined, the selection is dispatched with the other requests
+        arriving during the window (see _dispatch).
+
+        Parameters
+        ----------
+        user : User
+            the user
+        first_step: int
+            The first step to select for the given participant
+        nb_steps: int
+            The number of steps to select
+        nb_systems : int
+            the number of systems per step
+        nb_samples : int
+            the number of samples per system
+
+        Returns
+        -------
+        list[dict[str, list[Sample]]]
+            The selected samples indexed by system name for each step
+        """
+        request = SelectionRequest(user, first_step, nb_steps, nb_systems, nb_samples)
+        if self._batch_window > 0:
+            self._dispatch(request)
+        else:
+            self._select_requests([request])
+            request.done()
+
+        return request.wait()
+
+    def _dispatch(self, request: "SelectionRequest") -> None:
+        """Add a request to the pending batch and, if it is the first one, select the samples of the whole batch
+
+        The first request of a batch waits for the end of the window (or until the batch is full) and then selects the
+        samples of all the pending requests in one critical section, the other requests simply wait for their result.
+        No thread is involved, so the dispatcher also works with the cooperative workers (e.g., gevent).
+
+        Parameters
+        ----------
+        request : SelectionRequest
+            the request to dispatch
+        """
+        with self._batch_lock:
+            self._pending_requests.append(request)
+            is_leader = len(self._pending_requests) == 1
+            if len(self._pending_requests) >= self._batch_size:
+                self._batch_full.set()
+
+        if not is_leader:
+            return
+
+        self._batch_full.wait(self._batch_window)
+        with self._batch_lock:
+            batch, self._pending_requests = self._pending_requests, []
+            self._batch_full.clear()
+
+        try:
+            self._select_requests(batch)
+        except Exception as ex:
+            for cur_request in batch:
+                cur_request.done(ex)
+        else:
+            self._logger.debug(f"{len(batch)} selection requests have been processed in one batch")
+            for cur_request in batch:
+                cur_request.done()
+
+    def _select_requests(self, requests: list["SelectionRequest"]) -> None:
+        """Select the samples of a list of requests in one critical section
+
+        The requests are processed in turn, each one knowing the selections of the previous ones. With the journal,
+        all the selections are recorded in one transaction.
+
+        Parameters
+        ----------
+        requests : list[SelectionRequest]
+            the requests, their result is filled by the method
+        """
+        events: list[tuple[str | None, str, int, int]] = []
+        with self._lock:
+            if self._shared_lock is not None:
+                self._load_shared_counters()
+
+                # NOTE: the participants could have been served by another process since the last time, so always reload
+                for request in requests:
+                    user_id = str(request.user.id)
+                    self._user_activity.pop(user_id, None)
+                    self._load_user(user_id)
+
+                with self._shared_lock.hold():
+                    for request in requests:
+                        request.result = self._select_steps(*request.arguments, events)
+            elif self._journal is None:
+                for request in requests:
+                    self._load_user(str(request.user.id))
+                    request.result = self._select_steps(*request.arguments, events)
+            else:
+                # Catch up with the selections of the other processes, select and record the selection atomically
+                try:
+                    with exclusive_transaction() as conn:
+                        self._journal.sync(self._apply_event, conn)
+                        for request in requests:
+                            self._load_user(str(request.user.id), conn)
+                            request.result = self._select_steps(*request.arguments, events)
+                        self._journal.record(conn, events)
+                finally:
+                    # NOTE: the state is only updated once the selection is committed, so the steps are reverted
+                    for user_id, system, sample_id, delta in events:
+                        self._apply_event(user_id, system, sample_id, -delta)
+
+                self._journal.sync(self._apply_event)
+
+        # The shared counters are already updated, the selection is appended to the journal outside the critical section
+        if (self._shared_lock is not None) and (self._journal is not None):
+            self._journal.append(events)
+
+    def _select_steps(
+        self,
+        user: User,
+        first_step: int,
+        nb_steps: int,
+        nb_systems: int,
+        nb_samples: int,
+        events: list[tuple[str | None, str, int, int]],
+    ) -> list[dict[str, list[Sample]]]:
+        """Select the samples of consecutive steps, applying the selection of each step before selecting the next one
+
+        Parameters
+        ----------
+        user : User
+            the user
+        first_step: int
+            The first step to select for the given participant
+        nb_steps: int
+            The number of steps to select
+        nb_systems : int
+            the number of systems per step
+        nb_samples : int
+            the number of samples per system
+        events : list[tuple[str | None, str, int, int]]
+            The list filled with the applied events (user_id, system, sample_id, delta)
+
+        Returns
+        -------
+        list[dict[str, list[Sample]]]
+            The selected samples indexed by system name for each step
+        """
+        steps = []
+        for id_step in range(first_step, first_step + nb_steps):
+            selected_samples = self._select_samples(user, id_step, nb_systems, nb_samples)
+            for event in self._selection_events(user, selected_samples):
+                self._apply_event(*event)
+                events.append(event)
+            steps.append(selected_samples)
+
+        return steps
+
+    def _load_shared_counters(self) -> None:
+        """Load the shared counters from the journal if no process did it yet"""
+        assert (self._shared_lock is not None) and (self._shared_state is not None)
 
-        return to_return
+        with self._shared_lock.hold():
+            if self._shared_state[0] == 0:
+                if self._journal is not None:
+                    with exclusive_transaction() as conn:
+                        self._journal.sync(lambda _, *event: self._apply_global_event(*event), conn)
+                self._shared_state[0] = 1
+
+    def release_samples(self, user_id: str, selected_samples: dict[str, list[Sample]]) -> None:
+        """Release the samples selected for a user who didn't evaluate them (e.g., the lease of the step expired)
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        selected_samples : dict[str, list[Sample]]
+            the released samples indexed by system name
+        """
+        self._update_counts(user_id, selected_samples, -1)
+
+    def acquire_samples(self, user_id: str, selected_samples: dict[str, list[Sample]]) -> None:
+        """Count again samples which have been released (e.g., the participant came back after the lease expired)
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        selected_samples : dict[str, list[Sample]]
+            the acquired samples indexed by system name
+        """
+        self._update_counts(user_id, selected_samples, 1)
+
+    def _update_counts(self, user_id: str, selected_samples: dict[str, list[Sample]], delta: int) -> None:
+        """Update the counts of samples outside of a selection
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        selected_samples : dict[str, list[Sample]]
+            the samples indexed by system name
+        delta : int
+            the value added to the counters
+        """
+        events: list[tuple[str | None, str, int, int]] = [
+            (user_id, system_name, sample.id, delta)
+            for system_name, samples in selected_samples.items()
+            for sample in samples
+        ]
+
+        with self._lock:
+            if self._shared_lock is not None:
+                self._load_shared_counters()
+                with self._shared_lock.hold():
+                    for event in events:
+                        self._apply_event(*event)
+            elif self._journal is None:
+                for event in events:
+                    self._apply_event(*event)
+            else:
+                with exclusive_transaction() as conn:
+                    self._journal.record(conn, events)
+                self._journal.sync(self._apply_event)
+
+        if (self._shared_lock is not None) and (self._journal is not None):
+            self._journal.append(events)
+
+    def set_user_timeout(self, timeout: float | None) -> None:
+        """Set the duration of inactivity after which the state of a user is released
+
+        The state is only released if it can be reloaded from the journal (i.e., if the strategy is persistent)
+
+        Parameters
+        ----------
+        timeout : float | None
+            The duration in seconds (None to keep the state of the users forever)
+        """
+        self._user_timeout = timeout
+
+    def _load_user(self, user_id: str, conn: Connection | None = None) -> None:
+        """Make sure the state of a user is loaded and release the state of the inactive users
+
+        The state of a user which is not loaded (never seen by this process or released) is rebuilt from the journal.
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        conn : Connection | None
+            The connection to read the journal (a new connection is opened if None)
+        """
+        if not self.HAS_USER_STATE:
+            return
+
+        if (self._journal is not None) and (user_id not in self._user_activity):
+            self._reset_user(user_id)
+            for system, sample_id, delta in self._journal.user_events(user_id, conn):
+                self._apply_user_event(user_id, system, sample_id, delta)
+
+        now = time.monotonic()
+        self._user_activity[user_id] = now
+        self._user_activity.move_to_end(user_id)
+
+        # The users are sorted by activity, so only the oldest ones are checked
+        if (self._user_timeout is None) or (self._journal is None):
+            return
+        while len(self._user_activity) > 0:
+            oldest_user_id, last_activity = next(iter(self._user_activity.items()))
+            if now - last_activity <= self._user_timeout:
+                break
+            self._user_activity.popitem(last=False)
+            self._reset_user(oldest_user_id)
+
+    def _selection_events(
+        self, user: User, selected_samples: dict[str, list[Sample]]
+    ) -> list[tuple[str | None, str, int, int]]:
+        """Generate the events corresponding to a selection
+
+        Parameters
+        ----------
+        user : User
+            the user
+        selected_samples : dict[str, list[Sample]]
+            the selected samples indexed by system name
+
+        Returns
+        -------
+        list[tuple[str | None, str, int, int]]
+            the events (user_id, system, sample_id, delta)
+        """
+        return [
+            (str(user.id), system_name, sample.id, 1)
+            for system_name, samples in selected_samples.items()
+            for sample in samples
+        ]
+
+    def _apply_event(self, user_id: str | None, system: str, sample_id: int, delta: int) -> None:
+        """Apply a selection event to the state (the counters) of the strategy
+
+        The event is applied to the overall state and, if the state of the user is loaded, to the state of the user
+
+        Parameters
+        ----------
+        user_id : str | None
+            the ID of the user
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters (negative to release a selection)
+        """
+        self._apply_global_event(system, sample_id, delta)
+        if (user_id is not None) and ((self._journal is None) or (user_id in self._user_activity)):
+            self._apply_user_event(user_id, system, sample_id, delta)
+
+    def _apply_global_event(self, system: str, sample_id: int, delta: int) -> None:
+        """Apply a selection event to the overall state (the counters) of the strategy
+
+        This method should be overriden by the subclasses having a state. The events can come from another
+        process, therefore the unknown systems or samples should be ignored.
+
+        Parameters
+        ----------
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters (negative to release a selection)
+        """
+        pass
+
+    def _apply_user_event(self, user_id: str, system: str, sample_id: int, delta: int) -> None:
+        """Apply a selection event to the state of a user
+
+        This method should be overriden by the subclasses having a state per user (see HAS_USER_STATE)
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters (negative to release a selection)
+        """
+        pass
+
+    def _reset_user(self, user_id: str) -> None:
+        """Forget the state of a given user (before reloading it from the journal)
+
+        This method should be overriden by the subclasses having a state per user (see HAS_USER_STATE)
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        """
+        pass
 
     def _select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
         """Select sample method
 
-        This method should be overriden by the subclasses
+        This method should be overriden by the subclasses. It should not modify the state of the strategy
+        which is only updated by _apply_event
 
         Parameters
         ----------
@@ -72,6 +638,16 @@ class SelectionBase:
         """
         raise NotImplementedError(f'The class "{self.__class__.__name__}" should override the method "_select_samples"')
 
+    def lock_statistics(self) -> dict[str, float]:
+        """Get the contention counters of the selection lock
+
+        Returns
+        -------
+        dict[str, float]
+            The number of acquisitions, of contentions and the total and longest waiting times in seconds
+        """
+        return self._lock.statistics()
+
     @property
     def systems(self):
         return self._systems
@@ -0,0 +1,621 @@
+from typing import Any
+from collections.abc import Hashable, Iterable, Iterator
+import heapq
+import random
+
+import numpy as np
+
+
+def least_indexes(counts: np.ndarray, k: int, available: np.ndarray | None = None) -> list[int]:
+    """Get the indexes of the k lowest counts of an array
+
+    The indexes are taken from the lowest count first. The ties are
+    broken randomly and the returned list is shuffled.
+
+    Parameters
+    ----------
+    counts: np.ndarray
+        The counts
+    k: int
+        The number of indexes, all the available indexes if k is negative
+    available: np.ndarray | None
+        The mask of the indexes which can be selected (all of them if None)
+
+    Returns
+    -------
+    list[int]
+        The indexes of the k lowest counts (less if there are less than k available indexes)
+    """
+    available = np.ones(len(counts), dtype=bool) if available is None else available.copy()
+    nb_available = int(np.count_nonzero(available))
+    if (k < 0) or (k >= nb_available):
+        indexes = np.flatnonzero(available).tolist()
+        random.shuffle(indexes)
+        return indexes
+
+    indexes = []
+    while len(indexes) < k:
+        candidates = np.flatnonzero(available & (counts == counts[available].min())).tolist()
+        if len(candidates) > k - len(indexes):
+            candidates = random.sample(candidates, k - len(indexes))
+        indexes += candidates
+        available[candidates] = False
+
+    random.shuffle(indexes)
+    return indexes
+
+
+class BucketCounter:
+    """Counters of items grouped by count (count -> items)
+
+    Each bucket is a list associated to a map giving the position of
+    each item in its bucket, so moving an item from a bucket to another
+    one is a O(1) swap-remove. Taking the k least seen items is
+    therefore O(k) and doesn't require to sort the counters.
+    """
+
+    def __init__(self, items: Iterable[Hashable] = [], count: int = 0) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        items: Iterable[Hashable]
+            The items to count
+        count: int
+            The initial count of the items
+        """
+        self._counts: dict[Hashable, int] = dict()
+        self._buckets: dict[int, list[Hashable]] = dict()
+        self._positions: dict[Hashable, int] = dict()
+        self._min_count: int = count
+
+        for item in items:
+            self.add(item, count)
+
+    def __repr__(self) -> str:
+        return repr(self._counts)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._counts
+
+    def __getitem__(self, item: Hashable) -> int:
+        return self._counts[item]
+
+    def items(self) -> Iterable[tuple[Hashable, int]]:
+        """Get the items and their count
+
+        Returns
+        -------
+        Iterable[tuple[Hashable, int]]
+            The pairs (item, count)
+        """
+        return self._counts.items()
+
+    @property
+    def min_count(self) -> int:
+        """Get the lowest count
+
+        Returns
+        -------
+        int
+            the lowest count (0 if there is no item)
+        """
+        return self._min_count
+
+    def add(self, item: Hashable, count: int = 0) -> None:
+        """Add a new item
+
+        Parameters
+        ----------
+        item: Hashable
+            The item
+        count: int
+            The initial count of the item
+        """
+        if item in self._counts:
+            raise KeyError(f"The item {item} is already counted")
+
+        if (len(self._counts) == 0) or (count < self._min_count):
+            self._min_count = count
+
+        self._counts[item] = count
+        self._push(item, count)
+
+    def increment(self, item: Hashable, delta: int = 1) -> int:
+        """Increment (or decrement if delta is negative) the count of an item
+
+        Parameters
+        ----------
+        item: Hashable
+            The item
+        delta: int
+            The value added to the count
+
+        Returns
+        -------
+        int
+            the new count of the item
+        """
+        count = self._counts[item]
+        if delta == 0:
+            return count
+
+        self._pop(item, count)
+        self._counts[item] = count + delta
+        self._push(item, count + delta)
+
+        # Update the lowest count
+        if count + delta < self._min_count:
+            self._min_count = count + delta
+        elif (count == self._min_count) and (count not in self._buckets):
+            self._min_count = min(self._buckets.keys())
+
+        return count + delta
+
+    def least(self, k: int) -> list[Any]:
+        """Get the k least seen items (without incrementing them)
+
+        The items are taken from the lowest count bucket first. The ties
+        are broken randomly and the returned list is shuffled.
+
+        Parameters
+        ----------
+        k: int
+            The number of items, all the items if k is negative
+
+        Returns
+        -------
+        list[Any]
+            The k least seen items (less if there are less than k items)
+        """
+        if (k < 0) or (k >= len(self._counts)):
+            selected = list(self._counts.keys())
+            random.shuffle(selected)
+            return selected
+
+        selected = []
+        for count in self._ascending_counts():
+            bucket = self._buckets[count]
+            if len(bucket) <= k - len(selected):
+                selected += bucket
+            else:
+                selected += random.sample(bucket, k - len(selected))
+
+            if len(selected) == k:
+                break
+
+        random.shuffle(selected)
+        return selected
+
+    def take_least(self, k: int) -> list[Any]:
+        """Get the k least seen items and increment their count
+
+        Parameters
+        ----------
+        k: int
+            The number of items, all the items if k is negative
+
+        Returns
+        -------
+        list[Any]
+            The k least seen items
+        """
+        selected = self.least(k)
+        for item in selected:
+            self.increment(item)
+        return selected
+
+    def _ascending_counts(self) -> Iterator[int]:
+        """Iterate over the counts of the non-empty buckets in ascending order
+
+        NOTE: only the bucket of the lowest count is generally needed, so the other ones are only sorted if required
+        """
+        yield self._min_count
+        yield from sorted(count for count in self._buckets.keys() if count > self._min_count)
+
+    def _push(self, item: Hashable, count: int) -> None:
+        """Append an item to the bucket of a given count"""
+        bucket = self._buckets.setdefault(count, [])
+        self._positions[item] = len(bucket)
+        bucket.append(item)
+
+    def _pop(self, item: Hashable, count: int) -> None:
+        """Remove an item from the bucket of a given count (swapping it with the last item of the bucket)"""
+        bucket = self._buckets[count]
+        position = self._positions.pop(item)
+        last = bucket.pop()
+        if last != item:
+            bucket[position] = last
+            self._positions[last] = position
+
+        if len(bucket) == 0:
+            del self._buckets[count]
+
+
+class ArrayCounter:
+    """Counters of a fixed list of items stored in an array
+
+    The array can be a view on a memory shared by several processes
+    (see SharedArray), so the counters have the same interface as the
+    BucketCounter but don't maintain any derived structure: the least
+    seen items are found with vectorized operations on the array.
+    """
+
+    def __init__(self, items: Iterable[Hashable], counts: np.ndarray) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        items: Iterable[Hashable]
+            The items to count
+        counts: np.ndarray
+            The array storing the counts (one element per item)
+        """
+        self._items: list[Hashable] = list(items)
+        self._indexes: dict[Hashable, int] = dict([(item, index) for index, item in enumerate(self._items)])
+        if counts.shape != (len(self._items),):
+            raise ValueError(f"The array of counts should contain {len(self._items)} elements, not {counts.shape}")
+        self._counts = counts
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._indexes
+
+    def __getitem__(self, item: Hashable) -> int:
+        return int(self._counts[self._indexes[item]])
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Get the array of the counts (in the order of the items)
+
+        Returns
+        -------
+        np.ndarray
+            The array of the counts
+        """
+        return self._counts
+
+    def index(self, item: Hashable) -> int:
+        """Get the position of an item in the array of the counts
+
+        Parameters
+        ----------
+        item: Hashable
+            The item
+
+        Returns
+        -------
+        int
+            The position of the item
+        """
+        return self._indexes[item]
+
+    def items(self) -> Iterable[tuple[Hashable, int]]:
+        """Get the items and their count
+
+        Returns
+        -------
+        Iterable[tuple[Hashable, int]]
+            The pairs (item, count)
+        """
+        return zip(self._items, self._counts.tolist())
+
+    @property
+    def min_count(self) -> int:
+        """Get the lowest count
+
+        Returns
+        -------
+        int
+            the lowest count (0 if there is no item)
+        """
+        return int(self._counts.min()) if len(self._items) > 0 else 0
+
+    def increment(self, item: Hashable, delta: int = 1) -> int:
+        """Increment (or decrement if delta is negative) the count of an item
+
+        Parameters
+        ----------
+        item: Hashable
+            The item
+        delta: int
+            The value added to the count
+
+        Returns
+        -------
+        int
+            the new count of the item
+        """
+        index = self._indexes[item]
+        self._counts[index] += delta
+        return int(self._counts[index])
+
+    def least(self, k: int) -> list[Any]:
+        """Get the k least seen items (without incrementing them)
+
+        The items are taken from the lowest count first. The ties are
+        broken randomly and the returned list is shuffled.
+
+        Parameters
+        ----------
+        k: int
+            The number of items, all the items if k is negative
+
+        Returns
+        -------
+        list[Any]
+            The k least seen items (less if there are less than k items)
+        """
+        # NOTE: the counts are copied as they can be modified by another process
+        return [self._items[index] for index in least_indexes(self._counts.copy(), k)]
+
+    def take_least(self, k: int) -> list[Any]:
+        """Get the k least seen items and increment their count
+
+        Parameters
+        ----------
+        k: int
+            The number of items, all the items if k is negative
+
+        Returns
+        -------
+        list[Any]
+            The k least seen items
+        """
+        selected = self.least(k)
+        for item in selected:
+            self.increment(item)
+        return selected
+
+
+class SparseMatrixCounter:
+    """Counters of the cells of a matrix storing only the non-zero cells
+
+    This is used for the per-user counters where most of the cells are
+    never seen by a given user. The dense matrix is only built when
+    needed (i.e., during a selection).
+    """
+
+    def __init__(self, shape: tuple[int, int]) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        shape: tuple[int, int]
+            The shape of the matrix
+        """
+        self._shape = shape
+        self._cells: dict[int, int] = dict()
+
+    def __repr__(self) -> str:
+        return repr(dict([(divmod(index, self._shape[1]), count) for index, count in self._cells.items()]))
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __getitem__(self, cell: tuple[int, int]) -> int:
+        return self._cells.get(cell[0] * self._shape[1] + cell[1], 0)
+
+    def increment(self, cell: tuple[int, int], delta: int = 1) -> int:
+        """Increment (or decrement if delta is negative) the count of a cell
+
+        Parameters
+        ----------
+        cell: tuple[int, int]
+            The (row, column) of the cell
+        delta: int
+            The value added to the count
+
+        Returns
+        -------
+        int
+            the new count of the cell
+        """
+        index = cell[0] * self._shape[1] + cell[1]
+        count = self._cells.get(index, 0) + delta
+        if count == 0:
+            self._cells.pop(index, None)
+        else:
+            self._cells[index] = count
+        return count
+
+    def to_dense(self) -> np.ndarray:
+        """Build the dense matrix of the counts
+
+        Returns
+        -------
+        np.ndarray
+            The matrix of the counts
+        """
+        dense = np.zeros(self._shape[0] * self._shape[1], dtype=np.int64)
+        if len(self._cells) > 0:
+            dense[np.fromiter(self._cells.keys(), dtype=np.int64, count=len(self._cells))] = np.fromiter(
+                self._cells.values(), dtype=np.int64, count=len(self._cells)
+            )
+        return dense.reshape(self._shape)
+
+
+class DeficitHeap:
+    """Priority queue of items ordered by their remaining deficit (target - count), the largest deficit first
+
+    Only the items whose quota isn't met are in the queue. Updating an item pushes a new entry in O(log n); the
+    outdated entries are invalidated lazily (dropped when they reach the top of the heap), so an item whose quota
+    is met simply leaves the queue. The heap is rebuilt when the outdated entries outnumber the valid ones.
+    """
+
+    def __init__(self, targets: dict[Hashable, int]) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        targets: dict[Hashable, int]
+            The target count of each item
+        """
+        self._deficits: dict[Hashable, int] = dict(targets)
+        self._nb_open: int = 0
+        self._heap: list[tuple[int, float, Hashable]] = []
+        self._rebuild()
+
+    def __repr__(self) -> str:
+        return repr(self._deficits)
+
+    def __len__(self) -> int:
+        return self._nb_open
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._deficits
+
+    def __getitem__(self, item: Hashable) -> int:
+        return self._deficits[item]
+
+    def items(self) -> Iterable[tuple[Hashable, int]]:
+        """Get the items and their deficit
+
+        Returns
+        -------
+        Iterable[tuple[Hashable, int]]
+            The pairs (item, deficit), the deficit being negative if the item exceeded its target
+        """
+        return self._deficits.items()
+
+    def increment(self, item: Hashable, delta: int = 1) -> int:
+        """Increment (or decrement if delta is negative) the count of an item
+
+        Parameters
+        ----------
+        item: Hashable
+            The item
+        delta: int
+            The value added to the count
+
+        Returns
+        -------
+        int
+            the new deficit of the item
+        """
+        deficit = self._deficits[item]
+        if delta == 0:
+            return deficit
+
+        self._deficits[item] = deficit - delta
+        self._nb_open += int(deficit - delta > 0) - int(deficit > 0)
+        if deficit - delta > 0:
+            heapq.heappush(self._heap, (delta - deficit, random.random(), item))
+
+        if len(self._heap) > 2 * len(self._deficits) + 16:
+            self._rebuild()
+
+        return deficit - delta
+
+    def largest(self, k: int) -> list[Any]:
+        """Get the k items with the largest deficit (without incrementing them)
+
+        The ties are broken randomly and the returned list is shuffled.
+
+        Parameters
+        ----------
+        k: int
+            The number of items, all the items whose quota isn't met if k is negative
+
+        Returns
+        -------
+        list[Any]
+            The k items with the largest deficit (less if there are less than k items whose quota isn't met)
+        """
+        if (k < 0) or (k > self._nb_open):
+            k = self._nb_open
+
+        selected: list[Hashable] = []
+        entries: list[tuple[int, float, Hashable]] = []
+        while len(selected) < k:
+            entry = heapq.heappop(self._heap)
+            neg_deficit, _, item = entry
+            if (-neg_deficit != self._deficits[item]) or (item in selected):
+                continue
+            selected.append(item)
+            entries.append(entry)
+
+        # NOTE: the valid entries are pushed back as the selection doesn't modify the queue
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+
+        random.shuffle(selected)
+        return selected
+
+    def _rebuild(self) -> None:
+        """Rebuild the heap from the items whose quota isn't met (dropping the outdated entries)"""
+        self._heap = [(-deficit, random.random(), item) for item, deficit in self._deficits.items() if deficit > 0]
+        heapq.heapify(self._heap)
+        self._nb_open = len(self._heap)
+
+
+class BitMask:
+    """Mask of a fixed number of positions stored as a packed bit array
+
+    This is used for the per-user "seen" masks: one bit per sample.
+    """
+
+    def __init__(self, size: int) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        size: int
+            The number of positions
+        """
+        self._size = size
+        self._bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, position: int) -> bool:
+        return bool(self._bits[position >> 3] & (0x80 >> (position & 7)))
+
+    def set(self, position: int) -> None:
+        """Set a position of the mask
+
+        Parameters
+        ----------
+        position: int
+            The position
+        """
+        self._bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def clear(self, position: int) -> None:
+        """Clear a position of the mask
+
+        Parameters
+        ----------
+        position: int
+            The position
+        """
+        self._bits[position >> 3] &= ~np.uint8(0x80 >> (position & 7))
+
+    def count(self) -> int:
+        """Get the number of set positions
+
+        Returns
+        -------
+        int
+            The number of set positions
+        """
+        return int(np.unpackbits(self._bits, count=self._size).sum())
+
+    def to_array(self) -> np.ndarray:
+        """Unpack the mask
+
+        Returns
+        -------
+        np.ndarray
+            The boolean array of the positions
+        """
+        return np.unpackbits(self._bits, count=self._size).astype(bool)
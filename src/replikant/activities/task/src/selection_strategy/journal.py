@@ -0,0 +1,193 @@
+from typing import Callable
+import logging
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.engine import Connection
+
+from replikant.database import db, write_rows
+from ...model import Sample, SelectionEvent, TaskModel
+
+# The function applying an event (user_id, system, sample_id, delta) to the state of a strategy
+EventCallback = Callable[[str | None, str, int, int], None]
+
+
+class SelectionJournal:
+    """Journal of the selections of a task persisted in the database
+
+    The counters of the selection strategies are derived from the
+    journal: every selection is appended to it and each process
+    replays the events it hasn't seen yet (the ones after its
+    watermark) before selecting. As the replay and the selection are
+    done in an exclusive transaction, all the processes share one
+    consistent balance.
+    """
+
+    def __init__(self, task: str, task_model: type[TaskModel] | None = None):
+        """Constructor
+
+        Parameters
+        ----------
+        task: str
+            The name of the task
+        task_model: type[TaskModel] | None
+            The model of the table containing the results of the task, used to seed the journal of a task
+            which was run before the journal existed
+        """
+        self._logger = logging.getLogger(f"{self.__class__.__name__} ({task})")
+        self._task = task
+        self._task_model = task_model
+        self._watermark: int | None = None
+
+    def seed(self, conn: Connection) -> int:
+        """Seed the journal from the results of the task if the journal of the task is empty
+
+        Each sample recorded by a participant in a given step counts as one selection
+
+        Parameters
+        ----------
+        conn: Connection
+            The connection of the exclusive transaction
+
+        Returns
+        -------
+        int
+            The number of events created
+        """
+        if self._task_model is None:
+            return 0
+
+        table = SelectionEvent.__table__
+        if conn.execute(select(table.c.id).where(table.c.task == self._task).limit(1)).first() is not None:
+            return 0
+
+        task_model = self._task_model
+        steps = (
+            select(task_model.user_id, task_model.step_idx, task_model.sample_id)
+            .where(task_model.operation_type == "record")
+            .distinct()
+            .subquery()
+        )
+        query = (
+            select(literal(self._task), steps.c.user_id, Sample.system, steps.c.sample_id, literal(1))
+            .join(Sample, Sample.id == steps.c.sample_id)  # type: ignore
+            .order_by(steps.c.user_id, steps.c.step_idx)
+        )
+        result = conn.execute(
+            insert(table).from_select(["task", "user_id", "system", "sample_id", "delta"], query)
+        )
+        if result.rowcount > 0:
+            self._logger.info(f"The selection journal has been seeded with {result.rowcount} events")
+        return result.rowcount
+
+    def record(self, conn: Connection, events: list[tuple[str | None, str, int, int]]) -> None:
+        """Append events to the journal
+
+        Parameters
+        ----------
+        conn: Connection
+            The connection of the exclusive transaction
+        events: list[tuple[str | None, str, int, int]]
+            The events (user_id, system, sample_id, delta)
+        """
+        if len(events) == 0:
+            return
+
+        conn.execute(insert(SelectionEvent.__table__), self._rows(events))
+
+    def append(self, events: list[tuple[str | None, str, int, int]]) -> None:
+        """Append events to the journal in their own transaction
+
+        This is used when the counters are shared by the processes, so the journal is only needed to restore them
+
+        Parameters
+        ----------
+        events: list[tuple[str | None, str, int, int]]
+            The events (user_id, system, sample_id, delta)
+        """
+        write_rows(SelectionEvent, self._rows(events), wait=True)
+
+    def user_events(self, user_id: str, conn: Connection | None = None) -> list[tuple[str, int, int]]:
+        """Get the events of a given participant aggregated per sample (in the order of the selections)
+
+        Parameters
+        ----------
+        user_id: str
+            The ID of the participant
+        conn: Connection | None
+            The connection to use (a new connection is opened if None)
+
+        Returns
+        -------
+        list[tuple[str, int, int]]
+            The aggregated events (system, sample_id, delta) of the participant
+        """
+        if conn is None:
+            with db.engine.connect() as new_conn:
+                return self.user_events(user_id, new_conn)
+
+        table = SelectionEvent.__table__
+        query = (
+            select(table.c.system, table.c.sample_id, func.sum(table.c.delta))
+            .where(table.c.task == self._task, table.c.user_id == user_id)
+            .group_by(table.c.system, table.c.sample_id)
+            .order_by(func.min(table.c.id))
+        )
+        return [(system, sample_id, delta) for system, sample_id, delta in conn.execute(query) if delta != 0]
+
+    def _rows(self, events: list[tuple[str | None, str, int, int]]) -> list[dict]:
+        """Convert events to rows of the journal table"""
+        return [
+            dict(task=self._task, user_id=user_id, system=system, sample_id=sample_id, delta=delta)
+            for user_id, system, sample_id, delta in events
+        ]
+
+    def sync(self, apply_event: EventCallback, conn: Connection | None = None) -> int:
+        """Apply the events of the journal which haven't been applied yet
+
+        The first synchronisation loads the whole journal in one pass, aggregating the events of each
+        (participant, sample) pair, the following ones apply the new events in order.
+
+        Parameters
+        ----------
+        apply_event: EventCallback
+            The function applying an event to the state of the strategy
+        conn: Connection | None
+            The connection to use (a new connection is opened if None)
+
+        Returns
+        -------
+        int
+            The number of applied events
+        """
+        if conn is None:
+            with db.engine.connect() as new_conn:
+                return self.sync(apply_event, new_conn)
+
+        table = SelectionEvent.__table__
+        if self._watermark is None:
+            self.seed(conn)
+            query = (
+                select(
+                    table.c.user_id, table.c.system, table.c.sample_id, func.sum(table.c.delta), func.max(table.c.id)
+                )
+                .where(table.c.task == self._task)
+                .group_by(table.c.user_id, table.c.system, table.c.sample_id)
+                .order_by(func.min(table.c.id))
+            )
+        else:
+            query = (
+                select(table.c.user_id, table.c.system, table.c.sample_id, table.c.delta, table.c.id)
+                .where(table.c.task == self._task, table.c.id > self._watermark)
+                .order_by(table.c.id)
+            )
+
+        nb_events = 0
+        watermark = self._watermark if self._watermark is not None else 0
+        for user_id, system, sample_id, delta, event_id in conn.execute(query):
+            if delta != 0:
+                apply_event(user_id, system, sample_id, delta)
+                nb_events += 1
+            watermark = max(watermark, event_id)
+        self._watermark = watermark
+
+        return nb_events
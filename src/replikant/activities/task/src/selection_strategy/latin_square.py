@@ -1,9 +1,11 @@
 import numpy as np
+from sqlalchemy import insert, select
 
 from replikant.core import User
+from replikant.database import exclusive_transaction
 from ...model import Sample
 from ..system import System
-from .core import SelectionBase
+from .precomputed import PrecomputedSelection
 
 
 def williams_latin_square(n: int) -> np.array:
@@ -40,10 +42,20 @@ def williams_latin_square(n: int) -> np.array:
     return square
 
 
-class LatinSquareSelection(SelectionBase):
-    """Class implementing the selection strategy based on the Latin Square paradigm"""
+class LatinSquareSelection(PrecomputedSelection):
+    """Class implementing the selection strategy based on the Latin Square paradigm
 
-    def __init__(self, systems: dict[str, System], randomize: bool = False) -> None:
+    The systems are assumed to have aligned samples (the same utterances in the same order). The participants are
+    distributed in groups, each group corresponding to a row of a William's latin square: at step j, the participant
+    evaluates the utterance j of the system given by the column j (modulo the number of systems) of the row.
+
+    The group table is built once, stored as the design of the task (see PrecomputedSelection) and the groups are
+    assigned in turn using the atomic slot counter of the design.
+    """
+
+    WARN_SLOT_REUSE = False
+
+    def __init__(self, systems: dict[str, System], randomize: bool = False, **kwargs) -> None:
         """Constructor
 
         Parameters
@@ -52,59 +64,99 @@ class LatinSquareSelection(SelectionBase):
             The dictionnary of systems indexed by their names
         randomize: bool
             Flag to determine if a randomization should be done on top of the LS selection [default: False]
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
         """
-        super().__init__(systems)
+        super().__init__(systems, **kwargs)
+
+        # The utterances are aligned, so only the utterances available for all the systems are used
+        self._nb_utts = min([len(cur_system.samples) for cur_system in systems.values()])
+        if any([len(cur_system.samples) != self._nb_utts for cur_system in systems.values()]):
+            self._logger.warning(f"The systems don't have the same number of samples, only {self._nb_utts} are used")
 
-        # Prepare the core
-        list_systems = list(systems.keys())
+        if self.nb_slots == 0:
+            nb_rows = self.build_groups(randomize)
+            self._logger.info(f"The latin square groups have been generated ({nb_rows} samples)")
 
-        self._samples = [None] * (len(list_systems) ** 2)
-        # self._samples = [sample.id for _, cur_system in systems.items() for sample in cur_system[0].system_samples]
+    def build_groups(self, randomize: bool = False) -> int:
+        """Generate the groups and store them as the design of the task (if no other process did it)
+
+        Parameters
+        ----------
+        randomize: bool
+            Flag to determine if the order of the steps of each group should be randomized
+
+        Returns
+        -------
+        int
+            The number of generated rows (0 if the groups were already generated)
+        """
+        list_systems = list(self.systems.keys())
 
         # Compute the latin square using the William's design
         square = williams_latin_square(len(list_systems))
-        self._logger.debug(f"Generating latin square of shape {square.shape}")
-
-        # Generate the groups
-        self._groups = np.zeros(square.shape).astype(int)
-        for seq_idx in range(square.shape[0]):
-            for sample_idx in range(square.shape[1]):
-                system_idx = square[seq_idx][sample_idx]
-                self._logger.debug(
-                    f"Number of samples for system {systems[list_systems[system_idx]][0]} => "
-                    + f"{len(systems[list_systems[system_idx]][0].system_samples)} [{len(self._samples)}]"
-                )
-                sample = systems[list_systems[system_idx]][0].system_samples[sample_idx]
-                self._groups[seq_idx][sample_idx] = sample.id - 1
-                self._samples[sample.id - 1] = sample
-
-        self._logger.debug(f"The square obtain for {len(list_systems)} systems:\n{self._groups}")
-
-        if randomize:
-            for seq_idx in range(square.shape[0]):
-                np.random.shuffle(self._groups[seq_idx])
-            self._logger.debug(f"Randomization required, new square:\n{self._groups}")
-
-    def _select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
+        self._logger.debug(f"The square obtained for {len(list_systems)} systems:\n{square}")
+
+        rows = []
+        for group_idx in range(square.shape[0]):
+            utt_order = np.arange(self._nb_utts)
+            if randomize:
+                np.random.shuffle(utt_order)
+
+            for step_idx, utt_idx in enumerate(utt_order):
+                system_name = list_systems[square[group_idx][utt_idx % square.shape[1]]]
+                sample = self.systems[system_name].samples[utt_idx]
+                rows.append(dict(slot=group_idx, step_idx=step_idx, system=system_name, sample_id=sample.id))
+
+        table = self._design_model.__table__
+        with exclusive_transaction() as conn:
+            if conn.execute(select(table.c.id).limit(1)).first() is not None:
+                return 0
+            conn.execute(insert(table), rows)
+
+        return len(rows)
+
+    def _design_step(self, id_step: int) -> int:
+        """Get the step of the design corresponding to a step of the participant
+
+        The steps after the last utterance start again from the first one
+
+        Parameters
+        ----------
+        id_step: int
+            The step of the participant
+
+        Returns
+        -------
+        int
+            The step of the design
+        """
+        return id_step % self._nb_utts
+
+    def select_steps(
+        self, user: User, first_step: int, nb_steps: int, nb_systems: int, nb_samples: int
+    ) -> list[dict[str, list[Sample]]]:
         """Method to select the samples using the Latin Square strategy.
 
         For now, only one system & one sample is supported
 
         Parameters
         ----------
-        user: User
-            The participant
-        id_step: int
-            The current step for the given participant
-        nb_systems: int
-            The desired number of systems
-        nb_samples: int
-            The desired number of samples
+        user : User
+            the user
+        first_step: int
+            The first step to select for the given participant
+        nb_steps: int
+            The number of steps to select
+        nb_systems : int
+            the number of systems per step
+        nb_samples : int
+            the number of samples per system
 
         Returns
         -------
-        dict[str, list[SampleModel]]
-            The dictionary providing for a system name the associated sample embedded in a list
+        list[dict[str, list[Sample]]]
+            The selected samples indexed by system name for each step
 
         Raises
         ------
@@ -115,19 +167,4 @@ class LatinSquareSelection(SelectionBase):
         assert nb_systems == 1, f"For the latin-square algorithm, we can only select one system, {nb_systems} are asked"
         assert nb_samples == 1, f"For the latin-square algorithm, we can only select one sample, {nb_samples} are asked"
 
-        # Get the user group
-        user_group = user.id % self._groups.shape[0]
-        self._logger.debug(f"{user.id} has the user group {user_group}")
-
-        # Get the samples now
-        sample_idx = id_step % self._groups.shape[1]
-        sample = self._samples[self._groups[user_group][sample_idx]]
-
-        # Select the samples
-        self._logger.debug(f"Select samples for user {user.user_id}")
-        dict_samples = dict()
-        dict_samples[sample.system] = [sample]
-
-        self._logger.info(f"This is what we will give to {user.user_id}: {dict_samples}")
-
-        return dict_samples
+        return super().select_steps(user, first_step, nb_steps, nb_systems, nb_samples)
@@ -1,12 +1,13 @@
-from typing import Any
-import numpy as np
-import math
+import heapq
 import random
 
+import numpy as np
+
 from replikant.core import User
 from ...model import Sample
 from ..system import System
 from .core import SelectionBase
+from .counters import ArrayCounter, BitMask, BucketCounter, SparseMatrixCounter, least_indexes
 
 
 class LeastSeenSelection(SelectionBase):
@@ -17,30 +18,62 @@ class LeastSeenSelection(SelectionBase):
     Everything is then randomized and *NO ORDER* is ensured.
     """
 
-    def __init__(self, systems: dict[str, System]) -> None:
+    def __init__(self, systems: dict[str, System], **kwargs) -> None:
         """Constructor
 
         Parameters
         ----------
         systems: dict[str, System]
             The dictionnary of systems indexed by their names
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
         """
-        super().__init__(systems)
+        super().__init__(systems, **kwargs)
+
+        # Initialize content elements (the samples of each system indexed by their ID)
+        self._system_samples: dict[str, dict[int, Sample]] = dict(
+            [
+                (name, dict([(sample.id, sample) for sample in cur_system.samples]))
+                for name, cur_system in systems.items()
+            ]
+        )
 
-        # Initialize content elements
-        self._samples = [sample.id for _, cur_system in systems.items() for sample in cur_system.samples]
+        # Initialize counters (the samples are counted per system as they are only selected among the system ones)
+        self._system_counters: BucketCounter | ArrayCounter = self._create_counter("systems", list(systems.keys()))
+        self._sample_counters: dict[str, BucketCounter | ArrayCounter] = dict(
+            [
+                (name, self._create_sample_counter(name, list(samples.keys())))
+                for name, samples in self._system_samples.items()
+            ]
+        )
 
-        # Initialize counters
-        self._system_counters: dict[str, int] = dict([(cur_system, 0) for cur_system in systems.keys()])
-        self._sample_counters: dict[Any, int] = dict([(cur_sample, 0) for cur_sample in self._samples])
+    def _create_sample_counter(self, system_name: str, sample_ids: list[int]) -> BucketCounter | ArrayCounter:
+        """Create the sample counters of a system
+
+        Parameters
+        ----------
+        system_name: str
+            The name of the system
+        sample_ids: list[int]
+            The IDs of the samples of the system
+
+        Returns
+        -------
+        BucketCounter | ArrayCounter
+            The counters of the samples
+        """
+        return self._create_counter(f"samples/{system_name}", sample_ids)
 
     def select_systems(self, nb_systems: int) -> list[str]:
         """Select a certain amount systems among the least seen ones
 
+        The systems are taken among the least seen ones (ties are broken randomly). If there are not enough systems
+        seen the least, the pool is completed with the next least seen ones.
+
         Parameters
         ----------
         nb_systems: int
-            The desired number of systems for one step
+            The desired number of systems for one step (all the systems if negative)
 
         Returns
         -------
@@ -48,40 +81,14 @@ class LeastSeenSelection(SelectionBase):
             the list of names of the selected systems
         """
 
-        # Sort systems by descending order of usage
-        pool_systems = sorted(self._system_counters.items(), key=lambda item: item[1])
-
         # Assert/Fix the number of required systems
-        assert (nb_systems <= len(pool_systems)) and (nb_systems != 0), (
+        assert (nb_systems <= len(self._system_counters)) and (nb_systems != 0), (
             f"The required number of systems ({nb_systems}) is greater than the available number of systems "
-            + f"({len(pool_systems)}) or it is 0"
+            + f"({len(self._system_counters)}) or it is 0"
         )
 
-        # Preparing pool of systems
-        if nb_systems > 0:
-            min_count = math.inf
-            tmp_pool = []
-            for system, count in pool_systems:
-                if count > min_count:
-                    break
-
-                tmp_pool.append((system, count))
-                min_count = count
-
-            pool_systems = tmp_pool
-
-        # Ignore the counting from now, we are only interested with the systems themselves
-        pool_systems = [system[0] for system in pool_systems]
-
-        # Shuffle the systems to guarantee variation in the presentation order
-        random.shuffle(pool_systems)
-
-        # Select the desired number of systems
-        pool_systems = pool_systems[:nb_systems]
-        for p in pool_systems:
-            self._system_counters[p] += 1
-
-        return pool_systems
+        # Select the desired number of systems (shuffled to guarantee variation in the presentation order)
+        return self._system_counters.least(nb_systems)
 
     def internal_select_samples(self, system_name: str, nb_samples: int) -> list[Sample]:
         """Select a given number of samples of a given system
@@ -98,44 +105,36 @@ class LeastSeenSelection(SelectionBase):
         list[Sample]
             The list of selected samples
         """
-        # Subset the list of samples
-        dict_samples = dict([(sample.id, sample) for sample in self.systems[system_name].samples])
-        sample_subset = {sample_id: self._sample_counters[sample_id] for sample_id in dict_samples.keys()}
-
-        # Sort by counting the pool of samples
-        pool_samples = sorted(sample_subset.items(), key=lambda item: item[1])
+        sample_counters = self._sample_counters[system_name]
 
         # Assert/Fix the number of required samples
-        assert (nb_samples <= len(pool_samples)) and (nb_samples != 0), (
+        assert (nb_samples <= len(sample_counters)) and (nb_samples != 0), (
             f"The required number of samples ({nb_samples}) is greater than the available number of samples "
-            + f"({len(pool_samples)}) or it is 0"
+            + f"({len(sample_counters)}) or it is 0"
         )
 
-        # Preparing pool of samples
-        if nb_samples > 0:
-            min_count = math.inf  # NOTE: Infinite is hardcoded here!
-            tmp_pool = []
-            for sample, count in pool_samples:
-                if count > min_count:
-                    break
-
-                tmp_pool.append((sample, count))
-                min_count = count
+        # Select the desired number of samples (shuffled to guarantee variation in the presentation order)
+        pool_samples = sample_counters.least(nb_samples)
 
-            pool_samples = tmp_pool
+        return [self._system_samples[system_name][sample_id] for sample_id in pool_samples]
 
-        # Ignore the counting from now, we are only interested with the samples themselves
-        pool_samples = [sample[0] for sample in pool_samples]
+    def _apply_global_event(self, system: str, sample_id: int, delta: int) -> None:
+        """Update the system and sample counters
 
-        # Shuffle the samples to guarantee variation in the presentation order
-        random.shuffle(pool_samples)
-
-        # Select the desired number of samples
-        pool_samples = pool_samples[:nb_samples]
-        for p in pool_samples:
-            self._sample_counters[p] += 1
+        Parameters
+        ----------
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters
+        """
+        if (system not in self._sample_counters) or (sample_id not in self._sample_counters[system]):
+            return
 
-        return [dict_samples[sample_id] for sample_id in pool_samples]
+        self._system_counters.increment(system, delta)
+        self._sample_counters[system].increment(sample_id, delta)
 
     def _select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
         """Method to select a given number of samples for a given number of systems for a specific user
@@ -187,19 +186,25 @@ class LeastSeenSampleAlignedSelection(LeastSeenSelection):
     The order will be randomized but
     """
 
-    def __init__(self, systems: dict[str, System]) -> None:
+    def __init__(self, systems: dict[str, System], **kwargs) -> None:
         """Constructor
 
         Parameters
         ----------
         systems: dict[str, System]
             The dictionnary of systems indexed by their names
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
         """
-        super().__init__(systems)
+        super().__init__(systems, **kwargs)
 
+        # NOTE: the samples are aligned, so they are counted by their position in the systems
         system_name = list(systems.keys())[0]
-        nb_systems = len(self.systems[system_name].samples)
-        self._sample_counters = [0 for _ in range(nb_systems)]
+        nb_lines = len(self.systems[system_name].samples)
+        self._line_counters: BucketCounter | ArrayCounter = self._create_counter("lines", list(range(nb_lines)))
+        self._line_indexes: dict[int, int] = dict(
+            [(sample.id, index) for cur_system in systems.values() for index, sample in enumerate(cur_system.samples)]
+        )
 
     def _select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
         """Method to select a given number of samples for a given number of systems for a specific user
@@ -233,11 +238,7 @@ class LeastSeenSampleAlignedSelection(LeastSeenSelection):
         # Select the samples
         self._logger.debug(f"Select samples for user {user.user_id}")
 
-        min_value = min(self._sample_counters)
-        min_indices = [i for i, value in enumerate(self._sample_counters) if value == min_value]
-        random.shuffle(min_indices)
-        min_index = min_indices[0]
-        self._sample_counters[min_index] += 1
+        min_index = self._line_counters.least(1)[0]
 
         dict_samples = dict()
         for system_name in pool_systems:
@@ -247,51 +248,100 @@ class LeastSeenSampleAlignedSelection(LeastSeenSelection):
 
         return dict_samples
 
+    def _apply_global_event(self, system: str, sample_id: int, delta: int) -> None:
+        """Update the system, sample and position counters
+
+        NOTE: the position is counted for each selected system, which doesn't change the balance as the
+              number of systems per step is constant
+
+        Parameters
+        ----------
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters
+        """
+        super()._apply_global_event(system, sample_id, delta)
+        if sample_id in self._line_indexes:
+            self._line_counters.increment(self._line_indexes[sample_id], delta)
+
 
 class LeastSeenPerUserSelection(LeastSeenSelection):
     """Class implementing the selection strategy based on the "least seen" (user focused) paradigm:
     1. list the least seen system(s)
     2. for the the least system(s), select the least seen sample(s)
+
+    The samples seen by a user are stored as a bit mask per system and the sample counters as arrays,
+    so a selection only consists of a few vectorized operations.
     """
 
-    def __init__(self, systems: dict[str, System]) -> None:
+    HAS_USER_STATE = True
+
+    def __init__(self, systems: dict[str, System], **kwargs) -> None:
         """Constructor
 
         Parameters
         ----------
         systems: dict[str, System]
             The dictionnary of systems indexed by their names
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
         """
-        super().__init__(systems)
+        super().__init__(systems, **kwargs)
+
+        self._system_names: list[str] = list(systems.keys())
+        self._system_indexes: dict[str, int] = dict([(name, index) for index, name in enumerate(self._system_names)])
+        self._user_seen: dict[str, dict[str, BitMask]] = dict()
+        self._user_system_counts: dict[str, np.ndarray] = dict()
+
+    def _create_sample_counter(self, system_name: str, sample_ids: list[int]) -> BucketCounter | ArrayCounter:
+        """Create the sample counters of a system as an array (aligned with the masks of the users)
+
+        Parameters
+        ----------
+        system_name: str
+            The name of the system
+        sample_ids: list[int]
+            The IDs of the samples of the system
 
-        self._user_history = dict()
+        Returns
+        -------
+        BucketCounter | ArrayCounter
+            The counters of the samples
+        """
+        return ArrayCounter(sample_ids, self._allocate_counters(f"samples/{system_name}", len(sample_ids)))
 
-    def select_user_systems(self, user_history: dict[str, list[str]], nb_systems: int) -> list[str]:
-        # Get the list of available systems sorted in ascending order
-        system_count_list = [(sys_name, len(seen_samples)) for sys_name, seen_samples in user_history.items()]
-        system_count_list.sort(key=lambda x: x[1])
+    def select_user_systems(self, user_system_counts: np.ndarray, nb_systems: int) -> list[str]:
+        """Select the systems the least seen by a user
 
-        # Get the cutting edge
-        cut_idx = 1
-        start_count = system_count_list[0][1]
-        for cut_idx, cur_elt in enumerate(system_count_list[1:], 1):
-            if cur_elt[1] != start_count:
-                break
+        Parameters
+        ----------
+        user_system_counts: np.ndarray
+            The number of samples of each system seen by the user
+        nb_systems: int
+            The desired number of systems (all the systems if negative)
 
-        # Subset and shuffle
-        if cut_idx < nb_systems:
-            pool_systems = system_count_list[:nb_systems]
-        else:
-            pool_systems = system_count_list[:cut_idx]
-        random.shuffle(pool_systems)
+        Returns
+        -------
+        list[str]
+            the list of names of the selected systems
+        """
+        assert (nb_systems <= len(self._system_names)) and (nb_systems != 0), (
+            f"The required number of systems ({nb_systems}) is greater than the available number of systems "
+            + f"({len(self._system_names)}) or it is 0"
+        )
 
-        return pool_systems[:nb_systems]
+        return [self._system_names[index] for index in least_indexes(user_system_counts, nb_systems)]
 
-    def user_select_samples(self, user_history: list[str], system_name: str, nb_samples: int) -> list[Sample]:
-        """Select a given number of samples of a given system
+    def user_select_samples(self, user_seen: BitMask, system_name: str, nb_samples: int) -> list[Sample]:
+        """Select a given number of samples of a given system among the ones not seen by the user
 
         Parameters
         ----------
+        user_seen: BitMask
+           The mask of the samples of the system seen by the user
         system_name: str
            The name of the system
         nb_samples: int
@@ -302,50 +352,78 @@ class LeastSeenPerUserSelection(LeastSeenSelection):
         list[Sample]
             The list of selected samples
         """
-        # Subset the list of samples
-        dict_samples = dict([(sample.id, sample) for sample in self.systems[system_name].samples])
-        sample_subset = {
-            sample_id: self._sample_counters[sample_id]
-            for sample_id in dict_samples.keys()
-            if sample_id not in user_history
-        }
+        assert nb_samples > 0, f"The required number of samples ({nb_samples}) should be positive"
 
-        # Sort by counting the pool of samples
-        pool_samples = sorted(sample_subset.items(), key=lambda item: item[1])
+        sample_counters = self._sample_counters[system_name]
+        assert isinstance(sample_counters, ArrayCounter)
 
-        # Assert/Fix the number of required samples
-        self._logger.debug(f"Number of samples {nb_samples} from a pool of {len(pool_samples)} samples is required")
-        if nb_samples > len(pool_samples):
-            self._logger.error(f"This should not happen but here is the history for info: {user_history}")
-            return [dict_samples[sample] for sample in user_history[-nb_samples:]]
-        else:
-            assert (nb_samples <= len(pool_samples)) and (nb_samples > 0), (
-                f"The required number of samples ({nb_samples}) is greater "
-                + f"than the available number of samples {len(pool_samples)} or it is 0"
+        # NOTE: if the user has seen all the samples, the samples are selected again among all of them
+        available = ~user_seen.to_array()
+        self._logger.debug(f"Number of samples {nb_samples} from a pool of {available.sum()} samples is required")
+        if nb_samples > available.sum():
+            self._logger.error(f"The user has already seen the samples of {system_name}, some will be seen again")
+            available = None
+
+        indexes = least_indexes(sample_counters.counts.copy(), nb_samples, available)
+        return [self.systems[system_name].samples[index] for index in indexes]
+
+    def get_user_state(self, user_id: str) -> tuple[dict[str, BitMask], np.ndarray]:
+        """Get the samples seen by a given user
+
+        Parameters
+        ----------
+        user_id: str
+            The ID of the user
+
+        Returns
+        -------
+        tuple[dict[str, BitMask], np.ndarray]
+            The masks of the seen samples indexed by system name and the number of samples seen for each system
+        """
+        if user_id not in self._user_seen:
+            self._user_seen[user_id] = dict(
+                [(name, BitMask(len(counters))) for name, counters in self._sample_counters.items()]
             )
+            self._user_system_counts[user_id] = np.zeros(len(self._system_names), dtype=np.int64)
+        return self._user_seen[user_id], self._user_system_counts[user_id]
 
-        # Subset to get the desired number of samples and shuffle to guarantee variation in the presentation order
-        # NOTE: to ensure variability, we first need to take into account the pool of samples seens
-        #       the same amount of time
-        nb_id_samples = 0
-        for nb_id_samples in range(1, len(pool_samples)):
-            if pool_samples[nb_id_samples - 1][1] != pool_samples[nb_id_samples][1]:
-                break
-
-        if nb_id_samples > nb_samples:
-            pool_samples = pool_samples[:nb_id_samples]
-            random.shuffle(pool_samples)
-            pool_samples = pool_samples[:nb_samples]
-        else:
-            pool_samples = pool_samples[:nb_samples]
-            random.shuffle(pool_samples)
-
-        # Select the desired number of samples
-        for sample in pool_samples:
-            self._sample_counters[sample[0]] += 1
-            user_history.append(sample[0])
+    def _reset_user(self, user_id: str) -> None:
+        """Forget the history of a given user
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        """
+        self._user_seen.pop(user_id, None)
+        self._user_system_counts.pop(user_id, None)
 
-        return [dict_samples[sample[0]] for sample in pool_samples]
+    def _apply_user_event(self, user_id: str, system: str, sample_id: int, delta: int) -> None:
+        """Update the history of the user
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters
+        """
+        if (system not in self._sample_counters) or (sample_id not in self._sample_counters[system]):
+            return
+
+        sample_counters = self._sample_counters[system]
+        assert isinstance(sample_counters, ArrayCounter)
+
+        user_seen, user_system_counts = self.get_user_state(user_id)
+        user_system_counts[self._system_indexes[system]] += delta
+        if delta > 0:
+            user_seen[system].set(sample_counters.index(sample_id))
+        elif delta < 0:
+            user_seen[system].clear(sample_counters.index(sample_id))
 
     def _select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
         """Method to select a given number of samples for a given number of systems for a specific user
@@ -371,21 +449,18 @@ class LeastSeenPerUserSelection(LeastSeenSelection):
             The dictionary providing for a system name the associated sample embedded in a list
         """
 
-        if user.id not in self._user_history:
-            self._user_history[user.id] = dict([(cur_system, list()) for cur_system in self.systems.keys()])
-        self._logger.debug(f"History status of the current user: {self._user_history[user.id]}")
+        user_seen, user_system_counts = self.get_user_state(str(user.id))
+        self._logger.debug(f"History status of the current user: {user_system_counts}")
 
         # Select the systems
         self._logger.debug(f"Select systems for user {user.user_id}")
-        pool_systems = self.select_user_systems(self._user_history[user.id], nb_systems)
+        pool_systems = self.select_user_systems(user_system_counts, nb_systems)
 
         # Select the samples
         self._logger.debug(f"Select samples for user {user.user_id}")
         dict_samples = dict()
         for system_name in pool_systems:
-            dict_samples[system_name] = self.user_select_samples(
-                self._user_history[user.id][system_name], system_name, nb_samples
-            )
+            dict_samples[system_name] = self.user_select_samples(user_seen[system_name], system_name, nb_samples)
 
         self._logger.info(f"This is what we will give to {user.user_id}: {dict_samples}")
 
@@ -395,15 +470,19 @@ class LeastSeenPerUserSelection(LeastSeenSelection):
 class LeastSeenMixedSelection(LeastSeenSelection):
     """ """
 
-    def __init__(self, systems: dict[str, System]) -> None:
+    HAS_USER_STATE = True
+
+    def __init__(self, systems: dict[str, System], **kwargs) -> None:
         """Constructor
 
         Parameters
         ----------
         systems: dict[str, System]
             The dictionnary of systems indexed by their names
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
         """
-        super().__init__(systems)
+        super().__init__(systems, **kwargs)
 
         # Just make sure that all the systems have the same utterances (just count check!)
         self._nb_utts = 0
@@ -419,9 +498,92 @@ class LeastSeenMixedSelection(LeastSeenSelection):
                 self._nb_utts = len(sys.samples)
 
         self._system_names = list(systems.keys())
-        self._counters = np.zeros((len(self._system_names), self._nb_utts)).astype(int)
-        self._user_counters = dict()
-        self._user_history = dict()
+        self._cells: dict[int, tuple[int, int]] = dict(
+            [
+                (sample.id, (system_idx, utt_idx))
+                for system_idx, sys_name in enumerate(self._system_names)
+                for utt_idx, sample in enumerate(systems[sys_name].samples)
+            ]
+        )
+        self._counters = self._allocate_counters("cells", len(self._system_names) * self._nb_utts).reshape(
+            (len(self._system_names), self._nb_utts)
+        )
+        self._user_counters: dict[str, SparseMatrixCounter] = dict()
+        self._user_history: dict[str, list[int]] = dict()
+
+    def get_user_counters(self, user_id: str) -> SparseMatrixCounter:
+        """Get the (system, utterance) counters of a given user
+
+        NOTE: a user only sees a few cells, so only the seen ones are stored
+
+        Parameters
+        ----------
+        user_id: str
+            The ID of the user
+
+        Returns
+        -------
+        SparseMatrixCounter
+            The counters of the user
+        """
+        if user_id not in self._user_counters:
+            self._user_history[user_id] = []
+            self._user_counters[user_id] = SparseMatrixCounter((len(self._systems), self._nb_utts))
+        return self._user_counters[user_id]
+
+    def _reset_user(self, user_id: str) -> None:
+        """Forget the counters and the history of a given user
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        """
+        self._user_counters.pop(user_id, None)
+        self._user_history.pop(user_id, None)
+
+    def _apply_global_event(self, system: str, sample_id: int, delta: int) -> None:
+        """Update the overall (system, utterance) counters
+
+        Parameters
+        ----------
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters
+        """
+        super()._apply_global_event(system, sample_id, delta)
+        if sample_id not in self._cells:
+            return
+
+        system_idx, utt_idx = self._cells[sample_id]
+        self._counters[system_idx, utt_idx] += delta
+
+    def _apply_user_event(self, user_id: str, system: str, sample_id: int, delta: int) -> None:
+        """Update the (system, utterance) counters and the history of the user
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters
+        """
+        if sample_id not in self._cells:
+            return
+
+        system_idx, utt_idx = self._cells[sample_id]
+        self.get_user_counters(user_id).increment((system_idx, utt_idx), delta)
+        if delta > 0:
+            self._user_history[user_id].append(sample_id)
+        elif sample_id in self._user_history[user_id]:
+            self._user_history[user_id].remove(sample_id)
 
     def _select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
         """Method to select a given number of samples for a given number of systems for a specific user
@@ -452,11 +614,7 @@ class LeastSeenMixedSelection(LeastSeenSelection):
         ), f"Only 1 sample (not {nb_samples}) for 1 system (not {nb_systems}) is supported for this selection mode"
 
         # Retrieve user history
-        if user.id not in self._user_counters:
-            # self._user_history[user.id] = dict([(cur_system, list()) for cur_system in self.systems.keys()])
-            self._user_history[user.id] = []
-            self._user_counters[user.id] = np.zeros((len(self._systems), self._nb_utts)).astype(int)
-        user_counters = self._user_counters[user.id]
+        user_counters = self.get_user_counters(str(user.id)).to_dense()
 
         # Prepare some helpers to refine the filtering
         system_counters = np.sum(user_counters, axis=1)
@@ -497,23 +655,182 @@ class LeastSeenMixedSelection(LeastSeenSelection):
         np.random.shuffle(mask)
         mask = mask[0]
 
-        # Update counters
-        user_counters[mask[0], mask[1]] += 1
-        self._counters[mask[0], mask[1]] += 1
-
-        # And now get the samples
+        # And now get the samples (the counters are updated once the selection is recorded)
         pool_samples = [self.systems[self._system_names[mask[0]]].samples[mask[1]]]
         dict_samples = dict()
         for sample in pool_samples:
             if sample.system not in dict_samples:
                 dict_samples[sample.system] = []
             dict_samples[sample.system].append(sample)
-            self._user_history[user.id].append(sample.id)
 
         self._logger.info(f"This is what we will give to {user.user_id}: {dict_samples}")
 
-        # self._logger.warning(f"[{user.id}] History status: {self._user_history[user.id]}")
-        self._logger.debug(f"[{user.id}] Utt history status:\n {self._user_counters[user.id]}")
+        self._logger.debug(f"[{user.id}] Utt history status:\n {user_counters}")
         self._logger.debug(f"[=] Utt history status:\n {self._counters}\n")
 
         return dict_samples
+
+
+class StratifiedLeastSeenSelection(LeastSeenSelection):
+    """Class implementing the selection strategy based on the "least seen" paradigm balanced over strata:
+     1. list the least seen system(s)
+     2. for the the least system(s), select the least seen stratum (or strata)
+     3. for each selected stratum, select the least seen sample(s)
+
+    The strata are defined by the values of metadata columns of the system files (e.g., the speaker or the type of
+    sentence). The index from the strata to the samples is built once when the task is loaded.
+    """
+
+    def __init__(self, systems: dict[str, System], strata: str | list[str] | None = None, **kwargs) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        systems: dict[str, System]
+            The dictionnary of systems indexed by their names
+        strata: str | list[str] | None
+            The column(s) of the system files defining the strata
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
+
+        Raises
+        ------
+        Exception
+            if the strata are not defined or if a column is not available in a system file
+        """
+        if strata is None:
+            raise Exception("The stratified selection requires the column(s) defining the strata (strata)")
+        self._strata_columns: list[str] = [strata] if isinstance(strata, str) else list(strata)
+        for name, cur_system in systems.items():
+            missing_columns = set(self._strata_columns) - set(cur_system.col_names)
+            if len(missing_columns) > 0:
+                raise Exception(f'The system "{name}" doesn\'t provide the column(s) {sorted(missing_columns)}')
+
+        super().__init__(systems, **kwargs)
+
+        # Index the samples by stratum (sorted so all the processes agree on the names of the counters)
+        self._sample_strata: dict[int, tuple[str, ...]] = dict()
+        self._strata_counters: dict[str, BucketCounter | ArrayCounter] = dict()
+        self._stratum_sample_counters: dict[str, dict[tuple[str, ...], BucketCounter | ArrayCounter]] = dict()
+        for name, cur_system in systems.items():
+            strata_samples: dict[tuple[str, ...], list[int]] = dict()
+            for sample in cur_system.samples:
+                stratum = tuple([str(getattr(sample, column)) for column in self._strata_columns])
+                strata_samples.setdefault(stratum, []).append(sample.id)
+                self._sample_strata[sample.id] = stratum
+
+            list_strata = sorted(strata_samples.keys())
+            self._strata_counters[name] = self._create_counter(f"strata/{name}", list_strata)
+            self._stratum_sample_counters[name] = dict(
+                [
+                    (stratum, self._create_counter(f"strata/{name}/{index}", strata_samples[stratum]))
+                    for index, stratum in enumerate(list_strata)
+                ]
+            )
+            self._logger.debug(f"{len(list_strata)} strata for the system {name}")
+
+    def _stratum_quotas(self, system_name: str, nb_samples: int) -> dict[tuple[str, ...], int]:
+        """Distribute the samples to select among the strata of a system, the least seen strata first
+
+        The strata are taken from their counters, which are updated incrementally by the selections and the releases:
+        when there are less samples to select than strata (e.g., one sample per step), the least seen strata are
+        simply popped, so the cost only depends on the number of samples.
+
+        Parameters
+        ----------
+        system_name: str
+           The name of the system
+        nb_samples: int
+           The desired number of samples
+
+        Returns
+        -------
+        dict[tuple[str, ...], int]
+            The number of samples to select in each stratum (the strata without any sample are omitted)
+        """
+        strata_counter = self._strata_counters[system_name]
+        sample_counters = self._stratum_sample_counters[system_name]
+
+        # NOTE: each stratum has at least one sample, so the least seen strata provide one sample each
+        if nb_samples <= len(strata_counter):
+            return dict([(stratum, 1) for stratum in strata_counter.least(nb_samples)])
+
+        # Each stratum is taken once per round, the last (partial) round takes the least seen strata
+        nb_rounds, nb_remaining = divmod(nb_samples, len(strata_counter))
+        quotas = dict([(stratum, nb_rounds) for stratum in sample_counters.keys()])
+        for stratum in strata_counter.least(nb_remaining):
+            quotas[stratum] += 1
+
+        # The samples which can't be taken in the small strata are taken in the least seen strata which have some left
+        nb_overflow = 0
+        spare_strata = []
+        for stratum, quota in quotas.items():
+            nb_available = len(sample_counters[stratum])
+            if quota > nb_available:
+                nb_overflow += quota - nb_available
+                quotas[stratum] = nb_available
+            elif quota < nb_available:
+                spare_strata.append((strata_counter[stratum], random.random(), stratum))
+
+        heapq.heapify(spare_strata)
+        while (nb_overflow > 0) and (len(spare_strata) > 0):
+            _, _, stratum = heapq.heappop(spare_strata)
+            nb_added = min(nb_overflow, len(sample_counters[stratum]) - quotas[stratum])
+            quotas[stratum] += nb_added
+            nb_overflow -= nb_added
+
+        return quotas
+
+    def internal_select_samples(self, system_name: str, nb_samples: int) -> list[Sample]:
+        """Select a given number of samples of a given system, balanced over the strata
+
+        Parameters
+        ----------
+        system_name: str
+           The name of the system
+        nb_samples: int
+           The desired number of sample
+
+        Returns
+        -------
+        list[Sample]
+            The list of selected samples
+        """
+        nb_available = len(self._sample_counters[system_name])
+
+        # Assert/Fix the number of required samples
+        assert (nb_samples <= nb_available) and (nb_samples != 0), (
+            f"The required number of samples ({nb_samples}) is greater than the available number of samples "
+            + f"({nb_available}) or it is 0"
+        )
+        if nb_samples < 0:
+            nb_samples = nb_available
+
+        pool_samples = []
+        for stratum, quota in self._stratum_quotas(system_name, nb_samples).items():
+            if quota > 0:
+                pool_samples += self._stratum_sample_counters[system_name][stratum].least(quota)
+
+        # Shuffle to guarantee variation in the presentation order
+        random.shuffle(pool_samples)
+        return [self._system_samples[system_name][sample_id] for sample_id in pool_samples]
+
+    def _apply_global_event(self, system: str, sample_id: int, delta: int) -> None:
+        """Update the system, sample, stratum and stratum sample counters
+
+        Parameters
+        ----------
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters
+        """
+        if (system not in self._sample_counters) or (sample_id not in self._sample_counters[system]):
+            return
+
+        super()._apply_global_event(system, sample_id, delta)
+        stratum = self._sample_strata[sample_id]
+        self._strata_counters[system].increment(stratum, delta)
+        self._stratum_sample_counters[system][stratum].increment(sample_id, delta)
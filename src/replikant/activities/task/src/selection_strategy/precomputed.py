@@ -0,0 +1,158 @@
+from sqlalchemy import func, select
+
+from replikant.core import User
+from replikant.database import ModelFactory, db
+from ...model import DesignClaim, DesignModel, Sample
+from ..system import System
+from .core import SelectionBase
+
+
+class PrecomputedSelection(SelectionBase):
+    """Class implementing the selection based on a precomputed design (see the command "replikant design")
+
+    Each participant claims the next slot of the design when entering the task, the samples of each step are then
+    simply looked up in the design table. The selection is therefore deterministic and reproducible. If there are
+    more participants than slots, the slots are reused in the same order.
+    """
+
+    # Flag to indicate if reusing the slots should be reported (it is expected when the design is a set of groups)
+    WARN_SLOT_REUSE: bool = True
+
+    def __init__(self, systems: dict[str, System], **kwargs) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        systems: dict[str, System]
+            The dictionnary of systems indexed by their names
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
+        """
+        super().__init__(systems, **kwargs)
+        if self._task is None:
+            raise Exception("The precomputed selection requires the name of the task")
+
+        self._design_model = ModelFactory().create(self._task, DesignModel, commit=True)
+        self._samples: dict[int, Sample] = dict(
+            [(sample.id, sample) for cur_system in systems.values() for sample in cur_system.samples]
+        )
+        self._slots: dict[str, int] = dict()
+        self._nb_slots: int = 0
+
+    @property
+    def nb_slots(self) -> int:
+        """Get the number of slots of the design
+
+        Returns
+        -------
+        int
+            The number of slots (0 if the design hasn't been built)
+        """
+        if self._nb_slots == 0:
+            nb_slots = db.session.execute(select(func.max(self._design_model.slot) + 1)).scalar()
+            self._nb_slots = nb_slots if nb_slots is not None else 0
+        return self._nb_slots
+
+    def get_slot(self, user_id: str) -> int:
+        """Get the slot of the design claimed by a given user (claiming it if needed)
+
+        Parameters
+        ----------
+        user_id: str
+            The ID of the user
+
+        Returns
+        -------
+        int
+            The claimed slot (which can be greater than the number of slots of the design)
+        """
+        if user_id not in self._slots:
+            self._slots[user_id] = DesignClaim.claim(self._task, user_id)  # type: ignore
+        return self._slots[user_id]
+
+    def _update_counts(self, user_id: str, selected_samples: dict[str, list[Sample]], delta: int) -> None:
+        """Ignore the updates of the counts as the design doesn't depend on them
+
+        Parameters
+        ----------
+        user_id : str
+            the ID of the user
+        selected_samples : dict[str, list[Sample]]
+            the samples indexed by system name
+        delta : int
+            the value added to the counters
+        """
+        pass
+
+    def _design_step(self, id_step: int) -> int:
+        """Get the step of the design corresponding to a step of the participant
+
+        Parameters
+        ----------
+        id_step: int
+            The step of the participant
+
+        Returns
+        -------
+        int
+            The step of the design
+        """
+        return id_step
+
+    def select_steps(
+        self, user: User, first_step: int, nb_steps: int, nb_systems: int, nb_samples: int
+    ) -> list[dict[str, list[Sample]]]:
+        """Look up the samples of consecutive steps in the design
+
+        The number of systems and samples are defined by the design and therefore ignored. No lock is needed as the
+        slots are claimed atomically in the database.
+
+        Parameters
+        ----------
+        user : User
+            the user
+        first_step: int
+            The first step to select for the given participant
+        nb_steps: int
+            The number of steps to select
+        nb_systems : int
+            the number of systems per step (ignored)
+        nb_samples : int
+            the number of samples per system (ignored)
+
+        Returns
+        -------
+        list[dict[str, list[Sample]]]
+            The selected samples indexed by system name for each step
+        """
+        if self.nb_slots == 0:
+            raise Exception(
+                f'The design of the task "{self._task}" is empty, it should be built using "replikant design"'
+            )
+
+        claimed_slot = self.get_slot(str(user.id))
+        slot = claimed_slot % self.nb_slots
+        if (slot != claimed_slot) and self.WARN_SLOT_REUSE:
+            self._logger.warning(f"All the slots of the design are claimed, {user.user_id} reuses the slot {slot}")
+
+        design_steps = [self._design_step(id_step) for id_step in range(first_step, first_step + nb_steps)]
+        design_model = self._design_model
+        query = (
+            select(design_model.step_idx, design_model.system, design_model.sample_id)
+            .where(design_model.slot == slot, design_model.step_idx.in_(set(design_steps)))
+            .order_by(design_model.step_idx, design_model.id)
+        )
+
+        design_samples: dict[int, dict[str, list[Sample]]] = dict()
+        for step_idx, system_name, sample_id in db.session.execute(query):
+            design_samples.setdefault(step_idx, dict()).setdefault(system_name, []).append(self._samples[sample_id])
+
+        steps: list[dict[str, list[Sample]]] = []
+        for id_step, design_step in enumerate(design_steps, first_step):
+            if design_step not in design_samples:
+                raise Exception(f'The design of the task "{self._task}" doesn\'t define the step {id_step}')
+            steps.append(dict([(name, list(samples)) for name, samples in design_samples[design_step].items()]))
+
+        self._logger.info(f"This is what we will give to {user.user_id}: {steps}")
+
+        return steps
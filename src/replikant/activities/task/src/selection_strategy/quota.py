@@ -0,0 +1,166 @@
+import math
+
+from replikant.core import User
+from ...model import Sample
+from ..system import System
+from .core import SelectionBase
+from .counters import DeficitHeap
+
+# The levels at which the targets can be defined
+QUOTA_LEVELS = ["sample", "system"]
+
+
+class QuotaSelection(SelectionBase):
+    """Class implementing the selection strategy based on target numbers of ratings (quotas):
+     1. select the system(s) with the largest remaining deficit (target - number of ratings)
+     2. for the selected system(s), select the sample(s) with the largest remaining deficit
+
+    The systems and samples whose quota is met are not selected anymore, so the campaign doesn't collect ratings
+    which are not needed. Once all the quotas are met, the items exceeding their target the least are selected.
+    """
+
+    def __init__(
+        self, systems: dict[str, System], targets: int | dict[str, int] | None = None, level: str = "sample", **kwargs
+    ) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        systems: dict[str, System]
+            The dictionnary of systems indexed by their names
+        targets: int | dict[str, int] | None
+            The target number of ratings, either common to all the systems or indexed by system name
+        level: str
+            The level of the targets: "sample" (the number of ratings of each sample of the system) or "system" (the
+            total number of ratings of the system, spread evenly across its samples)
+        kwargs: dict
+            The parameters of the base strategy (see SelectionBase)
+        """
+        super().__init__(systems, **kwargs)
+        if self._shared_lock is not None:
+            raise Exception("The quota selection doesn't support the shared counters")
+        if targets is None:
+            raise Exception("The quota selection requires the target number of ratings (targets)")
+        if level not in QUOTA_LEVELS:
+            raise Exception(f'"{level}" is not a valid quota level (available: {", ".join(QUOTA_LEVELS)})')
+
+        if isinstance(targets, int):
+            targets = dict([(name, targets) for name in systems.keys()])
+        missing_systems = set(systems.keys()) - set(targets.keys())
+        if len(missing_systems) > 0:
+            raise Exception(f"The target number of ratings is not defined for the systems {sorted(missing_systems)}")
+
+        # Initialize content elements (the samples of each system indexed by their ID)
+        self._system_samples: dict[str, dict[int, Sample]] = dict(
+            [
+                (name, dict([(sample.id, sample) for sample in cur_system.samples]))
+                for name, cur_system in systems.items()
+            ]
+        )
+
+        # Initialize the queues (a system target is spread over its samples)
+        system_targets: dict[str, int] = dict()
+        self._sample_queues: dict[str, DeficitHeap] = dict()
+        for name, samples in self._system_samples.items():
+            if level == "sample":
+                sample_target = targets[name]
+                system_targets[name] = targets[name] * len(samples)
+            else:
+                sample_target = math.ceil(targets[name] / len(samples))
+                system_targets[name] = targets[name]
+            self._sample_queues[name] = DeficitHeap(dict([(sample_id, sample_target) for sample_id in samples.keys()]))
+        self._system_queue = DeficitHeap(system_targets)
+
+    @property
+    def is_complete(self) -> bool:
+        """Check if all the quotas are met
+
+        Returns
+        -------
+        bool
+            True if all the systems reached their target
+        """
+        return len(self._system_queue) == 0
+
+    def _largest(self, queue: DeficitHeap, k: int) -> list:
+        """Get the k items with the largest deficit, completed by the ones exceeding their target the least if needed
+
+        Parameters
+        ----------
+        queue: DeficitHeap
+            The queue of the items
+        k: int
+            The number of items
+
+        Returns
+        -------
+        list
+            The k items
+        """
+        selected = queue.largest(k)
+        if len(selected) < k:
+            self._logger.warning("The quotas are met, the items exceeding their target the least are selected")
+            met_items = sorted([(-deficit, item) for item, deficit in queue.items() if deficit <= 0])
+            selected += [item for _, item in met_items[: k - len(selected)]]
+
+        return selected
+
+    def _apply_global_event(self, system: str, sample_id: int, delta: int) -> None:
+        """Update the deficits of the system and of the sample
+
+        Parameters
+        ----------
+        system : str
+            the name of the system
+        sample_id : int
+            the ID of the sample
+        delta : int
+            the value added to the counters
+        """
+        if (system not in self._sample_queues) or (sample_id not in self._sample_queues[system]):
+            return
+
+        self._system_queue.increment(system, delta)
+        self._sample_queues[system].increment(sample_id, delta)
+
+    def _select_samples(self, user: User, id_step: int, nb_systems: int, nb_samples: int) -> dict[str, list[Sample]]:
+        """Method to select a given number of samples for a given number of systems for a specific user
+
+        Parameters
+        ----------
+        user: User
+            The participant
+        id_step: int
+            The current step for the given participant
+        nb_systems: int
+            The desired number of systems
+        nb_samples: int
+            The desired number of samples
+
+        Returns
+        -------
+        dict[str, list[Sample]]
+            The dictionary providing for a system name the associated sample embedded in a list
+        """
+        assert (nb_systems <= len(self._system_samples)) and (nb_systems != 0), (
+            f"The required number of systems ({nb_systems}) is greater than the available number of systems "
+            + f"({len(self._system_samples)}) or it is 0"
+        )
+        if nb_systems < 0:
+            nb_systems = len(self._system_samples)
+
+        dict_samples = dict()
+        for system_name in self._largest(self._system_queue, nb_systems):
+            system_samples = self._system_samples[system_name]
+            assert (nb_samples <= len(system_samples)) and (nb_samples != 0), (
+                f"The required number of samples ({nb_samples}) is greater than the available number of samples "
+                + f"({len(system_samples)}) or it is 0"
+            )
+            sample_ids = self._largest(
+                self._sample_queues[system_name], nb_samples if nb_samples > 0 else len(system_samples)
+            )
+            dict_samples[system_name] = [system_samples[sample_id] for sample_id in sample_ids]
+
+        self._logger.info(f"This is what we will give to {user.id}: {dict_samples}")
+
+        return dict_samples
@@ -36,13 +36,15 @@ class System:
         self._col_names: list[str] = list(reader.fieldnames)
 
         # Dynamically create the columns needed to populate all the information related to the current sample
-        for col_name in self._col_names:
-            Sample.addColumn(col_name, db.String)
+        if not Sample.is_long_format():
+            for col_name in self._col_names:
+                Sample.addColumn(col_name, db.String)
 
         if max_samples < 0:
             max_samples = len(list(csv.DictReader(open(source_file, encoding="utf-8"), delimiter=delimiter)))
 
         if len(self.samples) == 0:
+            samples = []
             for line_id, line in enumerate(reader):
                 if line_id >= max_samples:
                     break
@@ -50,13 +52,17 @@ class System:
                 vars = {"system": self.name, "line_id": line_id}
 
                 try:
+                    values = dict()
                     for col_name in self._col_names:
-                        vars[col_name] = line[col_name]
-                    Sample.create(commit=False, **vars)
+                        values[col_name] = line[col_name]
+                    samples.append((Sample.create(commit=False, **vars), values))
 
                 except Exception as e:
                     raise SystemError(f'Issue to read the line {line_id} of the file "{source_file}": {e}')
 
+            for sample, values in samples:
+                sample.set_values(values, commit=False)
+
             commit_all()
 
     @property
@@ -70,16 +76,14 @@ class System:
 
         """
 
-        # FIXME: this is a dirty hack as for now the Sample.__dict__ doesn't contain all the columns
-        #        for now, it only returns <class 'sqlalchemy.engine.row.Row'> but not <Sample> object
+        # NOTE: the samples are rows providing the columns of the sample table and the columns of the system file
         if len(self._samples) == 0:
-            self._samples = (
-                Sample.query.add_columns(Sample.__table__.columns)
-                .filter(Sample.system == self.name)
-                .order_by(Sample.line_id.asc())
-                .all()
+            query = (
+                Sample.wide_select(self._col_names)
+                .where(Sample.system == self.name)
+                .order_by(Sample.line_id.asc())  # type: ignore
             )
-            # samples = Sample.query.filter(Sample.system == self.name).order_by(Sample.line_id.asc()).all()
+            self._samples = db.session.execute(query).all()
 
         return self._samples
 
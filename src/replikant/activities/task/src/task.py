@@ -11,7 +11,10 @@ import mimetypes
 import random
 from datetime import datetime, timedelta
 import hashlib
+import heapq
+import itertools
 import shutil
+import threading
 from collections import OrderedDict
 
 # Flask
@@ -20,12 +23,21 @@ from flask import current_app
 # Replikant
 from replikant.utils import AppSingleton
 from replikant.core import ParticipantScope, User, Activity
-from replikant.database import ModelFactory
-from replikant.activities.task.model import TaskModel
+from replikant.database import ModelFactory, db
+from sqlalchemy import delete
+from replikant.activities.task.model import (
+    TaskModel,
+    MonitorModel,
+    TaskProgress,
+    Playlist,
+    DesignModel,
+    DesignClaim,
+)
 
 # Current package
 from .system import Sample, SystemManager, System
-from .selection_strategy import SelectionBase, get_strategy
+from .selection_strategy import SelectionBase, get_strategy, get_strategy_class
+from .selection_strategy.precomputed import PrecomputedSelection
 
 
 DEFAULT_CSV_DELIMITER: str = ","
@@ -172,6 +184,12 @@ class TransactionalObject:
         self._transactions = {}
         self._timeout_seconds = timeout_seconds
 
+        # The expiration dates are kept in a heap (date, lease ID, user ID), the entries of the transactions which
+        # have been deleted or renewed since are simply skipped when they are popped
+        self._deadlines: list[tuple[datetime, int, Any]] = []
+        self._deadlines_lock = threading.Lock()
+        self._lease_ids = itertools.count()
+
     def set_timeout_for_transaction(self, timeout: int) -> None:
         """Setter of the timeout
 
@@ -202,37 +220,83 @@ class TransactionalObject:
             The given user
         """
         self._transactions[user.id] = {"date": datetime.now()}
+        self.schedule_expiration(user)
 
-    def get_transactions(self) -> list[dict[str, Any]]:
-        """Retrieve the list of available transactions
+    def schedule_expiration(self, user: User) -> None:
+        """Start a new lease for the transaction of a given user, which expires after the timeout
 
-        Available transactions are the ones which haven't been
-        processed AND not yet timed out
+        Parameters
+        ----------
+        user : UserModel
+            The given user
+        """
+        self._schedule_deadline(user.id)
+
+    def _schedule_deadline(self, user_id: Any) -> None:
+        """Start a new lease for the transaction of a given user ID
+
+        Parameters
+        ----------
+        user_id : Any
+            The ID of the user
+        """
+        lease_id = next(self._lease_ids)
+        self._transactions[user_id]["lease"] = lease_id
+        if self._timeout_seconds is None:
+            return
+
+        deadline = datetime.now() + timedelta(seconds=self._timeout_seconds)
+        with self._deadlines_lock:
+            heapq.heappush(self._deadlines, (deadline, lease_id, user_id))
+
+    def expire_transactions(self) -> int:
+        """Expire the transactions whose lease is over
 
         Returns
         -------
-        list[dict[str, Any]]
-            The list of transactions
+        int
+            The number of expired transactions
         """
+        now = datetime.now()
+        expired = []
+        with self._deadlines_lock:
+            while (len(self._deadlines) > 0) and (self._deadlines[0][0] < now):
+                _, lease_id, user_id = heapq.heappop(self._deadlines)
+                transaction = self._transactions.get(user_id)
+                if (transaction is not None) and (transaction.get("lease") == lease_id):
+                    transaction["lease"] = None
+                    expired.append((user_id, transaction))
 
-        transactions = []
-        to_del = []
+        for user_id, transaction in expired:
+            self._expire_transaction(user_id, transaction)
 
-        # Retrieve all the transactions
-        for user_id in self._transactions.keys():
-            transaction = self._transactions[user_id]
+        return len(expired)
 
-            trans_date = transaction["date"] + timedelta(seconds=self._timeout_seconds)
-            if (self._timeout_seconds is not None) and (trans_date < datetime.now()):
-                to_del.append(user_id)
-            else:
-                transactions.append(transaction)
+    def _expire_transaction(self, user_id: Any, transaction: dict[str, Any]) -> None:
+        """Handle a transaction whose lease is over (by default, the transaction is dropped)
+
+        Parameters
+        ----------
+        user_id : Any
+            The ID of the user
+        transaction : dict[str, Any]
+            The expired transaction
+        """
+        self._transactions.pop(user_id, None)
 
-        # Drop the timed out transactions
-        for transaction_key_to_del in to_del:
-            del self._transactions[transaction_key_to_del]
+    def get_transactions(self) -> list[dict[str, Any]]:
+        """Retrieve the list of available transactions
+
+        Available transactions are the ones which haven't been
+        processed AND not yet dropped (see _expire_transaction)
 
-        return transactions
+        Returns
+        -------
+        list[dict[str, Any]]
+            The list of transactions
+        """
+        self.expire_transactions()
+        return list(self._transactions.values())
 
     def has_transaction(self, user: User) -> bool:
         """Helper to know if a given user has some transactions waiting to be processed
@@ -345,6 +409,21 @@ class TransactionalObject:
         return current_fields
 
 
+class DesignParticipant:
+    """The participant of a slot of a precomputed design (see Task.build_design)"""
+
+    def __init__(self, slot: int):
+        """Initialisation
+
+        Parameters
+        ----------
+        slot : int
+            The slot of the design
+        """
+        self.id = slot
+        self.user_id = f"slot_{slot}"
+
+
 class Task(TransactionalObject):
     def __init__(self, name: str, config) -> None:
         """Constructor
@@ -381,13 +460,21 @@ class Task(TransactionalObject):
         self.model = ModelFactory().create(self.name, TaskModel, commit=True)
         ParticipantScope.get_user().addRelationship(self.model.__name__, self.model, uselist=True)
 
+        # Create the Monitor table (log of the events sent by the player) in the database
+        self.monitor_model = ModelFactory().create(self.name, MonitorModel, commit=True)
+
+        # Materialize the progress of the participants (existing databases or explicit request)
+        if current_app.config.get("REPLIKANT_REBUILD_PROGRESS", False) or (not TaskProgress.has_task(self.name)):
+            nb_participants = self.rebuild_progress()
+            self._logger.info(f"The progress of {nb_participants} participants has been rebuilt")
+
         # Initialize the sample selection strategy
         selection_strategy_name = "LeastSeenSelection"
+        kwargs = dict()
         if "selection_strategy" in config:
             selection_strategy_name = config["selection_strategy"]
-            # kwargs = dict()
             if not isinstance(selection_strategy_name, str):
-                # kwargs = selection_strategy_name["kwargs"]
+                kwargs = dict(selection_strategy_name.get("kwargs") or dict())
                 selection_strategy_name = selection_strategy_name["name"]
 
             # in case we describe
@@ -395,7 +482,90 @@ class Task(TransactionalObject):
         else:
             self._logger.info('The selection strategy is defaulted to "LeastSeenSelection"')
 
-        self._selection_strategy: SelectionBase = get_strategy(selection_strategy_name, self.systems)
+        self._selection_strategy_name: str = selection_strategy_name
+        self._selection_strategy_kwargs: dict[str, Any] = kwargs
+        self._selection_strategy: SelectionBase = get_strategy(
+            selection_strategy_name, self.systems, task=self.name, task_model=self.model, **kwargs
+        )
+
+        # In playlist mode, all the steps of a participant are selected when the participant enters the task
+        self._playlist: bool = bool(config["playlist"]) if "playlist" in config else False
+        self._nb_steps: int = int(config["nb_steps"])
+        self._nb_systems_per_step: int = int(config["nb_systems_per_step"]) if "nb_systems_per_step" in config else 1
+        if self._nb_systems_per_step <= 0:
+            self._nb_systems_per_step = len(self.systems)
+        self._playlist_samples: dict[int, tuple[str, Sample]] = dict()
+        if self._playlist:
+            self._logger.info("The samples of all the steps are selected when a participant enters the task")
+            self._playlist_samples = dict(
+                [
+                    (sample.id, (system_name, sample))
+                    for system_name, cur_system in self.systems.items()
+                    for sample in cur_system.samples
+                ]
+            )
+
+    @override
+    def _expire_transaction(self, user_id: Any, transaction: dict[str, Any]) -> None:
+        """Release the samples of a transaction whose lease is over
+
+        The transaction is kept for a grace period (one more timeout), so the participant can still resume or save the
+        step (see renew_lease). It is dropped when the grace period is over too.
+
+        Parameters
+        ----------
+        user_id : Any
+            The ID of the user
+        transaction : dict[str, Any]
+            The expired transaction
+        """
+        if ("leased_samples" not in transaction) or transaction.get("released", False):
+            super()._expire_transaction(user_id, transaction)
+            return
+
+        self._logger.info(f"The lease of the samples selected for {user_id} expired, they are released")
+        self._selection_strategy.release_samples(str(user_id), transaction["leased_samples"])
+        transaction["released"] = True
+        self._schedule_deadline(user_id)
+
+    def renew_lease(self, user: User) -> None:
+        """Acquire again the samples of the transaction of a given user if its lease expired
+
+        Parameters
+        ----------
+        user : UserModel
+            The given user
+        """
+        transaction = self.get_transaction(user)
+        if transaction.pop("released", False):
+            self._logger.info(f"{user.user_id} came back after the lease expired, the samples are acquired again")
+            self._selection_strategy.acquire_samples(str(user.id), transaction["leased_samples"])
+            self.schedule_expiration(user)
+
+    @override
+    def set_timeout_for_transaction(self, timeout: int) -> None:
+        """Setter of the timeout
+
+        The state of the participants inactive for longer than the timeout is also released by the selection strategy
+
+        Parameters
+        ----------
+        timeout : int
+            The timeout in seconds
+        """
+        super().set_timeout_for_transaction(timeout)
+        self._selection_strategy.set_user_timeout(timeout)
+
+    @property
+    def selection_strategy(self) -> SelectionBase:
+        """Get the sample selection strategy of the task
+
+        Returns
+        -------
+        SelectionBase
+            The selection strategy
+        """
+        return self._selection_strategy
 
     def nb_steps_complete_by(self, user: User) -> int:
         """Get the number of steps completed by a given user
@@ -410,11 +580,131 @@ class Task(TransactionalObject):
         int
             The number of steps completed by the user
         """
-        all_steps = set()
-        for record in getattr(user, self.model.__name__):
-            if record.operation_type == "record":
-                all_steps.add(record.step_idx)
-        return max(all_steps) + 1 if all_steps else 0
+        return TaskProgress.get_nb_steps(user.id, self.name)
+
+    def rebuild_progress(self) -> int:
+        """Rebuild the progress of all the participants from the results of the task
+
+        Returns
+        -------
+        int
+            The number of participants whose progress has been rebuilt
+        """
+        return TaskProgress.rebuild(self.name, self.model)
+
+    def build_design(
+        self,
+        nb_participants: int,
+        strategy_name: str | None = None,
+        strategy_kwargs: dict[str, Any] | None = None,
+        force: bool = False,
+    ) -> int:
+        """Build the precomputed design of the task (used by the strategy PrecomputedSelection)
+
+        The steps of each participant slot are selected in turn by a strategy running in memory, as if the planned
+        participants were completing the task one after the other. The previous design of the task is replaced.
+
+        Parameters
+        ----------
+        nb_participants: int
+            The planned number of participants (i.e., the number of slots)
+        strategy_name: str | None
+            The strategy used to build the design (the strategy of the task, or LeastSeenSelection if None or if the
+            strategy of the task is already precomputed)
+        strategy_kwargs: dict[str, Any] | None
+            The parameters of the strategy (when the strategy of the task is used, they override its parameters)
+        force: bool
+            Replace the design even if some slots have already been claimed by participants
+
+        Returns
+        -------
+        int
+            The number of rows of the design
+
+        Raises
+        ------
+        TaskError
+            if some slots of the design are already claimed (and force is False) or if the strategy is precomputed
+        """
+        if (DesignClaim.nb_claims(self.name) > 0) and (not force):
+            raise TaskError(f'Some slots of the design of the task "{self.name}" are already claimed by participants')
+
+        kwargs: dict[str, Any] = dict()
+        if strategy_name is None:
+            strategy_name = self._selection_strategy_name
+            if isinstance(self._selection_strategy, PrecomputedSelection):
+                strategy_name = "LeastSeenSelection"
+            else:
+                kwargs.update(self._selection_strategy_kwargs)
+        if strategy_kwargs is not None:
+            kwargs.update(strategy_kwargs)
+
+        # A precomputed strategy reads the design, so it can't be used to build it
+        if issubclass(get_strategy_class(strategy_name), PrecomputedSelection):
+            raise TaskError(
+                f"The design can't be built using the precomputed strategy {strategy_name}, "
+                + "use a strategy selecting the samples (e.g., LeastSeenSelection)"
+            )
+
+        # NOTE: the design is selected by this process only, so the strategy doesn't need the runtime options
+        kwargs.update(task=self.name, task_model=self.model, persistent=False, counters="memory", batch_window_ms=0)
+        strategy = get_strategy(strategy_name, self.systems, **kwargs)
+
+        rows = []
+        for slot in range(nb_participants):
+            steps = strategy.select_steps(DesignParticipant(slot), 0, self._nb_steps, self._nb_systems_per_step, 1)
+            for step_idx, selected_samples in enumerate(steps):
+                for system_name, samples in selected_samples.items():
+                    rows += [
+                        dict(slot=slot, step_idx=step_idx, system=system_name, sample_id=sample.id)
+                        for sample in samples
+                    ]
+
+        design_model = ModelFactory().create(self.name, DesignModel, commit=True)
+        db.session.execute(delete(design_model.__table__))
+        db.session.execute(delete(DesignClaim.__table__).where(DesignClaim.task == self.name))
+        design_model.bulk_create(rows, commit=False)
+        db.session.commit()
+
+        return len(rows)
+
+    def get_playlist_step(self, user: User, id_step: int, nb_systems: int) -> dict[str, list[Sample]]:
+        """Get the samples of one step from the playlist of a given user
+
+        The playlist (i.e., the samples of all the remaining steps) is selected in one call to the strategy the first
+        time it is needed, the following steps are then simply looked up.
+
+        Parameters
+        ----------
+        user: UserModel
+            The model of the participant to the step
+        id_step: int
+            The index of the step
+        nb_systems: int
+            The number of system wanted for the current step
+
+        Returns
+        -------
+        dict[str, list[Sample]]
+            The samples of the step indexed by system name
+        """
+        user_id = str(user.id)
+        steps = Playlist.get_steps(user_id, self.name)
+        if steps is None:
+            steps = []
+
+        if id_step >= len(steps):
+            nb_steps = max(self._nb_steps, id_step + 1) - len(steps)
+            selections = self._selection_strategy.select_steps(user, len(steps), nb_steps, nb_systems, 1)
+            steps += [[sample.id for samples in selection.values() for sample in samples] for selection in selections]
+            Playlist.store(user_id, self.name, steps)
+
+        selected_samples = dict()
+        for sample_id in steps[id_step]:
+            system_name, sample = self._playlist_samples[sample_id]
+            selected_samples.setdefault(system_name, []).append(sample)
+
+        return selected_samples
 
     def get_step(
         self, id_step: int, user: User, nb_systems: int, is_intro_step: bool = False
@@ -438,18 +728,28 @@ class Task(TransactionalObject):
             The dictionnary associating which each system (name) the sample used
         """
 
+        # Release the samples of the abandoned steps
+        self.expire_transactions()
+
         # Resume the task, if a transaction hasn't been finalised
         choice_for_systems = dict()
         if self.has_transaction(user):
+            self.renew_lease(user)
             return self.get_in_transaction(user, "choice_for_systems")
 
         # Select samples (FIXME: 1 is hardcoded here)
-        selected_samples = self._selection_strategy.select_samples(user, id_step, nb_systems, 1)
+        if self._playlist:
+            selected_samples = self.get_playlist_step(user, id_step, nb_systems)
+        else:
+            selected_samples = self._selection_strategy.select_samples(user, id_step, nb_systems, 1)
         for system_name, samples in selected_samples.items():
             choice_for_systems[system_name] = samples[0]
 
-        # Now we are ready to create the transaction
+        # Now we are ready to create the transaction (the samples are leased until it is saved or it expires)
+        # NOTE: the samples of a playlist are counted when it is generated and stay in it, so they are never released
         self.create_transaction(user)
+        if not self._playlist:
+            self.set_in_transaction(user, "leased_samples", selected_samples)
 
         # For each system, select the samples
         for system_name in choice_for_systems.keys():
@@ -550,5 +850,15 @@ class TaskManager(metaclass=AppSingleton):
     ) -> list[Task]:
         return [t for _, t in self._register.items()]
 
+    def selection_lock_statistics(self) -> dict[str, dict[str, float]]:
+        """Get the contention counters of the selection lock of each task
+
+        Returns
+        -------
+        dict[str, dict[str, float]]
+            The contention counters indexed by task name
+        """
+        return dict([(name, task.selection_strategy.lock_statistics()) for name, task in self._register.items()])
+
 
 task_manager = TaskManager()
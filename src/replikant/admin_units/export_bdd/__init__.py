@@ -7,11 +7,28 @@ import random
 import shutil
 
 from werkzeug import Response
-from flask import current_app, send_file
+from flask import abort, current_app, request, send_file
 
 from replikant.core import campaign_instance
 from replikant.utils import safe_make_dir
-from replikant.database import export_schema, extract_dataframes
+from replikant.database import DatabaseSnapshot, export_schema, extract_dataframes
+
+# NOTE: the monitoring tables (events of the players logged by the task activity) are large and only exported on demand
+MONITORING_TABLE_PREFIX = "Monitor_"
+
+
+def excluded_prefixes() -> list[str]:
+    """Get the prefixes of the tables to exclude from the export based on the request
+
+    Returns
+    -------
+    list[str]
+        the prefixes of the tables to exclude (the monitoring tables unless "?monitoring=1" is given)
+    """
+    if request.args.get("monitoring", "0").lower() in ["1", "true", "yes"]:
+        return []
+    return [MONITORING_TABLE_PREFIX]
+
 
 with campaign_instance.register_admin_unit(__name__) as am:
     safe_make_dir(current_app.config["REPLIKANT_RECIPE_TMP_DIR"] + "/export_bdd/")
@@ -25,7 +42,13 @@ with campaign_instance.register_admin_unit(__name__) as am:
     @am.route("/replikant.db")
     @am.valid_connection_required
     def sqlite():
-        return send_file(current_app.config["SQLALCHEMY_FILE"])
+        # The raw database is only available for SQLite databases
+        if not current_app.config["SQLALCHEMY_FILE"]:
+            abort(404)
+
+        # Send a consistent snapshot, regenerated only if the database has been modified since the previous one
+        snapshot = DatabaseSnapshot().get(f"{current_app.config['REPLIKANT_RECIPE_TMP_DIR']}/export_bdd/replikant.db")
+        return send_file(snapshot, download_name="replikant.db")
 
     @am.after_request
     def set_response_headers(response: Response) -> Response:
@@ -44,7 +67,7 @@ with campaign_instance.register_admin_unit(__name__) as am:
         _ = safe_make_dir(f"{current_app.config['REPLIKANT_RECIPE_TMP_DIR']}/{root_base_file}.bdd")
 
         # Extract the dataframes
-        db_frames = extract_dataframes()
+        db_frames = extract_dataframes(excluded_prefixes=excluded_prefixes())
 
         # Save the TSV file
         for name_table, df in db_frames.items():
@@ -69,7 +92,7 @@ with campaign_instance.register_admin_unit(__name__) as am:
         sql_filename = f"{current_app.config['REPLIKANT_RECIPE_TMP_DIR']}/replikant.sql"
 
         # Retrieve the exported schema
-        ddl_statements, dml_statements = export_schema()
+        ddl_statements, dml_statements = export_schema(excluded_prefixes=excluded_prefixes())
 
         # Export now
         with open(sql_filename, "w", encoding="utf-8") as f:
@@ -10,6 +10,7 @@
                 <h5 class="card-title">ZIP</h5>
                 <p class="card-text">Download a zip repository containing the database dumped in csv files and <a href="https://developer.mozilla.org/fr/docs/Web/API/Blob">blob files.</p>
                     <a href="replikant.zip" class="btn btn-primary">Download</a>
+                    <a href="replikant.zip?monitoring=1" class="btn btn-secondary">Download (with monitoring)</a>
             </div>
         </div>
     </div>
@@ -30,6 +31,7 @@
                 <h5 class="card-title">SQL script</h5>
                 <p class="card-text">Download the SQL script file (db creation + filling)</p>
                 <a href="replikant.sql" class="btn btn-primary">Download</a>
+                <a href="replikant.sql?monitoring=1" class="btn btn-secondary">Download (with monitoring)</a>
             </div>
         </div>
     </div>
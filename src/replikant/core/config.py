@@ -96,6 +96,18 @@ class Config:
     def get_entrypoint(self) -> str:
         return self._data["entrypoint"]
 
+    def get_database_config(self) -> dict[str, Any]:
+
+        # No specific database configuration, the defaults will be used
+        if ("database" not in self._data) or (self._data["database"] is None):
+            return dict()
+
+        if not isinstance(self._data["database"], dict):
+            type_database = type(self._data["database"])
+            raise ConfigError(f"The database field only accepts a dictionary, not a {type_database}")
+
+        return self._data["database"]
+
     def load_file(self, configuration_file: pathlib.Path):
         try:
             with open(configuration_file, encoding="utf-8") as config_stream:
@@ -9,16 +9,35 @@ https://github.com/cookiecutter-flask/cookiecutter-flask/blob/master/%7B%7Bcooki
 
 """
 
-from typing import Self
+from typing import Any, Callable, Iterator, Self
+from contextlib import contextmanager
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import urllib.parse
+import time
+from flask import Flask, current_app
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
+from sqlalchemy import Table
+from sqlalchemy import Index
+from sqlalchemy import Select
+from sqlalchemy import case, func, insert, select
+from sqlalchemy import event
 from sqlalchemy import text
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import NullPool
 from sqlalchemy.schema import CreateTable
 from sqlalchemy.inspection import inspect
 from sqlalchemy.ext.declarative import declared_attr
 import pandas as pd
 import threading
-from .utils import AppSingleton
+from .utils import AppSingleton, InstrumentedLock
 
 __all__ = [
     "declared_attr",
@@ -26,18 +45,81 @@ __all__ = [
     "ForeignKey",
     "relationship",
     "commit_all",
+    "init_database",
     "DataBaseError",
     "MalformationError",
     "ForbiddenColumnName",
     "Model",
+    "ValueModel",
     "ModelFactory",
+    "SchemaCatalog",
+    "lock_statistics",
+    "create_all_indexes",
+    "explain_query_plan",
+    "GroupCommitWriter",
+    "write_rows",
+    "TransactionLock",
+    "exclusive_transaction",
+    "backup_database",
+    "DatabaseSnapshot",
+    "ReadEngine",
+    "read_engine",
     "extract_dataframes",
 ]
 
 # Instanciate database
 db = SQLAlchemy()
 
-sem = threading.Semaphore()
+
+class TableLocks:
+    """Registry of the locks protecting the schema modifications, one lock per table"""
+
+    def __init__(self):
+        self._locks: dict[str, InstrumentedLock] = dict()
+        self._registry_lock = threading.Lock()
+
+    def get(self, table_name: str) -> InstrumentedLock:
+        """Get (and create if needed) the lock of a given table
+
+        Parameters
+        ----------
+        table_name : str
+            The name of the table
+
+        Returns
+        -------
+        InstrumentedLock
+            The lock dedicated to the table
+        """
+        lock = self._locks.get(table_name)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._locks.setdefault(table_name, InstrumentedLock())
+        return lock
+
+    def statistics(self) -> dict[str, dict[str, float]]:
+        """Get the contention counters of every table lock
+
+        Returns
+        -------
+        dict[str, dict[str, float]]
+            The contention counters indexed by table name
+        """
+        return {table_name: lock.statistics() for table_name, lock in list(self._locks.items())}
+
+
+table_locks = TableLocks()
+
+# Database profile helpers
+DEFAULT_SQLITE_PRAGMAS: dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+}
+SQLITE_PRAGMAS: list[str] = ["journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size"]
+ENGINE_OPTIONS: list[str] = ["pool_size", "max_overflow", "pool_timeout", "pool_recycle"]
+STORAGE_MODES: list[str] = ["wide", "long"]
+WIDE_VIEW_SUFFIX: str = "_wide"
 
 # Alias common SQLAlchemy names
 Column = db.Column
@@ -92,40 +174,285 @@ class ForbiddenColumnName(DataBaseError):
     pass
 
 
+def lock_statistics() -> dict[str, dict[str, float]]:
+    """Get the contention counters of the table locks
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        The contention counters indexed by table name
+    """
+    return table_locks.statistics()
+
+
+def init_database(app: Flask, db_config: dict[str, Any]) -> None:
+    """Initialise the database of the application using the database profile of the recipe
+
+    The profile corresponds to the optional "database" section of the
+    recipe configuration. The following keys are supported:
+      - uri: the SQLAlchemy URI of the database (default: the SQLite file "replikant.db" of the recipe)
+      - journal_mode, synchronous, busy_timeout, cache_size, mmap_size: the SQLite pragmas applied on every
+        connection (journal_mode, synchronous and busy_timeout default to WAL, NORMAL and 5000ms)
+      - pool_size, max_overflow, pool_timeout, pool_recycle: the SQLAlchemy pool options
+      - group_commit: if defined, the rows written using write_rows are committed by a dedicated writer thread
+        by groups, every "interval_ms" milliseconds (default: 20) or every "max_rows" rows (default: 500), the
+        queue of pending writes being bounded by "queue_size" (default: 1000)
+      - storage: how the dynamic fields (form answers, sample metadata) are stored, either "wide" (one column
+        per field, default) or "long" (one row per field in a companion key/value table)
+      - read_uri: the SQLAlchemy URI used by the administration (default: the SQLite database opened in read-only
+        mode or, for the other backends, the main URI with a dedicated pool)
+      - read_snapshot_interval: if defined, the administration reads a snapshot of the SQLite database refreshed
+        at most every "read_snapshot_interval" seconds instead of the live database
+
+    Parameters
+    ----------
+    app : Flask
+        The application whose configuration will be filled
+    db_config : dict[str, Any]
+        The database section of the recipe configuration
+
+    Raises
+    ------
+    DataBaseError
+        if a pragma value or the storage mode is not valid
+    """
+
+    # Define how the dynamic fields are stored
+    storage = db_config.get("storage", "wide")
+    if storage not in STORAGE_MODES:
+        raise DataBaseError(f'The storage mode "{storage}" is not valid, it should be one of {STORAGE_MODES}')
+    app.config["REPLIKANT_DB_STORAGE"] = storage
+
+    # Define the group commit parameters (None means disabled)
+    group_commit = db_config.get("group_commit")
+    if group_commit is not None:
+        group_commit = dict(group_commit) if isinstance(group_commit, dict) else dict()
+    app.config["REPLIKANT_GROUP_COMMIT"] = group_commit
+
+    # Define the connection dedicated to the administration (see ReadEngine)
+    read_snapshot_interval = db_config.get("read_snapshot_interval")
+    app.config["REPLIKANT_DB_READ"] = {
+        "uri": db_config.get("read_uri"),
+        "snapshot_interval": float(read_snapshot_interval) if read_snapshot_interval is not None else None,
+    }
+
+    # Define the database URI (the SQLite file is kept for the raw database export)
+    if "uri" in db_config:
+        app.config["SQLALCHEMY_DATABASE_URI"] = db_config["uri"]
+        url = make_url(db_config["uri"])
+        if url.get_backend_name() == "sqlite":
+            app.config["SQLALCHEMY_FILE"] = url.database
+        else:
+            app.config["SQLALCHEMY_FILE"] = None
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    is_sqlite = url.get_backend_name() == "sqlite"
+
+    # Define the pool options
+    engine_options: dict[str, Any] = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", dict())
+    for option in ENGINE_OPTIONS:
+        if option in db_config:
+            engine_options[option] = int(db_config[option])
+
+    # Define the pragmas applied on every new SQLite connection
+    pragmas: dict[str, Any] = dict(DEFAULT_SQLITE_PRAGMAS)
+    for pragma in SQLITE_PRAGMAS:
+        if pragma in db_config:
+            pragmas[pragma] = db_config[pragma]
+
+        if (pragma in pragmas) and (not str(pragmas[pragma]).lstrip("-").isalnum()):
+            raise DataBaseError(f'The value "{pragmas[pragma]}" of the pragma "{pragma}" is not valid')
+
+    def apply_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+    # Initialisation of the DB connection
+    db.init_app(app)
+
+    with app.app_context():
+        # NOTE: the pragmas are applied before any connection is opened, as the pooled connections are reused
+        if is_sqlite:
+            event.listen(db.engine, "connect", apply_pragmas)
+
+        # Load the schema catalog once for all
+        SchemaCatalog().load()
+
+    if not is_sqlite:
+        return
+
+    # The pragmas of the read-only connections (no write means no journal configuration)
+    app.config["REPLIKANT_DB_READ"]["pragmas"] = {
+        "busy_timeout": pragmas["busy_timeout"],
+        "query_only": 1,
+    }
+
+
+class SchemaCatalog(metaclass=AppSingleton):
+    """In-process catalog of the tables (and their columns) available in the database
+
+    The catalog is loaded once at startup and updated every time
+    replikant creates a table or adds a column. If an element is
+    unknown, the catalog falls back to the reflection of the database
+    (another process may have created it) and records the result.
+    """
+
+    def __init__(self):
+        self._tables: dict[str, set[str]] = dict()
+
+    def load(self) -> None:
+        """(Re)load the catalog by reflecting the database"""
+        inspection = inspect(db.engine)
+        self._tables = dict()
+        for table_name in inspection.get_table_names():
+            self._tables[table_name] = set([column["name"] for column in inspection.get_columns(table_name)])
+
+    def reflect_table(self, table_name: str) -> bool:
+        """Reflect a given table and record its columns in the catalog
+
+        Parameters
+        ----------
+        table_name : str
+            The name of the table
+
+        Returns
+        -------
+        bool
+            True if the table exists in the database, False else
+        """
+        inspection = inspect(db.engine)
+        if not inspection.has_table(table_name):
+            return False
+
+        self._tables[table_name] = set([column["name"] for column in inspection.get_columns(table_name)])
+        return True
+
+    def has_table(self, table_name: str) -> bool:
+        """Check if a table exists in the database
+
+        Parameters
+        ----------
+        table_name : str
+            The name of the table
+
+        Returns
+        -------
+        bool
+            True if the table exists, False else
+        """
+        if table_name in self._tables:
+            return True
+
+        return self.reflect_table(table_name)
+
+    def has_column(self, table_name: str, column_name: str) -> bool:
+        """Check if a column exists in a given table of the database
+
+        Parameters
+        ----------
+        table_name : str
+            The name of the table
+        column_name : str
+            The name of the column
+
+        Returns
+        -------
+        bool
+            True if the column exists, False else
+        """
+        if (table_name in self._tables) and (column_name in self._tables[table_name]):
+            return True
+
+        return self.reflect_table(table_name) and (column_name in self._tables[table_name])
+
+    def add_table(self, table: Table) -> None:
+        """Record a newly created table
+
+        Parameters
+        ----------
+        table : Table
+            The created table
+        """
+        self._tables[table.name] = set([column.name for column in table.columns])
+
+    def add_column(self, table_name: str, column_name: str) -> None:
+        """Record a newly created column
+
+        Parameters
+        ----------
+        table_name : str
+            The name of the table
+        column_name : str
+            The name of the created column
+        """
+        self._tables.setdefault(table_name, set()).add(column_name)
+
+
+@event.listens_for(Table, "after_create")
+def register_created_table(table: Table, *_: Any, **__: Any) -> None:
+    """Keep the schema catalog up to date when a table is created"""
+    SchemaCatalog().add_table(table)
+
+
 class Model(db.Model):
     """Base model class that includes CRUD convenience methods."""
 
     __abstract__ = True
     __tablename__: str | None = None
+    __indexes__: list[tuple[str, ...]] = []
+
+    @classmethod
+    def create_indexes(cls) -> None:
+        """Create the indexes declared in __indexes__ if they don't exist yet
+
+        This is also how the indexes are added to already existing databases
+        """
+        table = cls.__table__
+        index_names = [index.name for index in table.indexes]
+        for columns in cls.__indexes__:
+            index_name = f"ix_{table.name}_{'_'.join(columns)}"
+            if index_name in index_names:
+                continue
+
+            with table_locks.get(table.name):
+                Index(index_name, *[table.c[column] for column in columns]).create(db.engine, checkfirst=True)
 
     @classmethod
     def addRelationship(cls, name, TargetClass, **kwargs):
-        sem.acquire()
-        if not (hasattr(cls, name)):
-            setattr(cls, name, relationship(TargetClass.__name__, **kwargs))
-        sem.release()
+        # Lock-free path: the relationship is already known
+        if hasattr(cls, name):
+            return
+
+        with table_locks.get(str(cls.__tablename__)):
+            if not (hasattr(cls, name)):
+                setattr(cls, name, relationship(TargetClass.__name__, **kwargs))
 
     @classmethod
     def addColumn(cls, name, col_type, *constraints):
         assert cls.__tablename__ is not None
-        sem.acquire()
-        if not (hasattr(cls, name)):
-            column = Column(col_type, *constraints)
-            setattr(cls, name, column)
+
+        # Lock-free path: the column is already known (it is only published once it exists in the database)
+        if hasattr(cls, name):
+            return getattr(cls, name)
+
+        with table_locks.get(cls.__tablename__):
+            if hasattr(cls, name):
+                return getattr(cls, name)
 
             if not (name.replace("_", "").isalnum()):
                 raise MalformationError(
                     "Col name:" + name + " is incorrect. Only alphanumeric's and '_' symbol caracteres are allowed."
                 )
 
-            if inspect(db.engine).has_table(cls.__tablename__):
-                name_columns_in_table = [
-                    col_in_table["name"] for col_in_table in inspect(db.engine).get_columns(cls.__tablename__)
-                ]
-                if name not in name_columns_in_table:
+            column = Column(col_type, *constraints)
+            catalog = SchemaCatalog()
+            if catalog.has_table(cls.__tablename__):
+                if not catalog.has_column(cls.__tablename__, name):
                     column_type = column.type.compile(db.engine.dialect)
                     with db.engine.begin() as conn:
                         conn.execute(text(f"ALTER TABLE '{cls.__tablename__}' ADD COLUMN {name} {column_type}"))
+                    catalog.add_column(cls.__tablename__, name)
 
                     if len(constraints) > 0:
                         raise ConstraintsError(
@@ -133,12 +460,154 @@ class Model(db.Model):
                             + "Due to SQLite limitation, you can't add a constraint via "
                             + "ALTER TABLE ___ ADD COLUMN ___ ."
                         )
-        else:
-            column = getattr(cls, name)
 
-        sem.release()
+            setattr(cls, name, column)
+
         return column
 
+    @classmethod
+    def migrate_columns(cls) -> list[str]:
+        """Add to the existing table the columns of the model which are missing (table created by an older version)
+
+        Returns
+        -------
+        list[str]
+            The names of the added columns
+
+        Raises
+        ------
+        MalformationError
+            if a missing column can't be added (primary key or non-nullable column)
+        """
+        assert cls.__tablename__ is not None
+
+        catalog = SchemaCatalog()
+        added_columns: list[str] = []
+        with table_locks.get(cls.__tablename__):
+            for column in cls.__table__.columns:
+                if catalog.has_column(cls.__tablename__, column.name):
+                    continue
+
+                if column.primary_key or (not column.nullable):
+                    raise MalformationError(
+                        f"The column {column.name} is missing from the table {cls.__tablename__} "
+                        + "and can't be added as it is not nullable"
+                    )
+
+                column_type = column.type.compile(db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE '{cls.__tablename__}' ADD COLUMN {column.name} {column_type}"))
+                catalog.add_column(cls.__tablename__, column.name)
+                added_columns.append(column.name)
+
+        return added_columns
+
+    @classmethod
+    def is_long_format(cls) -> bool:
+        """Indicate if the dynamic fields are stored in the long format (key/value table)
+
+        Returns
+        -------
+        bool
+            True if the long format is used, False if the dynamic fields are columns of the table
+        """
+        return current_app.config.get("REPLIKANT_DB_STORAGE", "wide") == "long"
+
+    @classmethod
+    def values_model(cls) -> type["ValueModel"]:
+        """Get the model of the key/value table storing the dynamic fields of the current model
+
+        The table (and its covering indexes) is created if needed
+
+        Returns
+        -------
+        type[ValueModel]
+            The model of the key/value table
+        """
+        assert cls.__tablename__ is not None
+        return ModelFactory().create(cls.__tablename__, ValueModel)
+
+    @classmethod
+    def wide_select(cls, names: list[str]) -> Select:
+        """Generate the query reconstructing the wide layout of the current model
+
+        In the wide storage mode, the dynamic fields are already columns and the query simply selects them
+
+        Parameters
+        ----------
+        names : list[str]
+            The names of the dynamic fields to reconstruct
+
+        Returns
+        -------
+        Select
+            The select query, each row providing the columns of the model and the dynamic fields
+        """
+        if not cls.is_long_format():
+            return select(*cls.__table__.columns)
+
+        values_cls = cls.values_model()
+        fields = [func.max(case((values_cls.name == name, values_cls.value))).label(name) for name in names]
+        return (
+            select(*cls.__table__.columns, *fields)
+            .outerjoin(values_cls, values_cls.owner_id == cls.id)  # type: ignore
+            .group_by(cls.id)  # type: ignore
+        )
+
+    def set_values(self, values: dict[str, Any], col_type=db.String, commit=True) -> Self:
+        """Set the dynamic fields of a record
+
+        Depending on the storage mode, the fields are either columns of the table (created if needed)
+        or rows of the companion key/value table, which avoids any schema modification.
+
+        Parameters
+        ----------
+        values : dict[str, Any]
+            The values indexed by field name
+        col_type :
+            The type of the column (only used for the wide storage mode)
+        commit : bool
+            Commit the modifications
+
+        Returns
+        -------
+        Self
+            The updated record
+
+        Raises
+        ------
+        MalformationError
+            if a field name is not valid
+        """
+        cls = self.__class__
+        if not cls.is_long_format():
+            for name in values.keys():
+                cls.addColumn(name, col_type)
+            return self.update(commit=commit, **values)
+
+        for name in values.keys():
+            if not (name.replace("_", "").isalnum()):
+                raise MalformationError(
+                    "Col name:" + name + " is incorrect. Only alphanumeric's and '_' symbol caracteres are allowed."
+                )
+
+        # Make sure the record has an ID
+        if self.id is None:  # type: ignore
+            db.session.add(self)
+            db.session.flush()
+
+        # NOTE: a field can already be set (e.g., the form is saved again), so the rows are merged
+        values_cls = cls.values_model()
+        for name, value in values.items():
+            if isinstance(value, bytes):
+                db.session.merge(values_cls(owner_id=self.id, name=name, value=None, blob=value))  # type: ignore
+            else:
+                db.session.merge(values_cls(owner_id=self.id, name=name, value=str(value), blob=None))  # type: ignore
+
+        if commit:
+            db.session.commit()
+        return self
+
     def update(self, commit=True, **kwargs):
         """Update specific fields of a record."""
         for attr, value in kwargs.items():
@@ -163,6 +632,67 @@ class Model(db.Model):
         instance = cls(**kwargs)
         return instance.save(commit=commit)
 
+    @classmethod
+    def prepare_row(cls, row: dict[str, Any]) -> dict[str, Any]:
+        """Complete a row before its bulk insertion
+
+        This is the bulk counterpart of the constructor and should be overriden by
+        the models whose constructor fills some columns
+
+        Parameters
+        ----------
+        row : dict[str, Any]
+            The values of the row indexed by column name
+
+        Returns
+        -------
+        dict[str, Any]
+            The completed row
+        """
+        return row
+
+    @classmethod
+    def bulk_create(cls, rows: list[dict[str, Any]], commit=True) -> int:
+        """Create several records using a single (executemany) INSERT statement
+
+        No ORM object is instanciated, the rows are directly given to the SQLAlchemy Core insert
+
+        Parameters
+        ----------
+        rows : list[dict[str, Any]]
+            The rows to insert, each row is the dictionnary of values indexed by column name
+        commit : bool
+            Commit the insertion
+
+        Returns
+        -------
+        int
+            The number of inserted rows
+        """
+        if len(rows) == 0:
+            return 0
+
+        db.session.execute(insert(cls.__table__), [cls.prepare_row(dict(row)) for row in rows])
+        if commit:
+            db.session.commit()
+        return len(rows)
+
+
+class ValueModel(Model):
+    """Model of the key/value tables storing the dynamic fields of a model in the long storage mode
+
+    Each row associates a field (\"name\") of a record (\"owner_id\") to its value (\"value\" or,
+    for binary content, \"blob\")
+    """
+
+    __abstract__ = True
+    __indexes__ = [("owner_id", "name", "value"), ("name", "value", "owner_id")]
+
+    owner_id = Column(db.Integer, primary_key=True)
+    name = Column(db.String, primary_key=True)
+    value = Column(db.String)
+    blob = Column(db.LargeBinary)
+
 
 class ModelFactory(metaclass=AppSingleton):
     def __init__(self):
@@ -181,9 +711,13 @@ class ModelFactory(metaclass=AppSingleton):
         if table_name in self.register:
             return True
 
-        sem.acquire()
+        with table_locks.get(table_name):
+            if table_name in self.register:
+                return True
+
+            if not SchemaCatalog().has_table(table_name):
+                return False
 
-        if inspect(db.engine).has_table(table_name):
             self.register[table_name] = type(
                 table_name,
                 (
@@ -199,73 +733,689 @@ class ModelFactory(metaclass=AppSingleton):
                     },
                 },
             )
-            sem.release()
             return True
-        else:
-            sem.release()
-            return False
 
     def create(self, table_suffix, base, commit=True):
         table_name = base.__name__.replace("Model", "") + "_" + table_suffix
 
-        sem.acquire()
-        if not (table_name in self.register):
-            if Model in base.__bases__:
-                assert base.__abstract__
-
-            if inspect(db.engine).has_table(table_name):
-                self.register[table_name] = type(
-                    table_name,
-                    (
-                        base,
-                        Model,
-                    ),
-                    {
-                        "__tablename__": table_name,
-                        "__table_args__": {
-                            "extend_existing": True,
-                            # "autoload": True,
-                            "autoload_with": db.engine,
+        # Lock-free path: the model is known and, if required, the table exists
+        if (table_name in self.register) and ((not commit) or SchemaCatalog().has_table(table_name)):
+            return self.register[table_name]
+
+        with table_locks.get(table_name):
+            if not (table_name in self.register):
+                if Model in base.__bases__:
+                    assert base.__abstract__
+
+                if SchemaCatalog().has_table(table_name):
+                    self.register[table_name] = type(
+                        table_name,
+                        (
+                            base,
+                            Model,
+                        ),
+                        {
+                            "__tablename__": table_name,
+                            "__table_args__": {
+                                "extend_existing": True,
+                                # "autoload": True,
+                                "autoload_with": db.engine,
+                            },
                         },
-                    },
-                )
-            else:
-                self.register[table_name] = type(
-                    table_name,
-                    (
-                        base,
-                        Model,
-                    ),
-                    {
-                        "__tablename__": table_name,
-                        "__table_args__": {"extend_existing": True},
-                    },
-                )
+                    )
+                else:
+                    self.register[table_name] = type(
+                        table_name,
+                        (
+                            base,
+                            Model,
+                        ),
+                        {
+                            "__tablename__": table_name,
+                            "__table_args__": {"extend_existing": True},
+                        },
+                    )
 
-        if commit:
-            model_cls = self.register[table_name]
-            if not (inspect(db.engine).has_table(model_cls.__tablename__)):
-                model_cls.__table__.create(db.engine)
-            table = model_cls
-        else:
             table = self.register[table_name]
+            if commit and not (SchemaCatalog().has_table(table.__tablename__)):
+                table.__table__.create(db.engine)
 
-        sem.release()
+            if SchemaCatalog().has_table(table.__tablename__):
+                table.migrate_columns()
+                table.create_indexes()
 
         return table
 
     def commit(self, model_cls):
         """Commit the model to the database"""
 
-        sem.acquire()
-        if not (inspect(db.engine).has_table(model_cls.__tablename__)):
-            model_cls.__table__.create(db.engine)
-        sem.release()
+        # Lock-free path: the table already exists
+        if SchemaCatalog().has_table(model_cls.__tablename__):
+            return model_cls
+
+        with table_locks.get(model_cls.__tablename__):
+            if not (SchemaCatalog().has_table(model_cls.__tablename__)):
+                model_cls.__table__.create(db.engine)
+                model_cls.create_indexes()
 
         return model_cls
 
 
-def extract_dataframes(names: list[str] | None = []) -> dict[str, pd.DataFrame]:
+class WriteJob:
+    """A write operation submitted to the group commit writer"""
+
+    def __init__(self, operation: Callable[[Connection], Any], nb_rows: int, blocking: bool = False):
+        """Initialisation
+
+        Parameters
+        ----------
+        operation : Callable[[Connection], Any]
+            The function executing the write operation using the given connection (it should not commit)
+        nb_rows : int
+            The number of rows written by the operation
+        blocking : bool
+            Flag to indicate if the submitter is waiting for the operation to be committed
+        """
+        self.operation = operation
+        self.nb_rows = nb_rows
+        self.blocking = blocking
+        self.error: Exception | None = None
+        self._done = threading.Event()
+
+    def done(self, error: Exception | None = None) -> None:
+        """Mark the job as committed (or failed)
+
+        Parameters
+        ----------
+        error : Exception | None
+            The error which made the job fail, None if it succeeded
+        """
+        self.error = error
+        self._done.set()
+
+    def wait(self) -> None:
+        """Wait for the job to be committed
+
+        Raises
+        ------
+        Exception
+            the error which made the job fail
+        """
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class GroupCommitWriter(metaclass=AppSingleton):
+    """Single writer committing the submitted write operations by groups
+
+    The request handlers submit their write operations to a bounded
+    queue. A dedicated thread takes all the pending operations and
+    commits them in one transaction, so the operations submitted while a
+    group is being committed form the next group. As long as nobody waits
+    for the group, the writer keeps gathering the operations for up to
+    "interval_ms" milliseconds. A group is also closed as soon as
+    "max_rows" rows are pending. A handler requiring durability waits
+    until its operation is committed.
+
+    The writer can also be used, with its default parameters, when the
+    group commit is not enabled (e.g., to batch the logging of events).
+    """
+
+    def __init__(self):
+        config: dict[str, Any] = current_app.config.get("REPLIKANT_GROUP_COMMIT") or dict()
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._app: Flask = current_app._get_current_object()  # type: ignore
+        self._interval: float = int(config.get("interval_ms", 20)) / 1000
+        self._max_rows: int = int(config.get("max_rows", 500))
+        self._queue: queue.Queue[WriteJob] = queue.Queue(maxsize=int(config.get("queue_size", 1000)))
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._thread_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def enabled() -> bool:
+        """Indicate if the group commit is enabled in the database profile
+
+        Returns
+        -------
+        bool
+            True if the group commit is enabled, False else
+        """
+        return current_app.config.get("REPLIKANT_GROUP_COMMIT") is not None
+
+    def submit(self, operation: Callable[[Connection], Any], nb_rows: int = 1, wait: bool = True) -> WriteJob:
+        """Submit a write operation
+
+        Parameters
+        ----------
+        operation : Callable[[Connection], Any]
+            The function executing the write operation using the given connection (it should not commit)
+        nb_rows : int
+            The number of rows written by the operation
+        wait : bool
+            Wait for the operation to be committed
+
+        Returns
+        -------
+        WriteJob
+            The submitted job
+        """
+        self._ensure_thread()
+        job = WriteJob(operation, nb_rows, wait)
+        self._queue.put(job)
+        if wait:
+            job.wait()
+        return job
+
+    def submit_rows(
+        self,
+        model_cls: type["Model"],
+        rows: list[dict[str, Any]],
+        wait: bool = True,
+        extra_operation: Callable[[Connection], Any] | None = None,
+    ) -> WriteJob:
+        """Submit rows to be inserted in the table of a given model
+
+        Parameters
+        ----------
+        model_cls : type[Model]
+            The model of the table
+        rows : list[dict[str, Any]]
+            The rows to insert
+        wait : bool
+            Wait for the rows to be committed
+        extra_operation : Callable[[Connection], Any] | None
+            An additional write operation committed in the same transaction as the rows
+
+        Returns
+        -------
+        WriteJob
+            The submitted job
+        """
+        table = model_cls.__table__
+        rows = [model_cls.prepare_row(dict(row)) for row in rows]
+
+        def operation(conn: Connection) -> None:
+            conn.execute(insert(table), rows)
+            if extra_operation is not None:
+                extra_operation(conn)
+
+        return self.submit(operation, len(rows), wait)
+
+    def flush(self) -> None:
+        """Wait for all the operations submitted so far to be committed"""
+        if (self._thread is not None) and self._thread.is_alive():
+            self.submit(lambda _: None, 0, wait=True)
+
+    def _ensure_thread(self) -> None:
+        """Start the writer thread if it is not running in the current process (threads don't survive a fork)"""
+        if (self._thread is not None) and (self._pid == os.getpid()):
+            return
+
+        with self._thread_lock:
+            if (self._thread is None) or (self._pid != os.getpid()):
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="replikant-group-commit", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        """Main loop of the writer thread"""
+        while True:
+            group = [self._queue.get()]
+            nb_rows = group[0].nb_rows
+            blocking = group[0].blocking
+            deadline = time.monotonic() + self._interval
+            while nb_rows < self._max_rows:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    # NOTE: a handler waits for the group, so it is committed as soon as the queue is drained
+                    timeout = deadline - time.monotonic()
+                    if blocking or (timeout <= 0):
+                        break
+
+                    try:
+                        job = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+
+                group.append(job)
+                nb_rows += job.nb_rows
+                blocking = blocking or job.blocking
+
+            self._commit(group)
+
+    def _commit(self, group: list[WriteJob]) -> None:
+        """Commit a group of write operations in one transaction
+
+        If the transaction fails, the operations are committed one by one so only the faulty ones fail
+
+        Parameters
+        ----------
+        group : list[WriteJob]
+            The group of write operations
+        """
+        with self._app.app_context():
+            try:
+                with db.engine.begin() as conn:
+                    for job in group:
+                        job.operation(conn)
+            except Exception as ex:
+                self._logger.warning(f"Committing a group of {len(group)} operations failed ({ex}), retrying each")
+                for job in group:
+                    try:
+                        with db.engine.begin() as conn:
+                            job.operation(conn)
+                        job.done()
+                    except Exception as job_ex:
+                        job.done(job_ex)
+                return
+
+        for job in group:
+            job.done()
+
+
+def write_rows(
+    model_cls: type["Model"],
+    rows: list[dict[str, Any]],
+    wait: bool = True,
+    extra_operation: Callable[[Connection], Any] | None = None,
+) -> None:
+    """Insert and commit rows in the table of a given model
+
+    If the group commit is enabled, the rows are given to the writer thread, else they are directly inserted
+
+    Parameters
+    ----------
+    model_cls : type[Model]
+        The model of the table
+    rows : list[dict[str, Any]]
+        The rows to insert
+    wait : bool
+        Wait for the rows to be committed (only relevant if the group commit is enabled)
+    extra_operation : Callable[[Connection], Any] | None
+        An additional write operation committed in the same transaction as the rows
+    """
+    if len(rows) == 0:
+        return
+
+    if GroupCommitWriter.enabled():
+        GroupCommitWriter().submit_rows(model_cls, rows, wait=wait, extra_operation=extra_operation)
+    else:
+        model_cls.bulk_create(rows, commit=False)
+        if extra_operation is not None:
+            extra_operation(db.session.connection())
+        db.session.commit()
+
+
+class TransactionLock(metaclass=AppSingleton):
+    """Row locked by the exclusive transactions of the non-SQLite backends (see exclusive_transaction)
+
+    Locking the row (SELECT ... FOR UPDATE) serializes the transactions like the "BEGIN IMMEDIATE" of SQLite, so
+    they wait for each other instead of failing because of a serialization conflict. The table isn't part of the
+    models, it is created with its single row when first needed.
+    """
+
+    TABLE: Table = Table("TransactionLock", MetaData(), Column("id", db.Integer, primary_key=True))
+
+    def __init__(self):
+        self._ready: bool = False
+        self._init_lock = threading.Lock()
+
+    def acquire(self, conn: Connection) -> None:
+        """Lock the row in the current transaction of a given connection (released when the transaction ends)
+
+        Parameters
+        ----------
+        conn : Connection
+            The connection of the transaction
+        """
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    self._create()
+                    self._ready = True
+
+        conn.execute(select(self.TABLE.c.id).where(self.TABLE.c.id == 1).with_for_update())
+
+    def _create(self, nb_attempts: int = 3) -> None:
+        """Create the table and its row if needed
+
+        Parameters
+        ----------
+        nb_attempts : int
+            The number of attempts (another process can create the table or the row concurrently)
+        """
+        for attempt in range(nb_attempts):
+            try:
+                with db.engine.begin() as conn:
+                    self.TABLE.create(conn, checkfirst=True)
+                    if conn.execute(select(self.TABLE.c.id).where(self.TABLE.c.id == 1)).first() is None:
+                        conn.execute(insert(self.TABLE).values(id=1))
+                return
+            except DBAPIError:
+                if attempt == nb_attempts - 1:
+                    raise
+
+
+@contextmanager
+def exclusive_transaction() -> Iterator[Connection]:
+    """Open a write transaction serialized with the ones of all the processes using the database
+
+    For SQLite, the transaction is started using "BEGIN IMMEDIATE" so the write lock is taken upfront (the
+    concurrent transactions wait for it, up to the busy timeout). For the other backends, the transaction starts
+    by locking the row of TransactionLock and uses the READ COMMITTED isolation level, so it sees everything
+    committed by the previous exclusive transactions.
+
+    The transaction is committed when the context is exited normally and rolled back otherwise.
+
+    Yields
+    ------
+    Connection
+        The connection of the transaction
+    """
+    if db.engine.dialect.name != "sqlite":
+        with db.engine.connect().execution_options(isolation_level="READ COMMITTED") as conn:
+            with conn.begin():
+                TransactionLock().acquire(conn)
+                yield conn
+        return
+
+    # NOTE: the driver should not manage the transaction for the BEGIN IMMEDIATE to be used
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+
+
+def backup_database(target: str, pages: int = 256, sleep: float = 0.005) -> None:
+    """Make a consistent copy of the SQLite database while it is in use
+
+    In WAL mode, the copy is made by "VACUUM INTO" which reads a
+    consistent snapshot without blocking the writers. Otherwise, the
+    SQLite backup API copies the database by steps of a given number of
+    pages, releasing the lock between the steps.
+
+    Parameters
+    ----------
+    target : str
+        The path of the copy (it should not exist)
+    pages : int
+        The number of pages copied at each step of the backup API
+    sleep : float
+        The pause (in seconds) between two steps of the backup API
+
+    Raises
+    ------
+    DataBaseError
+        if the database is not a SQLite database
+    """
+    if db.engine.dialect.name != "sqlite":
+        raise DataBaseError("Only SQLite databases can be backed up")
+
+    raw_connection = db.engine.raw_connection()
+    try:
+        source: sqlite3.Connection = raw_connection.driver_connection  # type: ignore
+        journal_mode = source.execute("PRAGMA journal_mode").fetchone()[0]
+        if journal_mode.lower() == "wal":
+            source.execute("VACUUM INTO ?", (target,))
+        else:
+            destination = sqlite3.connect(target)
+            try:
+                source.backup(destination, pages=pages, sleep=sleep)
+            finally:
+                destination.close()
+    finally:
+        raw_connection.close()
+
+
+class DatabaseSnapshot(metaclass=AppSingleton):
+    """Cached consistent snapshot of the SQLite database
+
+    The snapshot is only regenerated if the database has been modified since the previous one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watermarks: dict[str, tuple[int, ...]] = dict()
+
+    @staticmethod
+    def watermark() -> tuple[int, ...]:
+        """Compute the write watermark of the database from its files (including the WAL file)
+
+        Returns
+        -------
+        tuple[int, ...]
+            The modification times and sizes of the database files
+        """
+        watermark: list[int] = []
+        db_file = current_app.config["SQLALCHEMY_FILE"]
+        for path in [db_file, f"{db_file}-wal"]:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                watermark += [stat.st_mtime_ns, stat.st_size]
+        return tuple(watermark)
+
+    def get(self, path: str) -> str:
+        """Get an up-to-date snapshot of the database
+
+        Parameters
+        ----------
+        path : str
+            The path of the snapshot file
+
+        Returns
+        -------
+        str
+            The path of the snapshot file
+        """
+        with self._lock:
+            # NOTE: the watermark is computed before the backup so a write happening during it invalidates the snapshot
+            watermark = self.watermark()
+            if (self._watermarks.get(path) == watermark) and os.path.exists(path):
+                return path
+
+            # NOTE: the temporary file is unique as the workers of the instance can rebuild the snapshot concurrently
+            #       (an empty file is accepted by the backup)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+            )
+            os.close(fd)
+            try:
+                backup_database(tmp_path)
+
+                # Provide the wide layouts of the long storage mode in the snapshot (the live database is not modified)
+                snapshot_engine = create_engine(f"sqlite:///{tmp_path}", poolclass=NullPool)
+                try:
+                    create_wide_views(snapshot_engine)
+                finally:
+                    snapshot_engine.dispose()
+
+                # NOTE: the replacement is atomic and doesn't affect the ongoing downloads of the previous snapshot
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._watermarks[path] = watermark
+
+        return path
+
+
+class ReadEngine(metaclass=AppSingleton):
+    """Engine dedicated to the read-only workloads of the administration (exports, monitoring...)
+
+    The engine has its own connections so the administration never competes with the participants for the pool
+    of the main engine. For SQLite, the database is opened in read-only mode or, if a snapshot interval is
+    defined, a snapshot of the database refreshed at most every interval is read so the long exports never
+    hold a read transaction on the live database (which would stall the WAL checkpoints).
+    """
+
+    def __init__(self):
+        config: dict[str, Any] = current_app.config.get("REPLIKANT_DB_READ") or dict()
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._snapshot_interval: float | None = config.get("snapshot_interval")
+        self._snapshot_path = f"{current_app.config['REPLIKANT_RECIPE_TMP_DIR']}/admin_snapshot.db"
+        self._snapshot_date: float | None = None
+        self._pragmas: dict[str, Any] = config.get("pragmas", dict())
+
+        db_file = current_app.config.get("SQLALCHEMY_FILE")
+        if config.get("uri") is not None:
+            self._engine = create_engine(config["uri"])
+            self._snapshot_interval = None
+        elif not db_file:
+            self._engine = create_engine(current_app.config["SQLALCHEMY_DATABASE_URI"])
+            self._snapshot_interval = None
+        else:
+            # NOTE: no pool as the snapshot file is replaced when refreshed
+            path = self._snapshot_path if self._snapshot_interval is not None else db_file
+            self._engine = create_engine(
+                f"sqlite:///file:{urllib.parse.quote(path)}?mode=ro&uri=true", poolclass=NullPool
+            )
+            event.listen(self._engine, "connect", self._apply_pragmas)
+
+    def _apply_pragmas(self, dbapi_connection, _) -> None:
+        """Apply the pragmas of the read-only connections"""
+        cursor = dbapi_connection.cursor()
+        for pragma, value in self._pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+    def get(self) -> Engine:
+        """Get the read engine (refreshing the snapshot if it is too old)
+
+        Returns
+        -------
+        Engine
+            The read engine
+        """
+        if self._snapshot_interval is not None:
+            with self._lock:
+                now = time.monotonic()
+                if (self._snapshot_date is None) or (now - self._snapshot_date >= self._snapshot_interval):
+                    DatabaseSnapshot().get(self._snapshot_path)
+                    self._snapshot_date = now
+                    self._logger.debug(f"The snapshot {self._snapshot_path} read by the administration is refreshed")
+
+        return self._engine
+
+
+def read_engine() -> Engine:
+    """Get the engine dedicated to the read-only workloads of the administration
+
+    Returns
+    -------
+    Engine
+        The read engine
+    """
+    return ReadEngine().get()
+
+
+def create_all_indexes() -> None:
+    """Create the missing indexes of all the models whose table exists in the database
+
+    This is called at startup so already existing databases get the indexes of the current version
+    """
+    for mapper in list(db.Model.registry.mappers):
+        model_cls = mapper.class_
+        if (
+            issubclass(model_cls, Model)
+            and model_cls.__indexes__
+            and SchemaCatalog().has_table(model_cls.__tablename__)  # type: ignore
+        ):
+            model_cls.create_indexes()
+
+
+def explain_query_plan(query: Select) -> list[str]:
+    """Get the query plan of a given query (only supported for SQLite)
+
+    Parameters
+    ----------
+    query : Select
+        The query to explain
+
+    Returns
+    -------
+    list[str]
+        The details of each step of the plan, empty if the database is not a SQLite one
+    """
+    if db.engine.dialect.name != "sqlite":
+        return []
+
+    statement = str(query.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {statement}"))]
+
+
+def wide_queries(engine: Engine | None = None) -> dict[str, str]:
+    """Generate the queries reconstructing the wide layout of the tables using the long storage mode
+
+    For each key/value table "Value_<table>", the query associated to "<table>_wide" provides the
+    columns of "<table>" followed by one column per field name
+
+    Parameters
+    ----------
+    engine : Engine | None
+        The engine of the database (default: the main engine)
+
+    Returns
+    -------
+    dict[str, str]
+        The dictionnary associating the name of the wide view to the query
+    """
+    engine = engine if engine is not None else db.engine
+    queries: dict[str, str] = dict()
+    for values_table in inspect(engine).get_table_names():
+        if not values_table.startswith("Value_"):
+            continue
+
+        table_name = values_table.replace("Value_", "", 1)
+        with engine.connect() as conn:
+            names = conn.execute(text(f'SELECT DISTINCT name FROM "{values_table}" ORDER BY name')).scalars().all()
+        fields = "".join([f", MAX(CASE WHEN v.name = '{name}' THEN v.value END) AS \"{name}\"" for name in names])
+        queries[table_name + WIDE_VIEW_SUFFIX] = (
+            f'SELECT o.*{fields} FROM "{table_name}" o '
+            + f'LEFT JOIN "{values_table}" v ON v.owner_id = o.id GROUP BY o.id'
+        )
+
+    return queries
+
+
+def create_wide_views(engine: Engine | None = None) -> list[str]:
+    """(Re)create the views reconstructing the wide layout of the tables using the long storage mode
+
+    See wide_queries for the definition of the views
+
+    Parameters
+    ----------
+    engine : Engine | None
+        The engine of the database (default: the main engine)
+
+    Returns
+    -------
+    list[str]
+        The names of the generated views
+    """
+    engine = engine if engine is not None else db.engine
+    queries = wide_queries(engine)
+    with engine.begin() as conn:
+        for view_name, query in queries.items():
+            conn.execute(text(f'DROP VIEW IF EXISTS "{view_name}"'))
+            conn.execute(text(f'CREATE VIEW "{view_name}" AS {query}'))
+
+    return list(queries.keys())
+
+
+def extract_dataframes(
+    names: list[str] | None = [], excluded_prefixes: list[str] | None = None
+) -> dict[str, pd.DataFrame]:
     """Extract the pandas DataFrame for each required (or all the available) tables in the database
 
     If the list of names is empty or none, all the tables are returned
@@ -274,6 +1424,8 @@ def extract_dataframes(names: list[str] | None = []) -> dict[str, pd.DataFrame]:
     ----------
     names : list[str]|None
         the list of table names
+    excluded_prefixes : list[str] | None
+        the prefixes of the tables to ignore when all the tables are returned
 
     Returns
     -------
@@ -285,11 +1437,12 @@ def extract_dataframes(names: list[str] | None = []) -> dict[str, pd.DataFrame]:
     Exception
         if at least one requested table does not exist in the database
     """
-    #
-    inspection = inspect(db.engine)
-    all_table_names = inspection.get_table_names()
+    # NOTE: the wide layouts are computed on the fly as the read engine can't (re)create the views
+    engine = read_engine()
+    wide_layouts = wide_queries(engine)
+    all_table_names = inspect(engine).get_table_names() + list(wide_layouts.keys())
     if (not names) or (names is None):
-        names = all_table_names
+        names = [name for name in all_table_names if not name.startswith(tuple(excluded_prefixes or []))]
     else:
         diff_names = [element for element in names if element not in all_table_names]
         if diff_names:
@@ -298,36 +1451,43 @@ def extract_dataframes(names: list[str] | None = []) -> dict[str, pd.DataFrame]:
     dict_res = dict()
     for name_table in names:
         # Generate the dataframe corresponding to the table
-        df = pd.read_sql_query(f"SELECT * FROM {name_table}", db.engine)
+        query = wide_layouts.get(name_table, f"SELECT * FROM {name_table}")
+        df = pd.read_sql_query(text(query), engine)
         dict_res[name_table] = df
 
     return dict_res
 
 
-def export_schema() -> tuple[list[str], list[str]]:
+def export_schema(excluded_prefixes: list[str] | None = None) -> tuple[list[str], list[str]]:
     """Generate the SQL script to recreate and refill the database
 
+    Parameters
+    ----------
+    excluded_prefixes : list[str] | None
+        the prefixes of the tables to ignore
+
     Returns
     -------
     str
         the content of the SQL script
     """
+    engine = read_engine()
     metadata = MetaData()
-    metadata.reflect(bind=db.engine)
+    metadata.reflect(bind=engine, only=lambda name, _: not name.startswith(tuple(excluded_prefixes or [])))
 
     ddl_statements = []
     for table in metadata.sorted_tables:
-        ddl = str(CreateTable(table).compile(bind=db.engine))
+        ddl = str(CreateTable(table).compile(bind=engine))
         ddl_statements.append(ddl + ";")
 
     dml_statements = []
-    with db.engine.connect() as conn:
+    with engine.connect() as conn:
         for table in metadata.sorted_tables:
             result = conn.execute(table.select()).mappings().all()
             for row in result:
                 values = {col.name: row[col.name] for col in table.columns}
                 insert_sql = (
-                    table.insert().values(**values).compile(bind=db.engine, compile_kwargs={"literal_binds": True})
+                    table.insert().values(**values).compile(bind=engine, compile_kwargs={"literal_binds": True})
                 )
                 dml_statements.append(str(insert_sql) + ";")
 
@@ -1,24 +1,32 @@
 # Python
+import atexit
+import os
 import pathlib
 import random
 import string
 import datetime
 import argparse
+import sys
+import uuid
 
 # Messaging/logging
 import logging
 from logging.config import dictConfig
 
+# Data
+import numpy as np
+import yaml
+
 # Flask
 from flask import Flask
 from werkzeug.serving import run_simple
 
 # Replikant
-from replikant.utils import safe_make_dir
+from replikant.utils import release_shared_memory, safe_make_dir
 from replikant.core import error, campaign_instance
 from replikant.core import Config
 from replikant.core.providers import TemplateProvider, AssetsProvider, provider_factory
-from replikant.database import db
+from replikant.database import db, init_database, create_all_indexes
 from replikant.extensions import session_manager
 
 ###############################################################################
@@ -113,6 +121,13 @@ def define_argument_parser() -> argparse.ArgumentParser:
         help="URL of the server (needed for flask redirections!) if different from http://<ip>:<port>/",
     )
 
+    # Database options
+    parser.add_argument(
+        "--rebuild-progress",
+        action="store_true",
+        help="Rebuild the progress of the participants from the results of the tasks",
+    )
+
     # Logging options
     parser.add_argument("-l", "--log_file", default=None, help="Logger file")
     parser.add_argument("-v", "--verbosity", action="count", default=0, help="increase output verbosity")
@@ -121,7 +136,89 @@ def define_argument_parser() -> argparse.ArgumentParser:
     return parser
 
 
-def create_app(recipe_entrypoint: pathlib.Path, recipe_url: str, debug: bool, logger: logging.Logger) -> Flask:
+def define_design_argument_parser() -> argparse.ArgumentParser:
+    """Defines the argument parser of the command "design"
+
+    Returns
+    --------
+    The argument parser: argparse.ArgumentParser
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="replikant design", description="Build the precomputed design of a task (see PrecomputedSelection)"
+    )
+    parser.add_argument("recipe_configuration_file", type=str, help="Path to the configuration of the recipe")
+    parser.add_argument("task", type=str, help="Name of the task activity")
+    parser.add_argument("nb_participants", type=int, help="Planned number of participants")
+
+    # Design options
+    parser.add_argument(
+        "-s", "--strategy", type=str, default=None, help="Selection strategy used to build the design"
+    )
+    parser.add_argument(
+        "-k",
+        "--strategy-kwargs",
+        type=str,
+        default=None,
+        help="Parameters of the strategy as a YAML mapping (e.g. '{targets: 20}'), overriding the ones of the task",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random generators")
+    parser.add_argument(
+        "-f", "--force", action="store_true", help="Replace the design even if participants already use it"
+    )
+
+    # Logging options
+    parser.add_argument("-l", "--log_file", default=None, help="Logger file")
+    parser.add_argument("-v", "--verbosity", action="count", default=0, help="increase output verbosity")
+
+    # Return parser
+    return parser
+
+
+def uses_shared_counters() -> bool:
+    """Check if a task of the campaign keeps the counters of its selection strategy in shared memory
+
+    Returns
+    -------
+    bool
+        True if the selection strategy of a task uses the option counters: shared, False else
+    """
+    for activity in campaign_instance.get_activity_graph().list_activities().values():
+        if (activity.mod_rep != "task") or ("selection_strategy" not in activity):
+            continue
+
+        strategy = activity["selection_strategy"]
+        if isinstance(strategy, dict) and ((strategy.get("kwargs") or dict()).get("counters") == "shared"):
+            return True
+
+    return False
+
+
+def init_shared_memory(app: Flask) -> None:
+    """Prepare the management of the memory shared by the processes of the instance
+
+    Parameters
+    ----------
+    app : Flask
+        The application whose shared memory is managed
+    """
+    from multiprocessing import resource_tracker
+
+    # NOTE: the resource tracker is started before forking the workers, so a stopped worker doesn't release the memory
+    resource_tracker.ensure_running()
+    master_pid = os.getpid()
+    atexit.register(
+        lambda: release_shared_memory(app.config["REPLIKANT_INSTANCE_ID"]) if os.getpid() == master_pid else None
+    )
+
+
+def create_app(
+    recipe_entrypoint: pathlib.Path,
+    recipe_url: str,
+    debug: bool,
+    logger: logging.Logger,
+    rebuild_progress: bool = False,
+) -> Flask:
     """Create the Flask Application
 
     Parameters
@@ -134,6 +231,8 @@ def create_app(recipe_entrypoint: pathlib.Path, recipe_url: str, debug: bool, lo
         Shall we activate the debug mode?
     log_level : int
         the default logging level
+    rebuild_progress : bool
+        Shall we rebuild the progress of the participants from the results of the tasks?
 
     Returns
     -------
@@ -152,6 +251,10 @@ def create_app(recipe_entrypoint: pathlib.Path, recipe_url: str, debug: bool, lo
     app.config.setdefault("REPLIKANT_RECIPE_DIR", str(recipe_directory))
     app.config.setdefault("REPLIKANT_RECIPE_URL", recipe_url)
     app.config.setdefault("REPLIKANT_RECIPE_TMP_DIR", safe_make_dir(str(recipe_directory / ".tmp")))
+    app.config.setdefault("REPLIKANT_REBUILD_PROGRESS", rebuild_progress)
+
+    # The ID of the instance identifies the memory shared by its processes (the workers forked from this one)
+    app.config.setdefault("REPLIKANT_INSTANCE_ID", uuid.uuid4().hex[:8])
 
     # Config Session
     app.config.setdefault("SESSION_TYPE", "filesystem")
@@ -166,8 +269,9 @@ def create_app(recipe_entrypoint: pathlib.Path, recipe_url: str, debug: bool, lo
     app.config.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///" + app.config["SQLALCHEMY_FILE"])
     app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
 
-    # Initialisation of the DB connection
-    db.init_app(app)
+    # Initialisation of the DB connection based on the database profile of the recipe
+    config = Config(recipe_entrypoint)
+    init_database(app, config.get_database_config())
 
     # Session manager initialisation
     session_manager.init_app(app)
@@ -181,11 +285,15 @@ def create_app(recipe_entrypoint: pathlib.Path, recipe_url: str, debug: bool, lo
         )
 
         # Config app based on structure.json
-        config = Config(recipe_entrypoint)
         campaign_instance.load_config(config)
 
-        # campaign ready to run, create the database
+        # The memory shared by the processes is only managed if a task keeps its selection counters in it
+        if uses_shared_counters():
+            init_shared_memory(app)
+
+        # campaign ready to run, create the database (and the indexes missing from an existing one)
         db.create_all()
+        create_all_indexes()
 
         # Error management
         error.error_handler = error.ErrorHandler(app, config)  # type: ignore
@@ -193,8 +301,53 @@ def create_app(recipe_entrypoint: pathlib.Path, recipe_url: str, debug: bool, lo
     return app
 
 
+def design(argv: list[str]):
+    """Build the precomputed design of a task
+
+    Parameters
+    ----------
+    argv : list[str]
+        The arguments of the command
+    """
+
+    # Initialization
+    args = define_design_argument_parser().parse_args(argv)
+    logger = configure_logger(args)
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+
+    strategy_kwargs = None
+    if args.strategy_kwargs is not None:
+        strategy_kwargs = yaml.safe_load(args.strategy_kwargs)
+        if not isinstance(strategy_kwargs, dict):
+            raise Exception(f'The parameters of the strategy should be a YAML mapping, not "{args.strategy_kwargs}"')
+
+    app = create_app(pathlib.Path(args.recipe_configuration_file), "http://localhost", debug=False, logger=logger)
+    with app.app_context():
+        from replikant.activities.task.src import task_manager
+        from replikant.activities.task.src.task import TaskError
+
+        activities = campaign_instance.get_activity_graph().list_activities()
+        if (args.task not in activities) or (activities[args.task].mod_rep != "task"):
+            raise Exception(f'"{args.task}" is not a task activity of the recipe')
+
+        task = task_manager.register(args.task, activities[args.task])
+        try:
+            nb_rows = task.build_design(args.nb_participants, args.strategy, strategy_kwargs, force=args.force)
+        except TaskError as ex:
+            logger.error(str(ex))
+            sys.exit(1)
+        logger.info(f'The design of "{args.task}" ({args.nb_participants} participants, {nb_rows} samples) is built')
+
+
 def main():
 
+    # Dispatch the commands (running a recipe is the default one)
+    if (len(sys.argv) > 1) and (sys.argv[1] == "design"):
+        design(sys.argv[2:])
+        return
+
     # Initialization
     arg_parser = define_argument_parser()
     args = arg_parser.parse_args()
@@ -205,15 +358,29 @@ def main():
     all_files: list[pathlib.Path] = list(recipe_configuration_path.parent.glob("**/*"))
     extra_files: list[str] = []
     for f in all_files:
-        if (str(f).find("/.tmp/") == -1) and (str(f).find("/assets/tmp_eval/") == -1) and (not str(f).endswith(".db")):
+        if (
+            (str(f).find("/.tmp/") == -1)
+            and (str(f).find("/assets/tmp_eval/") == -1)
+            and (not str(f).endswith((".db", ".db-wal", ".db-shm", ".db-journal")))
+        ):
             extra_files.append(str(f))
 
     # Finally create and run app
     if args.url:
-        app = create_app(recipe_configuration_path, args.url, debug=args.debug, logger=logger)
+        app = create_app(
+            recipe_configuration_path,
+            args.url,
+            debug=args.debug,
+            logger=logger,
+            rebuild_progress=args.rebuild_progress,
+        )
     else:
         app = create_app(
-            recipe_configuration_path, "http://%s:%d" % (args.ip, args.port), debug=args.debug, logger=logger
+            recipe_configuration_path,
+            "http://%s:%d" % (args.ip, args.port),
+            debug=args.debug,
+            logger=logger,
+            rebuild_progress=args.rebuild_progress,
         )
 
     if args.debug:
@@ -1,9 +1,17 @@
 # Python
-from typing import Callable
+from typing import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+import glob
+import hashlib
 import os
 import shutil
+import threading
+import time
 from pathlib import Path
 
+# Data
+import numpy as np
+
 # Flask related
 from werkzeug import Response
 from flask import current_app
@@ -141,3 +149,179 @@ class AppSingleton(type):
                 *args, **kwargs
             )
         return current_app._appsingleton_instances[cls]  # type: ignore
+
+
+class InstrumentedLock:
+    """Re-entrant lock keeping track of how much it is contended
+
+    Attributes
+    ----------
+    nb_acquisitions: int
+        The number of times the lock has been acquired
+    nb_contentions: int
+        The number of times the lock was already held when trying to acquire it
+    wait_time: float
+        The total time (in seconds) spent waiting for the lock
+    max_wait_time: float
+        The longest time (in seconds) spent waiting for the lock
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.nb_acquisitions: int = 0
+        self.nb_contentions: int = 0
+        self.wait_time: float = 0.0
+        self.max_wait_time: float = 0.0
+
+    def acquire(self) -> None:
+        """Acquire the lock and update the contention counters"""
+        if not self._lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self._lock.acquire()
+            wait_time = time.perf_counter() - start
+            self.nb_contentions += 1
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.nb_acquisitions += 1
+
+    def release(self) -> None:
+        """Release the lock"""
+        self._lock.release()
+
+    def __enter__(self) -> "InstrumentedLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.release()
+
+    def statistics(self) -> dict[str, float]:
+        """Get the contention counters of the lock
+
+        Returns
+        -------
+        dict[str, float]
+            The number of acquisitions, of contentions and the total and longest waiting times in seconds
+        """
+        return {
+            "nb_acquisitions": self.nb_acquisitions,
+            "nb_contentions": self.nb_contentions,
+            "wait_time": self.wait_time,
+            "max_wait_time": self.max_wait_time,
+        }
+
+
+# Prefix of the shared memory segments created by replikant
+SHARED_MEMORY_PREFIX: str = "rk_"
+
+
+def shared_memory_name(instance_id: str, *keys: str) -> str:
+    """Generate the name of a shared memory segment
+
+    The name is short enough to be accepted by all the platforms and
+    is only shared by the processes of the same replikant instance.
+
+    Parameters
+    ----------
+    instance_id : str
+        The ID of the replikant instance (generated when the application is created)
+    keys : str
+        The keys identifying the segment in the instance
+
+    Returns
+    -------
+    str
+        The name of the segment
+    """
+    digest = hashlib.sha1("/".join(keys).encode()).hexdigest()[:16]
+    return f"{SHARED_MEMORY_PREFIX}{instance_id}_{digest}"
+
+
+def release_shared_memory(instance_id: str) -> None:
+    """Unlink all the shared memory segments of a given replikant instance
+
+    Parameters
+    ----------
+    instance_id : str
+        The ID of the replikant instance
+    """
+    # NOTE: imported here as the shared memory is only needed by the shared counters (and not on all platforms)
+    from multiprocessing.shared_memory import SharedMemory
+
+    for path in glob.glob(f"/dev/shm/{SHARED_MEMORY_PREFIX}{instance_id}_*"):
+        try:
+            segment = SharedMemory(name=os.path.basename(path))
+        except FileNotFoundError:
+            continue
+        segment.close()
+        segment.unlink()
+
+
+class SharedArray:
+    """Integer array stored in a shared memory segment
+
+    The first process creates the segment (initialised to 0), the other
+    ones attach to it. The segment outlives the processes using it and
+    should be released by release_shared_memory when the instance stops.
+
+    The creation of a segment and its sizing are two system calls, so a
+    process attaching in between would see an empty segment: the lock
+    shared by the processes is held during the creation and the attachment.
+    """
+
+    def __init__(self, name: str, size: int, lock: "FileLock | None" = None):
+        """Initialisation
+
+        Parameters
+        ----------
+        name : str
+            The name of the segment (see shared_memory_name)
+        size : int
+            The number of elements of the array
+        lock : FileLock | None
+            The lock shared by the processes using the segment (None if only one process uses it)
+        """
+        from multiprocessing.shared_memory import SharedMemory
+
+        nbytes = max(size, 1) * np.dtype(np.int64).itemsize
+        with lock.hold() if lock is not None else nullcontext():
+            try:
+                self._segment = SharedMemory(name=name, create=True, size=nbytes)
+            except FileExistsError:
+                self._segment = SharedMemory(name=name)
+
+        if self._segment.size < nbytes:
+            raise ValueError(f"The shared memory segment {name} is smaller than expected")
+        self.array: np.ndarray = np.ndarray((size,), dtype=np.int64, buffer=self._segment.buf)
+
+
+class FileLock:
+    """Lock shared by the processes of a machine based on a file lock (flock)
+
+    The lock is also guarded by a thread lock as flock doesn't exclude the threads of a process.
+    """
+
+    def __init__(self, path: str):
+        """Initialisation
+
+        Parameters
+        ----------
+        path : str
+            The path of the lock file
+        """
+        self._path = path
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        """Hold the lock during the context"""
+        # NOTE: imported here as flock is only available on POSIX platforms
+        import fcntl
+
+        with self._thread_lock:
+            with open(self._path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,148 @@
+"""Configuration of the tests
+
+The models of replikant are only defined once a recipe is loaded, so the application of a minimal recipe (a login
+activity and the files of two systems) is created and its context pushed when the session starts, before the test
+modules are imported.
+"""
+
+from types import SimpleNamespace
+import itertools
+import logging
+import pathlib
+import random
+import shutil
+import tempfile
+
+import pytest
+import yaml
+from flask import Flask
+
+RECIPE = {
+    "variables": {},
+    "entrypoint": "login",
+    "admin": {"entrypoint": "panel", "units": {"panel": {"password": "test"}}},
+    "activities": {"login": {"type": "prolific_auth", "template": "login.tpl"}},
+}
+
+# The systems available to the tasks created by make_task
+SYSTEMS = ["S0", "S1"]
+NB_SAMPLES = 6
+
+_session: dict = dict()
+_task_ids = itertools.count()
+
+
+def pytest_sessionstart(session):
+    from replikant.main import create_app
+
+    directory = pathlib.Path(tempfile.mkdtemp(prefix="replikant_test_"))
+    for subdirectory in ["templates", "assets", "systems"]:
+        (directory / subdirectory).mkdir()
+    for system_name in SYSTEMS:
+        lines = ["audio,speaker"] + [f"{system_name}/{line_id}.wav,spk{line_id % 3}" for line_id in range(NB_SAMPLES)]
+        (directory / "systems" / f"{system_name}.csv").write_text("\n".join(lines) + "\n")
+    (directory / "recipe.yaml").write_text(yaml.safe_dump(RECIPE))
+
+    app = create_app(directory / "recipe.yaml", "http://localhost", False, logging.getLogger("test"))
+    _session["directory"] = directory
+    _session["context"] = app.app_context()
+    _session["context"].push()
+
+    # NOTE: the recipe doesn't have any task, so the tables of the task models are created here
+    from replikant.activities.task import model  # noqa: F401
+    from replikant.database import db
+
+    db.create_all()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if "context" in _session:
+        _session["context"].pop()
+    if "directory" in _session:
+        shutil.rmtree(_session["directory"], ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    """Make the random tie breaking of the strategies deterministic"""
+    random.seed(0)
+
+
+@pytest.fixture
+def make_database_app(tmp_path):
+    """Factory of applications having their own SQLite database and database profile"""
+    from replikant.database import db, init_database
+
+    apps = []
+
+    def make(db_config: dict | None = None) -> Flask:
+        app = Flask(f"test_{len(apps)}")
+        init_database(app, {"uri": f"sqlite:///{tmp_path / f'test_{len(apps)}.db'}", **(db_config or dict())})
+        apps.append(app)
+        return app
+
+    yield make
+
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def make_task():
+    """Factory of tasks (each one with its own tables) using the systems of the test recipe"""
+    from replikant.activities.task.src.task import Task
+
+    def make(**config):
+        name = f"task{next(_task_ids)}"
+        systems = [{"name": system_name, "data": f"{system_name}.csv"} for system_name in SYSTEMS]
+        return Task(name, {"systems": systems, "nb_steps": 3, **config})
+
+    return make
+
+
+def make_systems(nb_systems: int, nb_samples: int, **columns: list[str]) -> dict:
+    """Generate lightweight systems (only providing what the strategies need)
+
+    Parameters
+    ----------
+    nb_systems : int
+        The number of systems
+    nb_samples : int
+        The number of samples of each system
+    columns : list[str]
+        The values of the metadata columns, the sample i taking the value i modulo the number of values
+
+    Returns
+    -------
+    dict
+        The systems indexed by their names (the IDs of the samples are unique across the systems)
+    """
+    systems = dict()
+    for index in range(nb_systems):
+        samples = [
+            SimpleNamespace(
+                id=index * nb_samples + line_id,
+                **dict([(column, values[line_id % len(values)]) for column, values in columns.items()]),
+            )
+            for line_id in range(nb_samples)
+        ]
+        systems[f"S{index}"] = SimpleNamespace(name=f"S{index}", samples=samples, col_names=["audio"] + list(columns))
+
+    return systems
+
+
+def make_user(user_id: str) -> SimpleNamespace:
+    """Generate a lightweight participant
+
+    Parameters
+    ----------
+    user_id : str
+        The ID of the participant
+
+    Returns
+    -------
+    SimpleNamespace
+        The participant
+    """
+    return SimpleNamespace(id=user_id, user_id=user_id)
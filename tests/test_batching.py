@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from conftest import make_systems, make_user
+from replikant.activities.task.src.selection_strategy.least_seen import LeastSeenSelection
+
+NB_REQUESTS = 8
+
+
+class FailingSelection(LeastSeenSelection):
+    def _select_samples(self, user, id_step, nb_systems, nb_samples):
+        raise Exception("selection failed")
+
+
+def select_concurrently(strategy, nb_requests: int) -> list:
+    """Submit concurrent selections of one sample and get their result (or error)"""
+    results: list = [None] * nb_requests
+
+    def select(index: int) -> None:
+        try:
+            results[index] = strategy.select_samples(make_user(f"p{index}"), 0, 1, 1)
+        except Exception as ex:
+            results[index] = ex
+
+    threads = [threading.Thread(target=select, args=(index,)) for index in range(nb_requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def test_dispatch_processes_batch_in_one_critical_section():
+    # NOTE: the window is long enough for the batch to be closed because it is full
+    strategy = LeastSeenSelection(
+        make_systems(1, NB_REQUESTS), persistent=False, batch_window_ms=10_000, batch_size=NB_REQUESTS
+    )
+    results = select_concurrently(strategy, NB_REQUESTS)
+
+    assert strategy._lock.nb_acquisitions == 1
+    assert all([list(result.keys()) == ["S0"] and len(result["S0"]) == 1 for result in results])
+
+    # Each request knows the selections of the previous ones of the batch
+    assert len(set([result["S0"][0].id for result in results])) == NB_REQUESTS
+    assert strategy._pending_requests == []
+
+
+def test_dispatch_closes_batch_after_window():
+    strategy = LeastSeenSelection(make_systems(1, 4), persistent=False, batch_window_ms=10, batch_size=64)
+    result = strategy.select_samples(make_user("p0"), 0, 1, 2)
+
+    assert len(result["S0"]) == 2
+    assert strategy._lock.nb_acquisitions == 1
+    assert not strategy._batch_full.is_set()
+
+
+def test_dispatch_propagates_error_to_batch():
+    strategy = FailingSelection(
+        make_systems(1, NB_REQUESTS), persistent=False, batch_window_ms=10_000, batch_size=NB_REQUESTS
+    )
+    results = select_concurrently(strategy, NB_REQUESTS)
+
+    assert all([isinstance(result, Exception) and str(result) == "selection failed" for result in results])
+    assert strategy._pending_requests == []
+
+
+def test_select_without_window_bypasses_dispatch():
+    strategy = LeastSeenSelection(make_systems(1, 4), persistent=False)
+    steps = strategy.select_steps(make_user("p0"), 0, 4, 1, 1)
+
+    assert strategy._lock.nb_acquisitions == 1
+    assert sorted([step["S0"][0].id for step in steps]) == [0, 1, 2, 3]
+
+
+def test_failed_request_raises_error():
+    strategy = FailingSelection(make_systems(1, 4), persistent=False)
+    with pytest.raises(Exception, match="selection failed"):
+        strategy.select_samples(make_user("p0"), 0, 1, 1)
@@ -0,0 +1,85 @@
+import numpy as np
+
+from replikant.activities.task.src.selection_strategy.counters import DeficitHeap, least_indexes
+
+
+def test_least_indexes_takes_lowest_counts():
+    counts = np.array([3, 1, 2, 1, 0])
+
+    assert least_indexes(counts, 1) == [4]
+    assert sorted(least_indexes(counts, 3)) == [1, 3, 4]
+    assert sorted(least_indexes(counts, 4)) == [1, 2, 3, 4]
+
+
+def test_least_indexes_breaks_ties_randomly():
+    counts = np.array([3, 1, 2, 1, 0])
+    selections = [tuple(sorted(least_indexes(counts, 2))) for _ in range(50)]
+
+    assert set(selections) == {(1, 4), (3, 4)}
+
+
+def test_least_indexes_restricted_to_available():
+    counts = np.array([3, 1, 2, 1, 0])
+    available = np.array([True, False, True, True, False])
+
+    assert least_indexes(counts, 1, available) == [3]
+    assert sorted(least_indexes(counts, -1, available)) == [0, 2, 3]
+    assert sorted(least_indexes(counts, 10, available)) == [0, 2, 3]
+
+    # The mask of the caller is not modified
+    assert available.tolist() == [True, False, True, True, False]
+
+
+def test_deficit_heap_takes_largest_deficits():
+    heap = DeficitHeap({"a": 3, "b": 2, "c": 1})
+
+    assert len(heap) == 3
+    assert heap.largest(1) == ["a"]
+    assert sorted(heap.largest(2)) == ["a", "b"]
+    assert sorted(heap.largest(-1)) == ["a", "b", "c"]
+
+    # The selection doesn't modify the queue
+    assert sorted(heap.largest(5)) == ["a", "b", "c"]
+
+
+def test_deficit_heap_invalidates_outdated_entries():
+    heap = DeficitHeap({"a": 3, "b": 2, "c": 1})
+
+    # The entry of "a" with a deficit of 3 is outdated and ignored when it reaches the top
+    assert heap.increment("a", 2) == 1
+    assert heap.largest(1) == ["b"]
+    # NOTE: the ties are broken by a random key drawn when the entries are pushed
+    assert sorted(heap.largest(2)) in [["a", "b"], ["b", "c"]]
+    assert sorted(heap.largest(3)) == ["a", "b", "c"]
+
+
+def test_deficit_heap_drops_met_items():
+    heap = DeficitHeap({"a": 2, "b": 1})
+
+    assert heap.increment("b") == 0
+    assert len(heap) == 1
+    assert heap.largest(-1) == ["a"]
+    assert heap.largest(2) == ["a"]
+
+    # Exceeding the target keeps the item out of the queue, releasing it puts it back
+    assert heap.increment("b") == -1
+    assert heap.largest(-1) == ["a"]
+    assert heap.increment("b", -2) == 1
+    assert len(heap) == 2
+    assert sorted(heap.largest(-1)) == ["a", "b"]
+    assert dict(heap.items()) == {"a": 2, "b": 1}
+
+
+def test_deficit_heap_rebuilds_when_outdated_entries_accumulate():
+    targets = dict([(item, 1000) for item in range(4)])
+    heap = DeficitHeap(targets)
+    for step in range(400):
+        heap.increment(step % 4)
+        assert len(heap._heap) <= 2 * len(targets) + 16
+
+    assert [heap[item] for item in range(4)] == [900] * 4
+    assert sorted(heap.largest(-1)) == [0, 1, 2, 3]
+
+    # The rebuild only keeps the valid entries
+    heap._rebuild()
+    assert len(heap._heap) == 4
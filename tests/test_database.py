@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import text
+
+from replikant.database import DataBaseError, db
+
+
+def connection_pragmas(conn) -> dict:
+    return dict(
+        [
+            (pragma, conn.execute(text(f"PRAGMA {pragma}")).scalar())
+            for pragma in ["journal_mode", "synchronous", "busy_timeout"]
+        ]
+    )
+
+
+def test_pragmas_applied_on_first_pooled_connection(make_database_app):
+    # NOTE: with a single pooled connection, it is the one opened to load the schema catalog
+    app = make_database_app({"pool_size": 1, "max_overflow": 0})
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert connection_pragmas(conn) == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000}
+
+
+def test_profile_overrides_pragmas_and_pool(make_database_app):
+    app = make_database_app({"synchronous": "FULL", "busy_timeout": 100, "cache_size": -2000, "pool_size": 2})
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert connection_pragmas(conn) == {"journal_mode": "wal", "synchronous": 2, "busy_timeout": 100}
+            assert conn.execute(text("PRAGMA cache_size")).scalar() == -2000
+        assert db.engine.pool.size() == 2
+
+    # The read-only connections of the administration wait as long as the others
+    assert app.config["REPLIKANT_DB_READ"]["pragmas"] == {"busy_timeout": 100, "query_only": 1}
+
+
+@pytest.mark.parametrize("db_config", [{"synchronous": "OFF; DROP TABLE Sample"}, {"storage": "columnar"}])
+def test_invalid_profile_is_rejected(make_database_app, db_config):
+    with pytest.raises(DataBaseError):
+        make_database_app(db_config)
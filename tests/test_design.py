@@ -0,0 +1,75 @@
+import itertools
+import threading
+
+import pytest
+from flask import current_app
+
+from conftest import NB_SAMPLES, SYSTEMS, make_user
+from replikant.activities.task.model import DesignClaim
+from replikant.activities.task.src.task import TaskError
+
+
+def test_build_design_rejects_precomputed_strategies(make_task):
+    task = make_task(selection_strategy="PrecomputedSelection")
+    for strategy_name in ["PrecomputedSelection", "LatinSquareSelection"]:
+        with pytest.raises(TaskError, match="precomputed strategy"):
+            task.build_design(4, strategy_name)
+
+
+def test_build_design_of_precomputed_task(make_task):
+    task = make_task(selection_strategy="PrecomputedSelection", nb_systems_per_step=-1)
+
+    # The design of a precomputed task is built with LeastSeenSelection (one sample per system at each step)
+    assert task.build_design(4) == 4 * 3 * len(SYSTEMS)
+    assert task.selection_strategy.nb_slots == 4
+    assert DesignClaim.nb_claims(task.name) == 0
+
+
+def test_build_design_with_strategy_kwargs(make_task):
+    task = make_task(selection_strategy={"name": "QuotaSelection", "kwargs": {"targets": 100}})
+
+    # The kwargs of the task are used, the given ones override them
+    assert task.build_design(2) == 2 * 3
+    with pytest.raises(Exception, match="not a valid quota level"):
+        task.build_design(2, strategy_kwargs={"level": "unknown"}, force=True)
+    assert task.build_design(2, "QuotaSelection", {"targets": NB_SAMPLES}) == 2 * 3
+
+
+def step_ids(steps: list[dict]) -> list[list[int]]:
+    return [sorted([sample.id for samples in step.values() for sample in samples]) for step in steps]
+
+
+def test_claim_keeps_slot_of_participant():
+    assert [DesignClaim.claim("claims0", user_id) for user_id in ["p0", "p1", "p0", "p2"]] == [0, 1, 0, 2]
+    assert DesignClaim.nb_claims("claims0") == 3
+
+
+def test_concurrent_claims_get_distinct_slots():
+    app = current_app._get_current_object()
+    slots: list = [None] * 8
+
+    def claim(index: int) -> None:
+        with app.app_context():
+            slots[index] = DesignClaim.claim("claims1", f"p{index}")
+
+    threads = [threading.Thread(target=claim, args=(index,)) for index in range(len(slots))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(slots) == list(range(len(slots)))
+
+
+def test_participants_follow_their_slot(make_task):
+    task = make_task(selection_strategy="PrecomputedSelection", nb_systems_per_step=-1)
+    task.build_design(2)
+
+    strategy = task.selection_strategy
+    steps = [step_ids(strategy.select_steps(make_user(f"p{index}"), 0, 3, -1, 1)) for index in range(3)]
+
+    # Each step provides one sample of every system, the third participant reuses the first slot
+    assert all([len(step) == len(SYSTEMS) for step in itertools.chain(*steps)])
+    assert steps[0] != steps[1]
+    assert steps[2] == steps[0]
+    assert DesignClaim.nb_claims(task.name) == 3
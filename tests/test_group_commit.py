@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+from flask import current_app
+from sqlalchemy import text
+
+from replikant.database import GroupCommitWriter, db
+
+INTERVAL_MS = 2000
+
+
+@pytest.fixture
+def writer():
+    current_app.config["REPLIKANT_GROUP_COMMIT"] = {"interval_ms": INTERVAL_MS, "max_rows": 500}
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS GroupCommitTest (value INTEGER)"))
+        conn.execute(text("DELETE FROM GroupCommitTest"))
+
+    writer = GroupCommitWriter()
+    groups: list[int] = []
+    commit = writer._commit
+
+    def record_group(group):
+        groups.append(len(group))
+        commit(group)
+
+    writer._commit = record_group
+    writer.groups = groups
+    yield writer
+
+    writer.flush()
+    del current_app.config["REPLIKANT_GROUP_COMMIT"]
+    current_app._appsingleton_instances.pop(GroupCommitWriter)
+
+
+def insert_value(value: int):
+    return lambda conn: conn.execute(text("INSERT INTO GroupCommitTest (value) VALUES (:value)"), {"value": value})
+
+
+def committed_values() -> list[int]:
+    with db.engine.connect() as conn:
+        return sorted([row[0] for row in conn.execute(text("SELECT value FROM GroupCommitTest"))])
+
+
+def test_single_waiter_is_not_delayed_by_interval(writer):
+    start = time.monotonic()
+    writer.submit(insert_value(1), wait=True)
+
+    assert time.monotonic() - start < INTERVAL_MS / 1000 / 4
+    assert committed_values() == [1]
+
+
+def test_pending_operations_committed_with_waiter(writer):
+    # The operations nobody waits for are gathered until a waiter arrives
+    for value in range(3):
+        writer.submit(insert_value(value), wait=False)
+    start = time.monotonic()
+    writer.submit(insert_value(3), wait=True)
+
+    assert time.monotonic() - start < INTERVAL_MS / 1000 / 4
+    assert writer.groups == [4]
+    assert committed_values() == [0, 1, 2, 3]
+
+
+def test_concurrent_waiters_are_committed(writer):
+    threads = [threading.Thread(target=writer.submit, args=(insert_value(value),)) for value in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert committed_values() == list(range(16))
+    assert sum(writer.groups) == 16
+
+
+def test_failing_operation_only_fails_its_job(writer):
+    def fail(conn):
+        raise Exception("operation failed")
+
+    jobs = [writer.submit(insert_value(0), wait=False), writer.submit(fail, wait=False)]
+    writer.submit(insert_value(1), wait=True)
+
+    assert jobs[0].error is None
+    assert str(jobs[1].error) == "operation failed"
+    assert committed_values() == [0, 1]
@@ -0,0 +1,102 @@
+import itertools
+import threading
+import time
+
+import pytest
+from flask import current_app
+from sqlalchemy import select, text
+
+from conftest import make_systems, make_user
+from replikant.activities.task.model import SelectionEvent
+from replikant.activities.task.src.selection_strategy.least_seen import LeastSeenSelection
+from replikant.database import db, exclusive_transaction
+
+_journal_ids = itertools.count()
+
+
+def sample_counts(strategy: LeastSeenSelection) -> dict[int, int]:
+    """Get the count of each sample of the (single) system of a strategy"""
+    return dict(strategy._sample_counters["S0"].items())
+
+
+def select_sample(strategy: LeastSeenSelection, user_id: str) -> int:
+    return strategy.select_samples(make_user(user_id), 0, 1, 1)["S0"][0].id
+
+
+@pytest.fixture
+def make_strategy():
+    """Factory of persistent strategies (i.e., processes) sharing the journal of one task"""
+    task = f"journal{next(_journal_ids)}"
+    systems = make_systems(1, 4)
+    return lambda: LeastSeenSelection(systems, task=task, persistent=True)
+
+
+def test_processes_share_balance_through_journal(make_strategy):
+    first, second = make_strategy(), make_strategy()
+
+    # Each process replays the selections of the other one before selecting
+    samples = [select_sample(first, "p0"), select_sample(second, "p1"), select_sample(first, "p2")]
+    assert len(set(samples)) == 3
+
+    second._journal.sync(second._apply_event)
+    assert sample_counts(first) == sample_counts(second)
+    assert sorted(sample_counts(first).values()) == [0, 1, 1, 1]
+
+
+def test_restart_replays_journal_from_watermark(make_strategy):
+    strategy = make_strategy()
+    samples = [select_sample(strategy, f"p{index}") for index in range(3)]
+    strategy.release_samples("p0", {"S0": [strategy.systems["S0"].samples[samples[0]]]})
+
+    # A restarted process loads the whole journal (the released sample is balanced by its negative event)
+    restarted = make_strategy()
+    assert restarted._journal.sync(restarted._apply_event) == 2
+    assert sample_counts(restarted) == sample_counts(strategy)
+    last_id = db.session.execute(select(SelectionEvent.id).order_by(SelectionEvent.id.desc()).limit(1)).scalar()
+    assert restarted._journal._watermark == last_id
+
+    # ... then only the events after its watermark
+    select_sample(strategy, "p3")
+    assert restarted._journal.sync(restarted._apply_event) == 1
+    assert sample_counts(restarted) == sample_counts(strategy)
+
+
+def test_exclusive_transactions_are_serialized():
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS ExclusiveTest (value INTEGER)"))
+        conn.execute(text("DELETE FROM ExclusiveTest"))
+
+    app = current_app._get_current_object()
+    entered = threading.Event()
+    seen: list[int] = []
+
+    def write_slowly():
+        with app.app_context(), exclusive_transaction() as conn:
+            entered.set()
+            time.sleep(0.2)
+            conn.execute(text("INSERT INTO ExclusiveTest (value) VALUES (1)"))
+
+    thread = threading.Thread(target=write_slowly)
+    thread.start()
+    assert entered.wait(timeout=5)
+
+    # The second transaction only starts once the first one is committed, so it sees its write
+    with exclusive_transaction() as conn:
+        seen += conn.execute(text("SELECT value FROM ExclusiveTest")).scalars().all()
+    thread.join()
+
+    assert seen == [1]
+
+
+def test_exclusive_transaction_rolled_back_on_error():
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS ExclusiveTest (value INTEGER)"))
+        conn.execute(text("DELETE FROM ExclusiveTest"))
+
+    with pytest.raises(Exception, match="failed"):
+        with exclusive_transaction() as conn:
+            conn.execute(text("INSERT INTO ExclusiveTest (value) VALUES (1)"))
+            raise Exception("failed")
+
+    with db.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM ExclusiveTest")).scalar() == 0
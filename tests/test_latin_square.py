@@ -0,0 +1,47 @@
+import itertools
+
+import pytest
+
+from conftest import NB_SAMPLES, SYSTEMS, make_user
+from replikant.activities.task.src.selection_strategy.latin_square import williams_latin_square
+
+
+@pytest.mark.parametrize("size", [2, 4, 6])
+def test_williams_latin_square_balances_carryover(size):
+    square = williams_latin_square(size)
+
+    # Each system appears once per row and per column
+    assert all([sorted(row) == list(range(size)) for row in square.tolist()])
+    assert all([sorted(column) == list(range(size)) for column in square.T.tolist()])
+
+    # ... and (even size) each system follows each other system exactly once
+    pairs = [(row[index], row[index + 1]) for row in square.tolist() for index in range(size - 1)]
+    assert sorted(pairs) == [pair for pair in itertools.permutations(range(size), 2)]
+
+
+def test_groups_assigned_in_turn(make_task):
+    task = make_task(selection_strategy="LatinSquareSelection")
+    strategy = task.selection_strategy
+    assert strategy.nb_slots == len(SYSTEMS)
+
+    steps = dict()
+    for index in range(3):
+        selections = strategy.select_steps(make_user(f"p{index}"), 0, NB_SAMPLES, 1, 1)
+        steps[index] = [(system_name, samples[0].id) for step in selections for system_name, samples in step.items()]
+
+    # The participant of the third group reuses the first group (the design is cyclic)
+    assert steps[2] == steps[0]
+
+    # In each group, the step j is the utterance j, and the two groups evaluate every utterance with both systems
+    for group in [0, 1]:
+        sample_ids = dict([(name, [sample.id for sample in task.systems[name].samples]) for name in SYSTEMS])
+        utt_ids = [sample_ids[system_name].index(sample_id) for system_name, sample_id in steps[group]]
+        assert utt_ids == list(range(NB_SAMPLES))
+    assert all([first[0] != second[0] for first, second in zip(steps[0], steps[1])])
+
+
+def test_groups_built_once(make_task):
+    task = make_task(selection_strategy="LatinSquareSelection")
+
+    # Another process (or a restart) reuses the stored groups
+    assert task.selection_strategy.build_groups() == 0
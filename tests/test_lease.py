@@ -0,0 +1,62 @@
+from conftest import make_user
+
+
+def nb_selections(task) -> int:
+    """Count the selections of all the samples of a task"""
+    counters = task._selection_strategy._sample_counters
+    return sum([count for system_counters in counters.values() for _, count in system_counters.items()])
+
+
+def step_sample_ids(step: dict) -> list[int]:
+    """Get the IDs of the samples of a step"""
+    return [sample._sample.id for sample in step.values()]
+
+
+def test_expired_lease_released_then_renewed(make_task):
+    task = make_task()
+    user = make_user("p0")
+
+    task.set_timeout_for_transaction(0)
+    step = task.get_step(0, user, 1)
+    assert nb_selections(task) == 1
+
+    # The samples are released when the lease expires, the transaction is kept for the grace period
+    task.set_timeout_for_transaction(3600)
+    assert task.expire_transactions() == 1
+    assert task.has_transaction(user)
+    assert nb_selections(task) == 0
+
+    # The participant coming back during the grace period gets the same step and the samples are acquired again
+    assert step_sample_ids(task.get_step(0, user, 1)) == step_sample_ids(step)
+    assert nb_selections(task) == 1
+    assert task.expire_transactions() == 0
+
+
+def test_abandoned_step_dropped_after_grace_period(make_task):
+    task = make_task()
+    user = make_user("p0")
+
+    task.set_timeout_for_transaction(0)
+    task.get_step(0, user, 1)
+    assert task.expire_transactions() == 1
+    assert task.expire_transactions() == 1
+    assert not task.has_transaction(user)
+
+    # The samples stay released, so they are counted again only when selected for another participant
+    assert nb_selections(task) == 0
+    task.set_timeout_for_transaction(3600)
+    task.get_step(0, make_user("p1"), 1)
+    assert nb_selections(task) == 1
+
+
+def test_saved_step_not_released(make_task):
+    task = make_task()
+    user = make_user("p0")
+
+    task.set_timeout_for_transaction(0)
+    task.get_step(0, user, 1)
+    task.delete_transaction(user)
+
+    # The deadline of the deleted transaction is skipped
+    assert task.expire_transactions() == 0
+    assert nb_selections(task) == 1
@@ -0,0 +1,66 @@
+from conftest import make_systems
+from replikant.activities.task.src.selection_strategy.least_seen import StratifiedLeastSeenSelection
+
+
+def make_strategy(nb_samples: int, speakers: list[str]) -> StratifiedLeastSeenSelection:
+    """Create a stratified strategy on one system whose sample i is spoken by speakers[i % len(speakers)]"""
+    systems = make_systems(1, nb_samples, speaker=speakers)
+    return StratifiedLeastSeenSelection(systems, strata="speaker", persistent=False)
+
+
+def see_stratum(strategy: StratifiedLeastSeenSelection, speaker: str) -> None:
+    """Count once all the samples of a stratum"""
+    for sample in strategy.systems["S0"].samples:
+        if sample.speaker == speaker:
+            strategy._apply_global_event("S0", sample.id, 1)
+
+
+def test_stratum_quotas_rounds_to_least_seen_strata():
+    strategy = make_strategy(12, ["spk0", "spk1", "spk2", "spk3"])
+
+    # The remaining samples of the partial round are spread over distinct strata
+    quotas = strategy._stratum_quotas("S0", 6)
+    assert sum(quotas.values()) == 6
+    assert sorted(quotas.values()) == [1, 1, 2, 2]
+
+    # ... which are the least seen ones
+    see_stratum(strategy, "spk0")
+    see_stratum(strategy, "spk1")
+    quotas = strategy._stratum_quotas("S0", 6)
+    assert quotas == {("spk0",): 1, ("spk1",): 1, ("spk2",): 2, ("spk3",): 2}
+
+    # Complete rounds are spread evenly
+    assert set(strategy._stratum_quotas("S0", 8).values()) == {2}
+
+
+def test_stratum_quotas_redistributes_overflow():
+    # The stratum "b" only has 2 samples
+    strategy = make_strategy(8, ["a", "a", "a", "b"])
+    assert strategy._stratum_quotas("S0", 6) == {("a",): 4, ("b",): 2}
+
+
+def test_stratum_quotas_redistributes_overflow_to_least_seen_strata():
+    # The stratum "z" only has 2 samples, "y" has been seen more than "x"
+    strategy = make_strategy(10, ["x", "y", "x", "y", "z"])
+    see_stratum(strategy, "y")
+
+    assert strategy._stratum_quotas("S0", 9) == {("x",): 4, ("y",): 3, ("z",): 2}
+    assert strategy._stratum_quotas("S0", 10) == {("x",): 4, ("y",): 4, ("z",): 2}
+
+
+def test_select_samples_balanced_over_strata():
+    strategy = make_strategy(12, ["spk0", "spk1", "spk2", "spk3"])
+
+    samples = strategy.internal_select_samples("S0", 4)
+    assert sorted([sample.speaker for sample in samples]) == ["spk0", "spk1", "spk2", "spk3"]
+
+    samples = strategy.internal_select_samples("S0", -1)
+    assert sorted([sample.id for sample in samples]) == list(range(12))
+
+
+def test_stratum_quotas_only_returns_least_seen_strata():
+    strategy = make_strategy(60, [f"spk{index}" for index in range(30)])
+    for index in range(2, 30):
+        see_stratum(strategy, f"spk{index}")
+
+    assert strategy._stratum_quotas("S0", 2) == {("spk0",): 1, ("spk1",): 1}
@@ -0,0 +1,52 @@
+import numpy as np
+
+from conftest import make_systems, make_user
+from replikant.activities.task.src.selection_strategy.least_seen import LeastSeenPerUserSelection
+
+NB_SYSTEMS = 3
+NB_SAMPLES = 8
+NB_USERS = 20
+
+
+def test_simulated_users_see_balanced_unseen_samples():
+    strategy = LeastSeenPerUserSelection(make_systems(NB_SYSTEMS, NB_SAMPLES), persistent=False)
+    histories: dict[str, list[int]] = dict([(f"p{index}", []) for index in range(NB_USERS)])
+    system_counts = dict([(user_id, dict([(f"S{index}", 0) for index in range(NB_SYSTEMS)])) for user_id in histories])
+
+    # The users are interleaved until each of them has seen all the samples
+    for id_step in range(NB_SYSTEMS * NB_SAMPLES):
+        for user_id, history in histories.items():
+            # The sample counters before the selection (i.e., what the previous sorted dictionaries were built from)
+            counts = dict([(name, counters.counts.copy()) for name, counters in strategy._sample_counters.items()])
+            selection = strategy.select_samples(make_user(user_id), id_step, 1, 1)
+            ((system_name, (sample,)),) = selection.items()
+
+            # Like the previous implementation, the least seen sample among the ones not seen by the user is selected
+            index = sample.id - int(system_name[1:]) * NB_SAMPLES
+            unseen = [
+                other.id - int(system_name[1:]) * NB_SAMPLES
+                for other in strategy.systems[system_name].samples
+                if other.id not in history
+            ]
+            assert counts[system_name][index] == np.min(counts[system_name][unseen])
+
+            history.append(sample.id)
+            system_counts[user_id][system_name] += 1
+            assert max(system_counts[user_id].values()) - min(system_counts[user_id].values()) <= 1
+
+    # No sample is seen twice by a user before the pool is exhausted
+    for history in histories.values():
+        assert sorted(history) == list(range(NB_SYSTEMS * NB_SAMPLES))
+
+    # ... and every sample has been seen by each user once
+    for counters in strategy._sample_counters.values():
+        assert set(counters.counts.tolist()) == {NB_USERS}
+
+
+def test_exhausted_user_pool_starts_again():
+    strategy = LeastSeenPerUserSelection(make_systems(1, 2), persistent=False)
+    user = make_user("p0")
+    seen = [strategy.select_samples(user, id_step, 1, 1)["S0"][0].id for id_step in range(3)]
+
+    assert sorted(seen[:2]) == [0, 1]
+    assert seen[2] in [0, 1]
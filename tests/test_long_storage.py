@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import inspect, select, text
+
+from replikant.database import Column, MalformationError, Model, ModelFactory, create_wide_views, db
+
+
+class RecordModel(Model):
+    __abstract__ = True
+
+    id = Column(db.Integer, primary_key=True)
+    label = Column(db.String)
+
+
+def read_wide_view() -> list[dict]:
+    create_wide_views()
+    with db.engine.connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(text('SELECT * FROM "Record_long_wide" ORDER BY id'))]
+
+
+def test_set_same_field_twice(make_database_app):
+    app = make_database_app({"storage": "long"})
+    with app.app_context():
+        record_cls = ModelFactory().create("long", RecordModel)
+        record = record_cls.create(label="first")
+        record.set_values({"age": 30, "lang": "fr"})
+
+        # Saving the form again overwrites the fields
+        record.set_values({"age": 31})
+        record.set_values({"age": 32, "comment": "ok"})
+
+        assert read_wide_view() == [{"id": record.id, "label": "first", "age": "32", "comment": "ok", "lang": "fr"}]
+
+
+def test_long_storage_keeps_schema(make_database_app):
+    app = make_database_app({"storage": "long"})
+    with app.app_context():
+        record_cls = ModelFactory().create("long", RecordModel)
+        record = record_cls.create(label="first")
+        record.set_values({"age": 30, "audio": b"RIFF"})
+
+        # The fields are rows of the key/value table, not columns of the table
+        assert [column["name"] for column in inspect(db.engine).get_columns("Record_long")] == ["id", "label"]
+        rows = db.session.execute(select(record_cls.values_model()).order_by(text("name"))).scalars().all()
+        assert [(row.name, row.value, row.blob) for row in rows] == [("age", "30", None), ("audio", None, b"RIFF")]
+
+        with pytest.raises(MalformationError):
+            record.set_values({"age; DROP": 1})
+
+
+def test_wide_select_reconstructs_fields(make_database_app):
+    app = make_database_app({"storage": "long"})
+    with app.app_context():
+        record_cls = ModelFactory().create("long", RecordModel)
+        first = record_cls.create(label="first").set_values({"age": 30, "lang": "fr"})
+        second = record_cls.create(label="second").set_values({"lang": "en"})
+
+        query = record_cls.wide_select(["age", "lang"]).order_by(record_cls.id)
+        rows = [tuple(row) for row in db.session.execute(query)]
+        assert rows == [(first.id, "first", "30", "fr"), (second.id, "second", None, "en")]
+
+
+def test_wide_storage_adds_columns(make_database_app):
+    app = make_database_app()
+    with app.app_context():
+        record_cls = ModelFactory().create("wide", RecordModel)
+        record = record_cls.create(label="first").set_values({"age": "30"})
+
+        assert "age" in [column["name"] for column in inspect(db.engine).get_columns("Record_wide")]
+        rows = [tuple(row) for row in db.session.execute(record_cls.wide_select(["age"]))]
+        assert rows == [(record.id, "first", "30")]
@@ -0,0 +1,43 @@
+import pytest
+from flask import current_app
+from sqlalchemy import func, inspect, select
+
+from replikant.database import GroupCommitWriter, db
+
+
+@pytest.fixture
+def writer():
+    writer = GroupCommitWriter()
+    yield writer
+
+    writer.flush()
+    current_app._appsingleton_instances.pop(GroupCommitWriter)
+
+
+def test_events_logged_apart_from_results(make_task, writer):
+    task = make_task()
+    sample_id = task.systems["S0"].samples[0].id
+    rows = [
+        dict(user_id="p0", step_idx=0, sample_id=sample_id, info_type=info_type, info_value="0.5")
+        for info_type in ["play", "pause", "play"]
+    ]
+
+    # Like the monitor endpoint, the events are submitted without waiting for them to be committed
+    for row in rows:
+        writer.submit_rows(task.monitor_model, [row], wait=False)
+    writer.flush()
+
+    events = db.session.execute(select(task.monitor_model).order_by(task.monitor_model.id)).scalars().all()
+    assert [event.info_type for event in events] == ["play", "pause", "play"]
+    assert all([(event.date is not None) and (not event.intro) for event in events])
+
+    # The results of the task are not polluted
+    assert db.session.execute(select(func.count()).select_from(task.model)).scalar() == 0
+
+
+def test_monitor_table_only_has_event_columns(make_task):
+    task = make_task()
+
+    assert task.monitor_model.__tablename__ == f"Monitor_{task.name}"
+    columns = set([column["name"] for column in inspect(db.engine).get_columns(task.monitor_model.__tablename__)])
+    assert columns == {"id", "date", "step_idx", "intro", "sample_id", "info_type", "info_value", "user_id"}
@@ -0,0 +1,49 @@
+from conftest import make_user
+from replikant.activities.task.model import Playlist
+
+
+def nb_selections(task) -> int:
+    """Count the selections of all the samples of a task"""
+    counters = task._selection_strategy._sample_counters
+    return sum([count for system_counters in counters.values() for _, count in system_counters.items()])
+
+
+def step_sample_ids(step: dict) -> list[int]:
+    """Get the IDs of the samples of a step"""
+    return [sample._sample.id for sample in step.values()]
+
+
+def test_playlist_selected_once_and_looked_up(make_task):
+    task = make_task(playlist=True)
+    user = make_user("p0")
+
+    samples = []
+    for id_step in range(3):
+        step = task.get_step(id_step, user, 1)
+        samples.append(step_sample_ids(step))
+        task.delete_transaction(user)
+
+    # The playlist is generated (and counted) when the participant enters the task
+    assert nb_selections(task) == 3
+    assert Playlist.get_steps("p0", task.name) == samples
+    assert len(set([sample_id for step in samples for sample_id in step])) == 3
+
+
+def test_playlist_step_not_released_when_lease_expires(make_task):
+    task = make_task(playlist=True)
+    task.set_timeout_for_transaction(0)
+    user = make_user("p0")
+
+    step = task.get_step(0, user, 1)
+    assert "leased_samples" not in task.get_transaction(user)
+
+    # The samples stay in the playlist, so they stay counted after the lease and the grace period
+    task.expire_transactions()
+    task.expire_transactions()
+    assert not task.has_transaction(user)
+    assert nb_selections(task) == 3
+
+    # ... and the participant gets the same step when coming back
+    resumed = task.get_step(0, user, 1)
+    assert step_sample_ids(resumed) == step_sample_ids(step)
+    assert nb_selections(task) == 3
@@ -0,0 +1,54 @@
+from replikant.activities.task.model import TaskProgress
+from replikant.database import db, write_rows
+
+
+def save_step(task, user_id: str, step_idx: int) -> None:
+    """Save the results of a step like the task activity (the results and the progress in one transaction)"""
+    sample_id = task.systems["S0"].samples[0].id
+    row = dict(
+        user_id=user_id,
+        step_idx=step_idx,
+        sample_id=sample_id,
+        info_type="score",
+        info_value="3",
+        operation_type="record",
+    )
+    write_rows(
+        task.model,
+        [row],
+        wait=True,
+        extra_operation=lambda conn: TaskProgress.record(conn, user_id, task.name, step_idx + 1),
+    )
+
+
+def test_record_matches_rebuild(make_task):
+    task = make_task()
+    for user_id, nb_steps in [("u0", 3), ("u1", 1)]:
+        for step_idx in range(nb_steps):
+            save_step(task, user_id, step_idx)
+
+    # Replaying a step doesn't rewind the progress
+    save_step(task, "u0", 0)
+
+    recorded = dict([(user_id, TaskProgress.get_nb_steps(user_id, task.name)) for user_id in ["u0", "u1", "u2"]])
+    assert recorded == {"u0": 3, "u1": 1, "u2": 0}
+
+    assert task.rebuild_progress() == 2
+    db.session.expire_all()
+    assert dict([(user_id, TaskProgress.get_nb_steps(user_id, task.name)) for user_id in recorded]) == recorded
+
+
+def test_record_upserts_in_one_statement(make_task):
+    task = make_task()
+    statements = []
+    with db.engine.begin() as conn:
+        conn.connection.driver_connection.set_trace_callback(statements.append)
+        try:
+            TaskProgress.record(conn, "u0", task.name, 1)
+            TaskProgress.record(conn, "u0", task.name, 2)
+        finally:
+            conn.connection.driver_connection.set_trace_callback(None)
+
+    assert len([statement for statement in statements if "ON CONFLICT" in statement]) == 2
+    assert not any([statement.startswith("UPDATE") for statement in statements])
+    assert TaskProgress.get_nb_steps("u0", task.name) == 2
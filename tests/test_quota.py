@@ -0,0 +1,38 @@
+import logging
+
+from conftest import make_systems, make_user
+from replikant.activities.task.src.selection_strategy.quota import QuotaSelection
+
+
+def test_quota_stops_selecting_met_samples():
+    strategy = QuotaSelection(make_systems(1, 3), targets=1, persistent=False)
+    steps = strategy.select_steps(make_user("p0"), 0, 3, 1, 1)
+
+    assert sorted([step["S0"][0].id for step in steps]) == [0, 1, 2]
+    assert strategy.is_complete
+
+
+def test_largest_completes_with_least_exceeding_items(caplog):
+    strategy = QuotaSelection(make_systems(1, 3), targets=1, persistent=False)
+    queue = strategy._sample_queues["S0"]
+
+    # Only the sample 2 is still open: the met samples complete the selection, the least exceeding first
+    for sample_id, count in [(0, 3), (1, 1)]:
+        strategy._apply_global_event("S0", sample_id, count)
+    with caplog.at_level(logging.WARNING):
+        selected = strategy._largest(queue, 2)
+    assert selected == [2, 1]
+    assert "The quotas are met" in caplog.text
+
+    # All the quotas are met
+    strategy._apply_global_event("S0", 2, 2)
+    assert strategy._largest(queue, 1) == [1]
+    assert strategy._largest(queue, 3) == [1, 2, 0]
+    assert strategy.is_complete
+
+
+def test_largest_without_met_quotas():
+    strategy = QuotaSelection(make_systems(2, 3), targets={"S0": 2, "S1": 1}, persistent=False)
+
+    assert strategy._largest(strategy._system_queue, 1) == ["S0"]
+    assert sorted(strategy._largest(strategy._sample_queues["S1"], 3)) == [3, 4, 5]
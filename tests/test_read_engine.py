@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from replikant.database import db, read_engine
+
+
+def insert_value(value: int) -> None:
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS ReadTest (value INTEGER)"))
+        conn.execute(text("INSERT INTO ReadTest (value) VALUES (:value)"), {"value": value})
+
+
+def read_values() -> list[int]:
+    with read_engine().connect() as conn:
+        return conn.execute(text("SELECT value FROM ReadTest ORDER BY value")).scalars().all()
+
+
+@pytest.fixture
+def make_read_app(make_database_app, tmp_path):
+    def make(db_config: dict | None = None):
+        app = make_database_app(db_config)
+        app.config["REPLIKANT_RECIPE_TMP_DIR"] = str(tmp_path)
+        return app
+
+    return make
+
+
+def test_read_engine_is_read_only(make_read_app):
+    with make_read_app().app_context():
+        insert_value(0)
+
+        assert read_engine() is not db.engine
+        assert read_values() == [0]
+        with pytest.raises(OperationalError):
+            with read_engine().begin() as conn:
+                conn.execute(text("INSERT INTO ReadTest (value) VALUES (1)"))
+        with read_engine().connect() as conn:
+            assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+
+
+def test_read_engine_reads_snapshot_until_refreshed(make_read_app):
+    with make_read_app({"read_snapshot_interval": 3600}).app_context():
+        insert_value(0)
+        assert read_values() == [0]
+
+        # The snapshot isn't refreshed before the interval is over
+        insert_value(1)
+        assert read_values() == [0]
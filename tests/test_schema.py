@@ -0,0 +1,56 @@
+import threading
+
+from flask import Flask
+from sqlalchemy import event
+
+from replikant.database import Column, Model, ModelFactory, SchemaCatalog, db, table_locks
+
+
+class FormModel(Model):
+    __abstract__ = True
+
+    id = Column(db.Integer, primary_key=True)
+
+
+def add_column_concurrently(app: Flask, model_cls: type[Model], name: str, nb_threads: int) -> list:
+    """Add the same column to a model from several threads and get what each call returned"""
+    columns: list = [None] * nb_threads
+    barrier = threading.Barrier(nb_threads)
+
+    def add_column(index: int) -> None:
+        with app.app_context():
+            barrier.wait()
+            columns[index] = model_cls.addColumn(name, db.String)
+
+    threads = [threading.Thread(target=add_column, args=(index,)) for index in range(nb_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return columns
+
+
+def test_concurrent_add_column_alters_table_once(make_database_app):
+    app = make_database_app()
+    with app.app_context():
+        form_cls = ModelFactory().create("schema", FormModel)
+
+        statements: list[str] = []
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        columns = add_column_concurrently(app, form_cls, "answer", 8)
+
+        assert len([statement for statement in statements if statement.startswith("ALTER TABLE")]) == 1
+        assert all([column is not None for column in columns]) and hasattr(form_cls, "answer")
+        assert SchemaCatalog().has_column(str(form_cls.__tablename__), "answer")
+
+        # The column is known afterwards, so the lock isn't taken anymore
+        nb_acquisitions = table_locks.get(str(form_cls.__tablename__)).nb_acquisitions
+        form_cls.addColumn("answer", db.String)
+        assert table_locks.get(str(form_cls.__tablename__)).nb_acquisitions == nb_acquisitions
+
+
+def test_each_table_has_its_own_lock():
+    assert table_locks.get("TableA") is table_locks.get("TableA")
+    assert table_locks.get("TableA") is not table_locks.get("TableB")
+    assert {"TableA", "TableB"} <= set(table_locks.statistics().keys())
@@ -0,0 +1,31 @@
+import os
+import threading
+from multiprocessing.shared_memory import SharedMemory
+
+from replikant.utils import FileLock, SharedArray
+
+
+def test_concurrent_attachments_share_the_segment(tmp_path):
+    name = f"replikant_test_{os.getpid()}"
+    lock = FileLock(str(tmp_path / "segment.lock"))
+    arrays: list = [None] * 8
+
+    def attach(index: int) -> None:
+        try:
+            arrays[index] = SharedArray(name, 1 << 16, lock)
+        except Exception as ex:
+            arrays[index] = ex
+
+    threads = [threading.Thread(target=attach, args=(index,)) for index in range(len(arrays))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    try:
+        assert all([isinstance(array, SharedArray) for array in arrays])
+        assert all([array.array.sum() == 0 for array in arrays])
+        arrays[0].array[-1] = 3
+        assert all([array.array[-1] == 3 for array in arrays])
+    finally:
+        SharedMemory(name=name).unlink()
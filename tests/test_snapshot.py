@@ -0,0 +1,62 @@
+import os
+import sqlite3
+
+from sqlalchemy import inspect, text
+
+from replikant.database import DatabaseSnapshot, db
+
+
+def insert_value(value: int) -> None:
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS SnapshotTest (value INTEGER)"))
+        conn.execute(text("INSERT INTO SnapshotTest (value) VALUES (:value)"), {"value": value})
+
+
+def snapshot_values(path: str) -> list[int]:
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT value FROM SnapshotTest ORDER BY value")]
+
+
+def test_snapshot_contains_committed_writes(make_database_app, tmp_path):
+    app = make_database_app()
+    with app.app_context():
+        path = str(tmp_path / "snapshot.db")
+        insert_value(0)
+
+        # NOTE: the rows are still in the WAL file, not checkpointed into the database file yet
+        assert os.path.getsize(f"{app.config['SQLALCHEMY_FILE']}-wal") > 0
+        assert DatabaseSnapshot().get(path) == path
+        assert snapshot_values(path) == [0]
+
+
+def test_snapshot_regenerated_only_after_write(make_database_app, tmp_path):
+    app = make_database_app()
+    with app.app_context():
+        path = str(tmp_path / "snapshot.db")
+        insert_value(0)
+        inode = os.stat(DatabaseSnapshot().get(path)).st_ino
+
+        # Without any write, the cached snapshot is served
+        assert os.stat(DatabaseSnapshot().get(path)).st_ino == inode
+
+        insert_value(1)
+        assert os.stat(DatabaseSnapshot().get(path)).st_ino != inode
+        assert snapshot_values(path) == [0, 1]
+        assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_snapshot_provides_wide_views(make_database_app, tmp_path):
+    app = make_database_app({"storage": "long"})
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE "Form" (id INTEGER PRIMARY KEY)'))
+            conn.execute(text('CREATE TABLE "Value_Form" (owner_id INTEGER, name TEXT, value TEXT, blob BLOB)'))
+            conn.execute(text('INSERT INTO "Form" (id) VALUES (1)'))
+            conn.execute(text("INSERT INTO \"Value_Form\" VALUES (1, 'age', '30', NULL)"))
+
+        path = DatabaseSnapshot().get(str(tmp_path / "snapshot.db"))
+        with sqlite3.connect(path) as conn:
+            assert conn.execute('SELECT id, age FROM "Form_wide"').fetchall() == [(1, "30")]
+
+        # The live database is not modified
+        assert inspect(db.engine).get_view_names() == []
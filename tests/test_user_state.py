@@ -0,0 +1,56 @@
+import itertools
+
+from conftest import make_systems, make_user
+from replikant.activities.task.src.selection_strategy.least_seen import (
+    LeastSeenMixedSelection,
+    LeastSeenPerUserSelection,
+)
+
+_task_ids = itertools.count()
+
+
+def select_ids(strategy, user_id: str, id_step: int, nb_systems: int = -1) -> list[int]:
+    """Select one sample of some systems (all by default) for a user and get the IDs of the samples"""
+    selection = strategy.select_samples(make_user(user_id), id_step, nb_systems, 1)
+    return sorted([sample.id for samples in selection.values() for sample in samples])
+
+
+def test_mixed_user_state_only_stores_seen_cells():
+    systems = make_systems(2, 50)
+    for system in systems.values():
+        for sample in system.samples:
+            sample.system = system.name
+    strategy = LeastSeenMixedSelection(systems, persistent=False)
+    select_ids(strategy, "p0", 0, 1)
+    select_ids(strategy, "p0", 1, 1)
+
+    # Only the users who have been served have a state, and only with the cells they have seen
+    assert list(strategy._user_counters.keys()) == ["p0"]
+    assert len(strategy._user_counters["p0"]) == 2
+
+
+def test_inactive_user_released_and_reloaded_from_journal():
+    strategy = LeastSeenPerUserSelection(make_systems(2, 4), task=f"state{next(_task_ids)}", persistent=True)
+    strategy.set_user_timeout(0)
+
+    seen = select_ids(strategy, "p0", 0) + select_ids(strategy, "p0", 1)
+
+    # The next selection releases the state of the inactive participants
+    select_ids(strategy, "p1", 0)
+    assert list(strategy._user_seen.keys()) == ["p1"]
+
+    # ... which is rebuilt from the journal when the participant comes back, so the samples seen aren't repeated
+    seen += select_ids(strategy, "p0", 2) + select_ids(strategy, "p0", 3)
+    assert sorted(seen) == list(range(8))
+    assert "p0" in strategy._user_seen
+
+
+def test_user_state_kept_without_journal():
+    strategy = LeastSeenPerUserSelection(make_systems(2, 4), persistent=False)
+    strategy.set_user_timeout(0)
+
+    select_ids(strategy, "p0", 0)
+    select_ids(strategy, "p1", 0)
+
+    # The state couldn't be rebuilt, so it is never released
+    assert sorted(strategy._user_seen.keys()) == ["p0", "p1"]